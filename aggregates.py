@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化的滚动统计
+每写入一期 data.json 就更新该日、所在月和全部数据的计数（期数、文章数、字数的 n/合计/最小/最大，
+栏目和作者的篇数），数据分析报告直接读取汇总结果，耗时与数据总量无关。
+同一期重复写入时先撤销旧的贡献再加入新的，结果与只写入一次相同。
+每期记录 data.json 的修改时间和大小，打开统计时重新汇总被其他方式新增、替换的文件，撤销已被删除的文件
+
+用法:
+    python aggregates.py report                # 全部数据
+    python aggregates.py report --month 202505
+    python aggregates.py report --date 20250501
+    python aggregates.py rebuild
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+
+from dimensions import normalize_column, split_authors
+from log_setup import setup_logging
+from schema import SchemaError, iter_articles, load_issue
+from work_queue import STATE_DIR, connect
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGGREGATES_DB = STATE_DIR / "aggregates.db"
+
+ALL = 'all'         # 全部数据的汇总周期
+COLUMN = 'column'
+AUTHOR = 'author'
+
+
+def period_key(period):
+    """库中的周期键：日 d:YYYYMMDD、月 m:YYYYMM，同一粒度的行在主键上连续"""
+    if period == ALL:
+        return ALL
+    return f"{'d' if len(period) == 8 else 'm'}:{period}"
+
+
+class WordSummary:
+    """可合并的字数摘要（只统计字数大于0的文章）"""
+
+    __slots__ = ('n', 'total', 'min', 'max')
+
+    def __init__(self, n=0, total=0, min=None, max=None):
+        self.n = n
+        self.total = total
+        self.min = min
+        self.max = max
+
+    def add(self, words):
+        if words > 0:
+            self.merge(WordSummary(1, words, words, words))
+
+    def merge(self, other):
+        if other.n:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+            self.n += other.n
+            self.total += other.total
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.n else None
+
+
+def issue_stats(pages):
+    """一期的 (文章数, 字数摘要, 栏目计数, 作者计数)，栏目和作者已规范化"""
+    articles = 0
+    words = WordSummary()
+    columns, authors = Counter(), Counter()
+    for _, meta in iter_articles(pages):
+        articles += 1
+        words.add(meta.word_number)
+        columns.update(normalize_column(meta.article_column))
+        authors.update(split_authors(meta.article_author))
+    return articles, words, columns, authors
+
+
+class AggregateStore:
+    """按日、月、全部三个粒度的计数"""
+
+    def __init__(self, db_path=DEFAULT_AGGREGATES_DB):
+        self.db_path = Path(db_path)
+        # 写入钩子可能来自其他线程，调用方负责串行化
+        self.conn = connect(self.db_path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS periods (
+                period TEXT PRIMARY KEY,  -- period_key()
+                issues INTEGER NOT NULL DEFAULT 0,
+                articles INTEGER NOT NULL DEFAULT 0,
+                words_n INTEGER NOT NULL DEFAULT 0,
+                words_total INTEGER NOT NULL DEFAULT 0,
+                words_min INTEGER,
+                words_max INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS counts (
+                period TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (period, kind, name)
+            );
+            CREATE INDEX IF NOT EXISTS counts_top ON counts (period, kind, n);
+            CREATE TABLE IF NOT EXISTS sources (
+                date TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            );
+        """)
+
+    # ---- 写入 ----
+
+    def _day_counts(self, date_str):
+        rows = self.conn.execute(
+            "SELECT kind, name, n FROM counts WHERE period = ?", (date_str,)).fetchall()
+        return [(row['kind'], row['name'], row['n']) for row in rows]
+
+    def _add_counts(self, periods, kind, counter, sign):
+        for name, n in counter.items():
+            for period in periods:
+                self.conn.execute("""
+                    INSERT INTO counts (period, kind, name, n) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(period, kind, name) DO UPDATE SET n = n + excluded.n
+                """, (period, kind, name, sign * n))
+
+    def _merge_period(self, period, children, params=()):
+        """由下一级周期重新合并（最小/最大值不能相减，按子周期重算，最多几十行）"""
+        row = self.conn.execute(f"""
+            SELECT COALESCE(SUM(issues), 0), COALESCE(SUM(articles), 0),
+                   COALESCE(SUM(words_n), 0), COALESCE(SUM(words_total), 0),
+                   MIN(words_min), MAX(words_max)
+            FROM periods WHERE {children}
+        """, params).fetchone()
+        self.conn.execute("""
+            INSERT OR REPLACE INTO periods
+                (period, issues, articles, words_n, words_total, words_min, words_max)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (period, *row))
+
+    def _replace_day(self, date_str, stats, source=None):
+        """用 stats（issue_stats 的结果，None 表示删除该期）替换某日的贡献，只更新该日、该月和全部三行"""
+        day, month = period_key(date_str), period_key(date_str[:6])
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 撤销该日旧的栏目/作者计数
+            for kind, name, n in self._day_counts(day):
+                self._add_counts((month, ALL), kind, {name: n}, -1)
+            self.conn.execute("DELETE FROM counts WHERE period = ?", (day,))
+
+            if stats is None:
+                self.conn.execute("DELETE FROM periods WHERE period = ?", (day,))
+                self.conn.execute("DELETE FROM sources WHERE date = ?", (date_str,))
+            else:
+                articles, words, columns, authors = stats
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO periods
+                        (period, issues, articles, words_n, words_total, words_min, words_max)
+                    VALUES (?, 1, ?, ?, ?, ?, ?)
+                """, (day, articles, words.n, words.total, words.min, words.max))
+                if source is not None:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO sources (date, mtime_ns, size) VALUES (?, ?, ?)",
+                        (date_str, *source))
+            self._merge_period(month, "period BETWEEN ? AND ?",
+                               (period_key(date_str[:6] + '01'), period_key(date_str[:6] + '31')))
+            self._merge_period(ALL, "period BETWEEN 'm:' AND 'm:~'")
+
+            if stats is not None:
+                self._add_counts((day, month, ALL), COLUMN, columns, 1)
+                self._add_counts((day, month, ALL), AUTHOR, authors, 1)
+            self.conn.execute(
+                "DELETE FROM counts WHERE period IN (?, ?) AND n <= 0", (month, ALL))
+            self.conn.execute(
+                "DELETE FROM periods WHERE period IN (?, ?) AND issues = 0", (month, ALL))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def ingest_issue(self, date_str, pages, source=None):
+        """写入（或重新写入）一期；source 为 data.json 的 (修改时间ns, 大小)"""
+        self._replace_day(date_str, issue_stats(pages), source)
+
+    def remove_issue(self, date_str):
+        """撤销一期（data.json 被删除或移走后）"""
+        self._replace_day(date_str, None)
+
+    def _ingest_file(self, json_file):
+        date_str = json_file.stem.replace('_data', '')
+        # 先取修改时间：读取期间文件被替换时下次检查会再汇总一遍
+        stat = json_file.stat()
+        try:
+            pages = load_issue(json_file)
+        except (OSError, SchemaError) as e:
+            logger.warning(f"读取数据文件失败 {json_file}: {e}")
+            return False
+        self.ingest_issue(date_str, pages, (stat.st_mtime_ns, stat.st_size))
+        return True
+
+    def refresh(self, data_dir=Path("data")):
+        """与 data/ 对比：汇总新增或修改时间、大小有变化的文件，撤销已不存在的期次，返回变化的期数"""
+        current = {}
+        for json_file in Path(data_dir).glob("*_data.json"):
+            stat = json_file.stat()
+            current[json_file.stem.replace('_data', '')] = (json_file, (stat.st_mtime_ns, stat.st_size))
+        recorded = {row['date']: (row['mtime_ns'], row['size']) for row in
+                    self.conn.execute("SELECT date, mtime_ns, size FROM sources")}
+        days = {row['period'][2:] for row in self.conn.execute(
+            "SELECT period FROM periods WHERE period BETWEEN 'd:' AND 'd:~'")}
+
+        changed = 0
+        for date_str in sorted(days.union(recorded) - current.keys()):
+            self.remove_issue(date_str)
+            changed += 1
+        for date_str, (json_file, source) in sorted(current.items()):
+            if recorded.get(date_str) != source:
+                if not self._ingest_file(json_file) and date_str in days:
+                    self.remove_issue(date_str)
+                changed += 1
+        if changed:
+            logger.info(f"统计已更新 {changed} 期")
+        return changed
+
+    def rebuild(self, data_dir=Path("data")):
+        """遍历 data/ 重新生成（首次使用或统计与文件不一致时）"""
+        self.conn.execute("DELETE FROM periods")
+        self.conn.execute("DELETE FROM counts")
+        self.conn.execute("DELETE FROM sources")
+        for json_file in sorted(Path(data_dir).glob("*_data.json")):
+            self._ingest_file(json_file)
+        summary = self.summary(ALL)
+        logger.info(f"统计已重建: {summary['issues'] if summary else 0} 期, "
+                    f"{summary['articles'] if summary else 0} 篇文章")
+
+    # ---- 读取 ----
+
+    def summary(self, period=ALL):
+        """某周期的 {'issues', 'articles', 'words': WordSummary}，没有数据时返回 None"""
+        row = self.conn.execute(
+            "SELECT * FROM periods WHERE period = ?", (period_key(period),)).fetchone()
+        if row is None:
+            return None
+        return {
+            'issues': row['issues'],
+            'articles': row['articles'],
+            'words': WordSummary(row['words_n'], row['words_total'],
+                                 row['words_min'], row['words_max']),
+        }
+
+    def top(self, kind, period=ALL, limit=10):
+        """某周期篇数最多的栏目或作者，返回 [(名称, 篇数)]"""
+        rows = self.conn.execute("""
+            SELECT name, n FROM counts WHERE period = ? AND kind = ?
+            ORDER BY n DESC, name LIMIT ?
+        """, (period_key(period), kind, limit)).fetchall()
+        return [(row['name'], row['n']) for row in rows]
+
+    def day_articles(self, start=None, end=None):
+        """各期的文章数，返回 {日期: 篇数}"""
+        rows = self.conn.execute("""
+            SELECT period, articles FROM periods WHERE period BETWEEN ? AND ? ORDER BY period
+        """, (period_key(start or '00000000'), period_key(end or '99999999'))).fetchall()
+        return {row['period'][2:]: row['articles'] for row in rows}
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM periods LIMIT 1").fetchone() is None
+
+    def close(self):
+        self.conn.close()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_aggregates():
+    """进程内共享的统计；首次使用时从现有文件重建（为空时）或与 data/ 对比更新"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            store = AggregateStore()
+            if store.is_empty():
+                store.rebuild()
+            else:
+                store.refresh()
+            _default_store = store
+        return _default_store
+
+
+def _reset_after_fork():
+    global _default_store, _default_lock
+    _default_store = None
+    _default_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _update_existing(update):
+    """不刷新、不重建地更新统计（调用方持有 _default_lock）
+
+    进程内已打开时直接使用；否则只打开数据库，统计为空（尚未构建）时不做任何事，
+    之后首次使用时的构建会包含这次的变化
+    """
+    if _default_store is not None:
+        update(_default_store)
+        return
+    store = AggregateStore()
+    try:
+        if not store.is_empty():
+            update(store)
+    finally:
+        store.close()
+
+
+def aggregate_issue(date_str, pages, source=None, lightweight=False):
+    """data.json 写入后调用；更新失败只记录警告，不影响抓取
+
+    source 为文件的 (修改时间ns, 大小)，之后 refresh 时不再重复汇总；
+    lightweight=True 时只更新已有的统计，不触发首次构建或与 data/ 对比
+    """
+    try:
+        if lightweight:
+            with _default_lock:
+                _update_existing(lambda store: store.ingest_issue(date_str, pages, source))
+            return
+        store = get_aggregates()
+        with _default_lock:
+            store.ingest_issue(date_str, pages, source)
+    except sqlite3.Error as e:
+        logger.warning(f"更新统计失败 {date_str}: {e}")
+
+
+def retract_issue(date_str):
+    """data.json 被删除或移走后调用（如 clean_data.py 隔离文件时），撤销该期的统计
+
+    只更新已有的统计：隔离时其余文件可能也是坏的，不能为此与 data/ 对比或重建
+    """
+    try:
+        with _default_lock:
+            _update_existing(lambda store: store.remove_issue(date_str))
+    except sqlite3.Error as e:
+        logger.warning(f"更新统计失败 {date_str}: {e}")
+
+
+def print_report(store, period=ALL, limit=10):
+    """打印某周期的统计报告"""
+    summary = store.summary(period)
+    if summary is None:
+        print(f"没有 {period} 的数据")
+        return
+    words = summary['words']
+    print(f"📊 统计 ({'全部' if period == ALL else period})")
+    print(f"   期数: {summary['issues']}")
+    print(f"   文章数: {summary['articles']}")
+    if words.n:
+        print(f"   平均字数: {words.mean:.0f}")
+        print(f"   最长文章: {words.max} 字")
+        print(f"   最短文章: {words.min} 字")
+    for kind, title in ((COLUMN, "热门栏目"), (AUTHOR, "活跃作者")):
+        print(f"   {title} (Top {limit}):")
+        for name, count in store.top(kind, period, limit):
+            print(f"      {name}: {count} 篇")
+
+
+def main():
+    """主函数"""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="滚动统计")
+    parser.add_argument('--db', type=Path, default=DEFAULT_AGGREGATES_DB,
+                        help="统计数据库路径")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report_parser = subparsers.add_parser('report', help="显示统计报告")
+    period_group = report_parser.add_mutually_exclusive_group()
+    period_group.add_argument('--date', help="某一期 YYYYMMDD")
+    period_group.add_argument('--month', help="某月 YYYYMM")
+    report_parser.add_argument('--top', type=int, default=10, help="栏目和作者显示前几名")
+    subparsers.add_parser('rebuild', help="遍历 data/ 重建统计")
+    args = parser.parse_args()
+
+    store = AggregateStore(args.db)
+    try:
+        if args.command == 'rebuild':
+            store.rebuild()
+        else:
+            if store.is_empty():
+                store.rebuild()
+            else:
+                store.refresh()
+            print_report(store, args.date or args.month or ALL, args.top)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,11 +5,15 @@
 分析已下载的人民邮电报数据
 """
 
-import json
 import os
+import calendar
 from pathlib import Path
-from collections import defaultdict
+import msgspec
 import pandas as pd
+from aggregates import ALL, AUTHOR, COLUMN, get_aggregates
+from article_index import ArticleIndex
+from coverage_index import get_coverage
+from schema import SchemaError, load_issue
 
 def analyze_downloaded_data():
     """分析已下载的数据"""
@@ -21,74 +25,50 @@ def analyze_downloaded_data():
     json_files = list(data_dir.glob("*.json"))
     print(f"📁 总共下载文件数: {len(json_files)}")
     
-    total_articles = 0
+    # 所有统计读取写入 data.json 时更新的汇总结果，不再遍历文件
+    store = get_aggregates()
+    summary = store.summary(ALL)
+    total_articles = summary['articles'] if summary else 0
     date_stats = {}
-    column_stats = defaultdict(int)
-    author_stats = defaultdict(int)
-    word_count_stats = []
     
-    # 分析每个文件
-    for json_file in sorted(json_files):
-        date_str = json_file.stem.replace("_data", "")
-        
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if isinstance(data, list) and len(data) > 0:
-                # 提取文章信息
-                articles = []
-                for item in data:
-                    if 'onePageArticleList' in item:
-                        articles.extend(item['onePageArticleList'])
-                
-                article_count = len(articles)
-                date_stats[date_str] = article_count
-                total_articles += article_count
-                
-                # 统计栏目和作者
-                for article in articles:
-                    if article.get('articleColumn'):
-                        column_stats[article['articleColumn']] += 1
-                    if article.get('articleAuthor'):
-                        author_stats[article['articleAuthor']] += 1
-                    if article.get('wordNumber'):
-                        word_count_stats.append(article['wordNumber'])
-                
-                print(f"📅 {date_str}: {article_count} 篇文章")
-            else:
-                print(f"⚠️  {date_str}: 数据格式异常")
-                
-        except Exception as e:
-            print(f"❌ {json_file.name}: 文件读取失败 - {e}")
+    for date_str, count in store.day_articles().items():
+        if count > 0:
+            date_stats[date_str] = count
+            print(f"📅 {date_str}: {count} 篇文章")
+        else:
+            print(f"⚠️  {date_str}: 数据格式异常")
     
     print(f"\n📊 **总体统计**")
     print(f"   总文章数: {total_articles}")
-    print(f"   平均每日文章数: {total_articles/len(date_stats):.1f}")
+    print(f"   平均每日文章数: {total_articles/len(date_stats) if date_stats else 0:.1f}")
     
     # 字数统计
-    if word_count_stats:
-        print(f"   平均字数: {sum(word_count_stats)/len(word_count_stats):.0f}")
-        print(f"   最长文章: {max(word_count_stats)} 字")
-        print(f"   最短文章: {min(word_count_stats)} 字")
+    words = summary['words'] if summary else None
+    if words and words.n:
+        print(f"   平均字数: {words.mean:.0f}")
+        print(f"   最长文章: {words.max} 字")
+        print(f"   最短文章: {words.min} 字")
     
-    # 热门栏目
+    # 热门栏目（栏目、作者已规范化，作者去掉了"本报记者"等前缀）
     print(f"\n📰 **热门栏目 (Top 10)**")
-    for column, count in sorted(column_stats.items(), key=lambda x: x[1], reverse=True)[:10]:
-        if column.strip():  # 排除空栏目
-            print(f"   {column}: {count} 篇")
+    for column, count in store.top(COLUMN):
+        print(f"   {column}: {count} 篇")
     
     # 活跃作者
     print(f"\n✍️  **活跃作者 (Top 10)**")
-    for author, count in sorted(author_stats.items(), key=lambda x: x[1], reverse=True)[:10]:
-        if author.strip() and not author.startswith("记者"):  # 排除空作者和通用记者
-            print(f"   {author}: {count} 篇")
+    for author, count in store.top(AUTHOR):
+        print(f"   {author}: {count} 篇")
     
     # 缺失日期分析
     print(f"\n📅 **数据覆盖情况**")
-    all_may_dates = [f"202505{i:02d}" for i in range(1, 32)]
     downloaded_dates = set(date_stats.keys())
-    missing_dates = set(all_may_dates) - downloaded_dates
+    missing_dates = set()
+    if downloaded_dates:
+        # 覆盖范围：最早一期所在月的月初到最晚一期所在月的月末
+        first, last = min(downloaded_dates), max(downloaded_dates)
+        last_day = calendar.monthrange(int(last[:4]), int(last[4:6]))[1]
+        missing_dates = set(get_coverage().missing_between(
+            first[:6] + '01', f"{last[:6]}{last_day:02d}")) - downloaded_dates
     
     print(f"   已下载日期: {len(downloaded_dates)} 天")
     print(f"   缺失日期: {len(missing_dates)} 天")
@@ -122,40 +102,34 @@ def analyze_downloaded_data():
 def export_article_list():
     """导出文章清单到CSV"""
     data_dir = Path("data")
-    json_files = list(data_dir.glob("*.json"))
     
-    all_articles = []
-    
-    for json_file in sorted(json_files):
-        date_str = json_file.stem.replace("_data", "")
-        
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if isinstance(data, list):
-                for item in data:
-                    if 'onePageArticleList' in item:
-                        for article in item['onePageArticleList']:
-                            article_info = {
-                                'date': date_str,
-                                'title': article.get('mainTitle', ''),
-                                'author': article.get('articleAuthor', ''),
-                                'column': article.get('articleColumn', ''),
-                                'word_count': article.get('wordNumber', 0),
-                                'issue_number': article.get('issueNumber', ''),
-                                'href': article.get('articleHref', '')
-                            }
-                            all_articles.append(article_info)
-        except Exception as e:
-            print(f"处理文件 {json_file.name} 时出错: {e}")
-    
-    if all_articles:
+    index, _ = ArticleIndex.from_data_dir(
+        data_dir,
+        on_error=lambda path, e: print(f"处理文件 {path.name} 时出错: {e}"))
+    
+    # 直接按列构建表格，不再逐篇生成字典；作者、栏目保留原始值，*_norm 为规范化后的分类列
+    author_raw_codes, author_raw = index.author_dim.raw_categorical_codes(index.author_ids)
+    column_raw_codes, column_raw = index.column_dim.raw_categorical_codes(index.column_ids)
+    author_codes, author_names = index.author_dim.categorical_codes(index.author_ids)
+    column_codes, column_names = index.column_dim.categorical_codes(index.column_ids)
+    all_articles = {
+        'date': pd.Categorical(index.dates),
+        'title': index.titles,
+        'author': pd.Categorical.from_codes(author_raw_codes, author_raw),
+        'column': pd.Categorical.from_codes(column_raw_codes, column_raw),
+        'author_norm': pd.Categorical.from_codes(author_codes, author_names),
+        'column_norm': pd.Categorical.from_codes(column_codes, column_names),
+        'word_count': index.word_numbers.tolist(),
+        'issue_number': index.issue_numbers,
+        'href': index.hrefs
+    }
+    
+    if len(index) > 0:
         df = pd.DataFrame(all_articles)
         csv_file = "article_list.csv"
         df.to_csv(csv_file, index=False, encoding='utf-8-sig')
         print(f"\n💾 已导出文章清单到: {csv_file}")
-        print(f"   总共 {len(all_articles)} 篇文章")
+        print(f"   总共 {len(index)} 篇文章")
         return csv_file
     else:
         print("❌ 没有找到文章数据")
@@ -172,42 +146,28 @@ def validate_data_integrity():
     invalid_files = 0
     
     for json_file in json_files:
+        # 结构在解码时校验；缺少必填字段（mainTitle、articleIssueDate、articleHref）的单篇文章跳过并记录日志
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 检查数据结构
-            if isinstance(data, list):
-                has_articles = False
-                for item in data:
-                    if isinstance(item, dict) and 'onePageArticleList' in item:
-                        articles = item['onePageArticleList']
-                        if isinstance(articles, list) and len(articles) > 0:
-                            # 检查文章字段完整性
-                            for article in articles:
-                                required_fields = ['mainTitle', 'articleIssueDate', 'articleHref']
-                                if all(field in article for field in required_fields):
-                                    has_articles = True
-                                    break
-                        if has_articles:
-                            break
-                
-                if has_articles:
-                    print(f"✅ {json_file.name}: 数据结构正确")
-                    valid_files += 1
-                else:
-                    print(f"⚠️  {json_file.name}: 数据结构异常（无有效文章）")
-                    invalid_files += 1
-            else:
-                print(f"❌ {json_file.name}: 根数据类型错误")
-                invalid_files += 1
-                
-        except json.JSONDecodeError:
+            pages = load_issue(json_file)
+        except msgspec.ValidationError as e:
+            print(f"❌ {json_file.name}: 数据结构错误 - {e}")
+            invalid_files += 1
+            continue
+        except SchemaError:
             print(f"❌ {json_file.name}: JSON格式错误")
             invalid_files += 1
-        except Exception as e:
+            continue
+        except OSError as e:
             print(f"❌ {json_file.name}: {e}")
             invalid_files += 1
+            continue
+        
+        if any(page.one_page_article_list for page in pages):
+            print(f"✅ {json_file.name}: 数据结构正确")
+            valid_files += 1
+        else:
+            print(f"⚠️  {json_file.name}: 数据结构异常（无有效文章）")
+            invalid_files += 1
     
     print(f"\n📈 **完整性统计**")
     print(f"   有效文件: {valid_files}")
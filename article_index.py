@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的内存文章索引
+按列存储（字数等数值用 array，日期、版面等重复度高的字符串做 intern，
+作者、栏目保存为维度表中的整数ID），多年数据常驻内存时比逐篇保存元数据字典小数倍
+"""
+
+import sys
+from array import array
+from pathlib import Path
+
+from dimensions import DimensionTable, normalize_column, split_authors
+from schema import ArticleMeta, SchemaError, iter_articles, load_issue
+
+intern = sys.intern
+
+
+class ArticleRef:
+    """单篇文章的轻量引用，属性名与 schema.ArticleMeta 一致，可直接替代元数据读取"""
+
+    __slots__ = ('date', 'page_no', 'main_title', 'article_href', 'word_number',
+                 'pic_author', 'issue_number', 'article_issue_date',
+                 'article_column', 'article_author', 'extra')
+
+    def __init__(self, date, page_no, main_title, article_href, word_number=0,
+                 pic_author='', issue_number='', article_issue_date='',
+                 article_column='', article_author='', extra=None):
+        self.date = intern(date)
+        self.page_no = intern(page_no)
+        self.main_title = main_title
+        self.article_href = article_href
+        self.word_number = word_number
+        self.pic_author = intern(pic_author)
+        self.issue_number = intern(issue_number)
+        self.article_issue_date = intern(article_issue_date)
+        self.article_column = intern(article_column)
+        self.article_author = intern(article_author)
+        self.extra = extra or {}
+
+    @classmethod
+    def from_meta(cls, date, page_no, meta):
+        return cls(date, page_no, meta.main_title, meta.article_href,
+                   meta.word_number, meta.pic_author, meta.issue_number,
+                   meta.article_issue_date, meta.article_column,
+                   meta.article_author, meta.extra)
+
+    def to_meta(self):
+        """转换为 schema.ArticleMeta（写入文章记录时使用）"""
+        meta = ArticleMeta(
+            main_title=self.main_title,
+            article_issue_date=self.article_issue_date,
+            article_href=self.article_href,
+            word_number=self.word_number,
+            pic_author=self.pic_author,
+            issue_number=self.issue_number,
+            article_column=self.article_column,
+            article_author=self.article_author,
+        )
+        if self.extra:
+            meta.extra = self.extra
+        return meta
+
+    def __repr__(self):
+        return f"ArticleRef({self.date}, {self.page_no}, {self.article_href!r})"
+
+
+class ArticleIndex:
+    """按列存储的文章索引
+
+    column_ids / author_ids 为原始值在 column_dim / author_dim 中的ID，
+    按栏目、作者统计时直接对整数计数；少数带有额外字段的文章，额外字段按行号保存在 extras 中
+    """
+
+    __slots__ = ('dates', 'page_nos', 'titles', 'hrefs', 'word_numbers',
+                 'pic_authors', 'issue_numbers', 'issue_dates', 'column_ids',
+                 'author_ids', 'column_dim', 'author_dim', 'extras')
+
+    def __init__(self):
+        self.dates = []
+        self.page_nos = []
+        self.titles = []
+        self.hrefs = []
+        self.word_numbers = array('l')
+        self.pic_authors = []
+        self.issue_numbers = []
+        self.issue_dates = []
+        self.column_ids = array('I')
+        self.author_ids = array('I')
+        self.column_dim = DimensionTable(normalize_column)
+        self.author_dim = DimensionTable(split_authors)
+        self.extras = {}
+
+    def __len__(self):
+        return len(self.hrefs)
+
+    def add(self, date, page_no, meta):
+        """追加一篇文章"""
+        self.dates.append(intern(date))
+        self.page_nos.append(intern(page_no))
+        self.titles.append(meta.main_title)
+        self.hrefs.append(meta.article_href)
+        self.word_numbers.append(meta.word_number)
+        self.pic_authors.append(intern(meta.pic_author))
+        self.issue_numbers.append(intern(meta.issue_number))
+        self.issue_dates.append(intern(meta.article_issue_date))
+        self.column_ids.append(self.column_dim.intern(meta.article_column))
+        self.author_ids.append(self.author_dim.intern(meta.article_author))
+        if meta.extra:
+            self.extras[len(self.hrefs) - 1] = meta.extra
+
+    def add_issue(self, date, pages):
+        """追加一期的所有文章，返回该期在索引中的行号范围"""
+        start = len(self)
+        for page_no, meta in iter_articles(pages):
+            self.add(date, page_no, meta)
+        return range(start, len(self))
+
+    def ref(self, i):
+        """第 i 行的 ArticleRef"""
+        return ArticleRef(self.dates[i], self.page_nos[i], self.titles[i],
+                          self.hrefs[i], self.word_numbers[i],
+                          self.pic_authors[i], self.issue_numbers[i],
+                          self.issue_dates[i],
+                          self.column_dim.raw_value(self.column_ids[i]),
+                          self.author_dim.raw_value(self.author_ids[i]),
+                          self.extras.get(i))
+
+    def refs(self, rows=None):
+        """遍历指定行（默认全部）的 ArticleRef"""
+        for i in (range(len(self)) if rows is None else rows):
+            yield self.ref(i)
+
+    def column_counts(self, rows=None):
+        """{规范化栏目: 篇数}"""
+        ids = self.column_ids if rows is None else (self.column_ids[i] for i in rows)
+        return self.column_dim.entity_counts(ids)
+
+    def author_counts(self, rows=None):
+        """{规范化作者: 篇数}，多作者的文章计入每位作者"""
+        ids = self.author_ids if rows is None else (self.author_ids[i] for i in rows)
+        return self.author_dim.entity_counts(ids)
+
+    @classmethod
+    def from_data_dir(cls, data_dir=Path("data"), on_error=None):
+        """从 data/ 目录构建索引，返回 (索引, {日期: 行号范围})"""
+        index = cls()
+        issues = {}
+        for json_file in sorted(Path(data_dir).glob("*.json")):
+            date_str = json_file.stem.replace('_data', '')
+            try:
+                pages = load_issue(json_file)
+            except (OSError, SchemaError) as e:
+                if on_error:
+                    on_error(json_file, e)
+                continue
+            issues[date_str] = index.add_issue(date_str, pages)
+        return index, issues
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章图片下载
+解析时从 #ozoom 中提取图片地址，由后台线程中的事件循环并发下载：总并发数有上限，同一主机按最小间隔限速，
+不排在文章抓取的节奏等待之后。图片与文章在同一站点，间隔记录在队列数据库中由所有进程共享，
+站点熔断（retry_policy.CircuitBreaker）期间不下载，被限流时同样触发熔断。图片按内容的 SHA-256 保存为 assets/ab/abcdef....jpg，
+多篇文章引用同一张图片时只保存一份，文章记录的 assets 字段记录引用。返回404/410的图片记录在图片索引中，之后不再请求
+
+用法:
+    python assets.py fetch      # 为已保存、但图片没有下载完的文章补下载
+    python assets.py fetch --retry-missing  # 同时重试曾返回404/410的图片
+    python assets.py status
+"""
+
+import sys
+import asyncio
+import hashlib
+import argparse
+import logging
+import threading
+import concurrent.futures
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import msgspec
+import requests
+
+from cassette import install, replaying
+from log_setup import setup_logging
+from retry_policy import THROTTLED, CircuitBreaker, classify_page
+from schema import ArticleAsset, SchemaError, load_record, save_record
+from storage import write_bytes
+from work_queue import DEFAULT_QUEUE_DB, STATE_DIR, RateBudget, connect
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = Path("assets")
+DEFAULT_ASSET_DB = STATE_DIR / "assets.db"
+
+# 同一主机两次图片请求的最小间隔（秒），所有进程合计
+HOST_INTERVAL = 10.0
+
+# 限流时的状态码（491 为站点的反爬响应）
+THROTTLE_STATUS = (403, 491)
+
+# 图片已不存在，重试也不会成功
+MISSING_STATUS = (404, 410)
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/bmp': '.bmp',
+    'image/svg+xml': '.svg',
+}
+_KNOWN_SUFFIXES = set(_EXTENSIONS.values()) | {'.jpeg'}
+
+
+def image_sources(container):
+    """正文容器（BeautifulSoup 元素）中的图片地址，按出现顺序去重，保持页面中的原样（可能是相对地址）"""
+    sources = []
+    for img in container.find_all('img'):
+        src = (img.get('src') or img.get('data-src') or '').strip()
+        if src and not src.startswith('data:') and src not in sources:
+            sources.append(src)
+    return sources
+
+
+def _extension(url, content_type):
+    ext = _EXTENSIONS.get(content_type)
+    if ext:
+        return ext
+    suffix = Path(urlsplit(url).path).suffix.lower()
+    return suffix if suffix in _KNOWN_SUFFIXES else '.bin'
+
+
+def asset_path(sha256, ext, root=ASSETS_DIR):
+    """按内容寻址的保存路径：前两位十六进制作为子目录"""
+    return Path(root) / sha256[:2] / f"{sha256}{ext}"
+
+
+class AssetIndex:
+    """已下载图片的地址 -> 内容映射（state/assets.db），已下载过或确认不存在的地址不再请求"""
+
+    def __init__(self, db_path=DEFAULT_ASSET_DB):
+        # 由创建线程之外的事件循环线程使用
+        self.conn = connect(db_path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content_type TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                fetched_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS missing (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                failed_at TEXT NOT NULL
+            );
+        """)
+
+    def lookup(self, url):
+        row = self.conn.execute("""
+            SELECT urls.url, blobs.sha256, blobs.path, blobs.size, blobs.content_type
+            FROM urls JOIN blobs ON blobs.sha256 = urls.sha256
+            WHERE urls.url = ?
+        """, (url,)).fetchone()
+        if row is None or not Path(row['path']).exists():
+            return None
+        return ArticleAsset(url=row['url'], sha256=row['sha256'], path=row['path'],
+                            size=row['size'], content_type=row['content_type'])
+
+    def add(self, asset):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO blobs (sha256, path, size, content_type) VALUES (?, ?, ?, ?)",
+                (asset.sha256, asset.path, asset.size, asset.content_type))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, fetched_at) VALUES (?, ?, ?)",
+                (asset.url, asset.sha256, datetime.now().isoformat(timespec='seconds')))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def mark_missing(self, url, status):
+        """记录返回404/410的图片地址"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO missing (url, status, failed_at) VALUES (?, ?, ?)",
+            (url, status, datetime.now().isoformat(timespec='seconds')))
+
+    def is_missing(self, url):
+        return self.conn.execute("SELECT 1 FROM missing WHERE url = ?", (url,)).fetchone() is not None
+
+    def missing_urls(self):
+        return {row['url'] for row in self.conn.execute("SELECT url FROM missing")}
+
+    def clear_missing(self):
+        """清除不存在的记录（之后重新请求），返回清除的条数"""
+        return self.conn.execute("DELETE FROM missing").rowcount
+
+    def totals(self):
+        """(地址数, 文件数, 总字节数)"""
+        urls = self.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        files, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return urls, files, size
+
+    def close(self):
+        self.conn.close()
+
+
+class Throttled(requests.RequestException):
+    """图片请求被限流"""
+
+
+class Missing(requests.RequestException):
+    """图片已不存在（404/410）"""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class HostLimiter:
+    """同一主机的相邻两次请求至少间隔 interval 秒，不同主机互不影响；
+    间隔保存在队列数据库的速率预算中（每个主机一行），多个worker进程合计不超过该速率"""
+
+    def __init__(self, interval=HOST_INTERVAL, db_path=DEFAULT_QUEUE_DB, run_db=None):
+        self.interval = interval
+        self.db_path = db_path
+        # run_db(fn, *args) 在数据库线程中执行同步调用（见 AssetDownloader._db）
+        self._run_db = run_db or (lambda fn, *args: asyncio.to_thread(fn, *args))
+        self._budgets = {}
+
+    def _reserve(self, host):
+        budget = self._budgets.get(host)
+        if budget is None:
+            # 只在数据库线程中使用，close 在循环停止后调用
+            budget = self._budgets[host] = RateBudget(
+                self.db_path, name=f"assets:{host}", interval=self.interval, jitter=0,
+                check_same_thread=False)
+        return budget.reserve()
+
+    async def wait(self, host):
+        if replaying():
+            return
+        delay = await self._run_db(self._reserve, host)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def close(self):
+        for budget in self._budgets.values():
+            budget.close()
+
+
+class AssetDownloader:
+    """有界并发的图片下载：HTTP请求和写文件放到线程中执行，不阻塞事件循环；
+    SQLite 的读写（图片索引、速率预算、熔断器，可能等待其他进程的写锁）统一在一个数据库线程中执行，
+    同一连接上的事务不会交错"""
+
+    def __init__(self, root=ASSETS_DIR, index=None, concurrency=4, host_interval=HOST_INTERVAL,
+                 timeout=30):
+        self.root = Path(root)
+        self.index = index or AssetIndex()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._db_executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='asset-db')
+        self.limiter = HostLimiter(host_interval, run_db=self._db)
+        self.circuit = CircuitBreaker(check_same_thread=False)
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT})
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        install(self.session)
+        self.stats = Counter()
+        self._semaphore = None
+        self._in_flight = {}  # 地址 -> Task，多篇文章同时引用同一张图片时只请求一次
+
+    def _get(self, url, referer):
+        response = self.session.get(url, timeout=self.timeout, headers={'Referer': referer})
+        content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+        if response.status_code in MISSING_STATUS:
+            raise Missing(response.status_code)
+        if response.status_code in THROTTLE_STATUS or (
+                content_type == 'text/html' and classify_page(None, response.text) == THROTTLED):
+            raise Throttled(f"被限流: HTTP {response.status_code}")
+        response.raise_for_status()
+        if not content_type.startswith('image/'):
+            # 反爬页面等也会返回200
+            raise ValueError(f"不是图片: {content_type or '未知类型'}")
+        return response.content, content_type
+
+    def _store(self, url, content, content_type):
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = asset_path(sha256, _extension(url, content_type), self.root)
+        if path.exists():
+            self.stats['deduplicated'] += 1
+        else:
+            write_bytes(path, content)
+            self.stats['downloaded'] += 1
+            self.stats['bytes'] += len(content)
+        return ArticleAsset(url=url, sha256=sha256, path=path.as_posix(),
+                            size=len(content), content_type=content_type)
+
+    def _db(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._db_executor, fn, *args)
+
+    async def _download(self, url, referer):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            if await self._blocked(url):
+                return None
+            await self.limiter.wait(urlsplit(url).netloc)
+            if await self._blocked(url):
+                return None
+            try:
+                content, content_type = await asyncio.to_thread(self._get, url, referer)
+                asset = await asyncio.to_thread(self._store, url, content, content_type)
+            except Missing as e:
+                self.stats['missing'] += 1
+                logger.warning(f"图片不存在 {url}: {e}，之后不再请求")
+                await self._db(self.index.mark_missing, url, e.status)
+                return None
+            except Throttled as e:
+                self.stats['failed'] += 1
+                logger.warning(f"图片下载被限流 {url}: {e}")
+                await self._db(self.circuit.failure, url, THROTTLED)
+                return None
+            except (requests.RequestException, ValueError, OSError) as e:
+                self.stats['failed'] += 1
+                logger.warning(f"图片下载失败 {url}: {e}")
+                return None
+        await self._db(self.index.add, asset)
+        return asset
+
+    async def _blocked(self, url):
+        # 站点熔断期间不下载，之后由 python assets.py fetch 补下载；图片请求不充当探测请求
+        if replaying() or not await self._db(self.circuit.is_open, url):
+            return False
+        self.stats['deferred'] += 1
+        logger.info(f"站点熔断中，暂不下载图片 {url}")
+        return True
+
+    def _known(self, url):
+        """已下载过返回 ArticleAsset，确认不存在返回 False，否则返回 None"""
+        asset = self.index.lookup(url)
+        if asset is None and self.index.is_missing(url):
+            return False
+        return asset
+
+    async def fetch(self, url, referer=''):
+        """下载一张图片，返回 schema.ArticleAsset；失败或图片不存在时返回 None"""
+        asset = await self._db(self._known, url)
+        if asset is False:
+            self.stats['skipped'] += 1
+            return None
+        if asset is not None:
+            self.stats['cached'] += 1
+            return asset
+        task = self._in_flight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url, referer))
+            self._in_flight[url] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(url, None))
+        return await task
+
+    async def fetch_all(self, page_url, sources):
+        """下载一篇文章的全部图片（sources 按文章页面地址解析相对路径），返回成功的 ArticleAsset 列表"""
+        urls = list(dict.fromkeys(urljoin(page_url, src) for src in sources))
+        assets = await asyncio.gather(*(self.fetch(url, page_url) for url in urls))
+        return [asset for asset in assets if asset is not None]
+
+    def close(self):
+        self._db_executor.shutdown()
+        self.session.close()
+        self.limiter.close()
+        self.circuit.close()
+        self.index.close()
+
+
+def attach_assets(record_path, assets):
+    """把图片引用写入文章记录；重新读取文件，保留下载期间的其他改动"""
+    record = load_record(record_path)
+    save_record(record_path, msgspec.structs.replace(record, assets=assets))
+
+
+def needs_assets(record, missing=frozenset()):
+    """文章正文中有图片，但记录中还没有全部的引用（missing 中确认不存在的地址不算）"""
+    urls = {urljoin(record.source_url, src) for src in record.content.images}
+    return bool(urls - {asset.url for asset in record.assets} - missing)
+
+
+class AssetWorker:
+    """在后台线程运行事件循环下载图片；抓取线程提交后立即返回，继续下一篇文章"""
+
+    def __init__(self, root=ASSETS_DIR, concurrency=4, host_interval=HOST_INTERVAL):
+        self.downloader = AssetDownloader(root, concurrency=concurrency, host_interval=host_interval)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='asset-loop', daemon=True)
+        self._thread.start()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.articles = 0
+
+    async def _process(self, record_path, page_url, sources):
+        assets = await self.downloader.fetch_all(page_url, sources)
+        if assets:
+            try:
+                await asyncio.to_thread(attach_assets, record_path, assets)
+            except (OSError, SchemaError) as e:
+                logger.warning(f"写入图片引用失败 {record_path}: {e}")
+                return
+        self.articles += 1
+        logger.info(f"图片已保存 {len(assets)}/{len(sources)}: {record_path}")
+
+    def submit(self, record_path, record):
+        """提交一篇已保存文章的图片下载（record 为 schema.ArticleRecord），没有图片时返回 None"""
+        if not record.content.images:
+            return None
+        future = asyncio.run_coroutine_threadsafe(
+            self._process(Path(record_path), record.source_url, list(record.content.images)), self.loop)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"图片下载出错: {future.exception()}")
+
+    def close(self, timeout=300):
+        """等待已提交的下载完成（最多 timeout 秒）后停止事件循环"""
+        with self._lock:
+            pending = list(self._pending)
+        if pending:
+            logger.info(f"等待 {len(pending)} 篇文章的图片下载完成...")
+            _, not_done = concurrent.futures.wait(pending, timeout=timeout)
+            for future in not_done:
+                future.cancel()
+            if not_done:
+                logger.warning(f"{len(not_done)} 篇文章的图片未下载完，可运行 python assets.py fetch 补下载")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self.downloader.close()
+        stats = self.downloader.stats
+        if self.articles or stats['failed'] or stats['deferred'] or stats['missing']:
+            logger.info(f"图片: {self.articles} 篇文章, 新下载 {stats['downloaded']} 张 "
+                        f"({stats['bytes'] / 1024 / 1024:.1f} MB), 内容重复 {stats['deduplicated']} 张, "
+                        f"已下载过 {stats['cached']} 张, 失败 {stats['failed']} 张, "
+                        f"不存在 {stats['missing']} 张, 熔断推迟 {stats['deferred']} 张")
+
+
+def fetch_missing(articles_dir=Path("articles"), root=ASSETS_DIR, concurrency=4,
+                  host_interval=HOST_INTERVAL, retry_missing=False):
+    """为图片没有下载完的已保存文章补下载，返回提交的文章数
+
+    曾返回404/410的图片不再请求，retry_missing=True 时清除这些记录后重试
+    """
+    index = AssetIndex()
+    try:
+        if retry_missing:
+            logger.info(f"清除 {index.clear_missing()} 条图片不存在的记录")
+        missing = index.missing_urls()
+    finally:
+        index.close()
+    worker = AssetWorker(root, concurrency=concurrency, host_interval=host_interval)
+    submitted = 0
+    try:
+        for record_path in sorted(Path(articles_dir).glob("*/*.json")):
+            try:
+                record = load_record(record_path)
+            except (OSError, SchemaError) as e:
+                logger.warning(f"读取文章失败 {record_path}: {e}")
+                continue
+            if needs_assets(record, missing) and worker.submit(record_path, record):
+                submitted += 1
+    finally:
+        worker.close(timeout=None)
+    return submitted
+
+
+def main():
+    """主函数"""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="文章图片下载")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fetch_parser = subparsers.add_parser('fetch', help="为已保存文章补下载图片")
+    fetch_parser.add_argument('--articles-dir', type=Path, default=Path("articles"))
+    fetch_parser.add_argument('--concurrency', type=int, default=4, help="同时下载的图片数")
+    fetch_parser.add_argument('--host-interval', type=float, default=HOST_INTERVAL,
+                              help="同一主机两次请求的最小间隔（秒，所有进程合计）")
+    fetch_parser.add_argument('--retry-missing', action='store_true',
+                              help="重试曾返回404/410的图片")
+    subparsers.add_parser('status', help="显示已保存的图片")
+    args = parser.parse_args()
+
+    if args.command == 'fetch':
+        submitted = fetch_missing(args.articles_dir, concurrency=args.concurrency,
+                                  host_interval=args.host_interval, retry_missing=args.retry_missing)
+        print(f"已处理 {submitted} 篇文章的图片")
+    else:
+        index = AssetIndex()
+        try:
+            urls, files, size = index.totals()
+            missing = len(index.missing_urls())
+        finally:
+            index.close()
+        print(f"图片地址: {urls}")
+        print(f"保存的文件: {files} ({size / 1024 / 1024:.1f} MB)")
+        print(f"内容重复节省: {urls - files} 个文件")
+        print(f"不存在（404/410，不再请求）: {missing}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热点路径的基准测试
+在合成的语料上计时页面解析、遗漏/问题文章扫描和分析导出：
+    parse_article_html / parse_html_content   文章页面HTML解析（合成页面，或从录像中取真实页面）
+    check_missing_articles / get_problematic_articles / analyze_downloaded_data / export_article_list
+                                              在 1x、10x、100x 于2025年5月规模的 data/ 和 articles/ 上运行
+    check_missing_articles_cold               同上，但每轮重新打开覆盖索引（新进程运行脚本时的情况）
+语料按规模生成一次后缓存在 state/bench/；每次的结果追加到 state/bench/history.jsonl，
+中位数比同一台机器最近几次的基线慢超过阈值时以非0状态退出，这次的结果不写入历史（--accept 时照常写入，作为新的基线）。
+
+用法:
+    python benchmark.py                          # 全部用例，规模 1x 10x 100x
+    python benchmark.py --scales 1 10 --rounds 3
+    python benchmark.py --cases parse_article_html check_missing_articles
+    python benchmark.py --cassette cassettes/0501   # 用录像中的真实页面计时解析
+    python benchmark.py --threshold 0.1 --no-save   # 只比较，不写入历史
+    python benchmark.py --accept                    # 确认变慢是预期的，写入历史
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import calendar
+import logging
+import platform
+import statistics
+import subprocess
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+from pathlib import Path
+
+from work_queue import STATE_DIR
+
+BENCH_DIR = STATE_DIR / "bench"
+HISTORY_PATH = BENCH_DIR / "history.jsonl"
+
+# 2025年5月的规模：每个工作日一期，每期8版、每版5篇
+BASE_MONTH = (2025, 5)
+PAGES_PER_ISSUE = 8
+ARTICLES_PER_PAGE = 5
+HTML_PAGES = 200
+
+# 已保存且完整 / 已保存但过短或为错误页 / 未抓取
+SAVED_RATIO = 0.85
+SHORT_RATIO = 0.08
+
+PARSE_CASES = ('parse_article_html', 'parse_html_content')
+SCAN_CASES = ('check_missing_articles', 'check_missing_articles_cold', 'get_problematic_articles',
+              'analyze_downloaded_data', 'export_article_list')
+ALL_CASES = PARSE_CASES + SCAN_CASES
+
+COLUMNS = ['人邮时评', '要闻', '5G前沿', '信息化', '运营商动态', '产业观察', '数字经济', '']
+AUTHORS = ['本报记者　张金然', '记者　苏德悦', '本报通讯员 王磊', '李明 陈静', '刘洋',
+           '本报记者 赵婷婷 通讯员 孙浩', '']
+WORDS = '信息通信行业加快推进网络建设持续提升服务能力推动数字经济高质量发展运营商创新应用场景赋能千行百业'
+
+
+def _weekdays_ending(end, count):
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return sorted(days)
+
+
+def base_issue_count():
+    """2025年5月的工作日数，即 1x 规模的期数"""
+    year, month = BASE_MONTH
+    day = date(year, month, 1)
+    count = 0
+    while day.month == month:
+        count += day.weekday() < 5
+        day += timedelta(days=1)
+    return count
+
+
+def _text(rng, length):
+    repeat = length // len(WORDS) + 1
+    start = rng.randrange(len(WORDS))
+    return (WORDS[start:] + WORDS * repeat)[:length]
+
+
+def _paragraphs(rng, length):
+    parts = []
+    while length > 0:
+        size = min(length, rng.randint(60, 240))
+        parts.append(_text(rng, size))
+        length -= size
+    return parts
+
+
+def build_corpus(root, scale, seed=2025):
+    """生成 scale 倍于2025年5月的 data/ 和 articles/；已生成过时直接返回"""
+    root = Path(root)
+    marker = root / "corpus.json"
+    if marker.exists():
+        return json.loads(marker.read_text(encoding='utf-8'))
+
+    from schema import ArticleContent, ArticleRecord, encode_record, meta_from_dict
+
+    if root.exists():
+        shutil.rmtree(root)
+    (root / "data").mkdir(parents=True)
+    rng = random.Random(seed + scale)
+    year, month = BASE_MONTH
+    month_end = date(year, month, calendar.monthrange(year, month)[1])
+    issues = _weekdays_ending(month_end, base_issue_count() * scale)
+
+    counts = {'issues': len(issues), 'articles': 0, 'saved': 0, 'short': 0}
+    for n, day in enumerate(issues):
+        date_str = day.strftime("%Y%m%d")
+        issue_date = day.isoformat()
+        pages = []
+        for page in range(1, PAGES_PER_ISSUE + 1):
+            page_no = f"{page:03d}"
+            articles = []
+            for i in range(1, ARTICLES_PER_PAGE + 1):
+                picture = rng.random() < 0.1
+                articles.append({
+                    'wordNumber': rng.randint(30, 120) if picture else rng.randint(200, 1500),
+                    'picAuthor': '本报记者 摄' if picture else '',
+                    'mainTitle': f"{'（图片）' if picture else ''}{_text(rng, rng.randint(8, 24))}",
+                    'issueNumber': f"{8500 + n:05d}",
+                    'articleIssueDate': issue_date,
+                    'articleColumn': rng.choice(COLUMNS),
+                    'articleHref': f"{date_str}_{page_no}_{i:02d}_{rng.randint(1000, 9999)}.html",
+                    'articleAuthor': rng.choice(AUTHORS),
+                })
+            pages.append({'pageNo': page_no, 'onePageArticleList': articles, 'withdrawList': []})
+        (root / "data" / f"{date_str}_data.json").write_text(
+            json.dumps(pages, ensure_ascii=False, indent=2), encoding='utf-8')
+
+        date_dir = root / "articles" / date_str
+        date_dir.mkdir(parents=True)
+        for page in pages:
+            for article in page['onePageArticleList']:
+                counts['articles'] += 1
+                roll = rng.random()
+                if roll >= SAVED_RATIO + SHORT_RATIO:
+                    continue
+                if roll < SAVED_RATIO:
+                    length = int(article['wordNumber'] * rng.uniform(0.8, 1.0))
+                    content = '\n\n'.join(_paragraphs(rng, length))
+                    title = article['mainTitle']
+                else:
+                    counts['short'] += 1
+                    content, title = rng.choice([('无内容', None), ('', '491 Forbidden'),
+                                                 (_text(rng, 30), article['mainTitle'])])
+                record = ArticleRecord(
+                    metadata=meta_from_dict(article),
+                    content=ArticleContent(title=title, content=content),
+                    crawl_time=datetime(year, month, 28).isoformat(),
+                    source_url=f"https://rmydb.cnii.com.cn/html/{date_str[:4]}/{date_str}/"
+                               f"{date_str}_{page['pageNo']}/{article['articleHref']}")
+                (date_dir / article['articleHref'].replace('.html', '.json')).write_bytes(
+                    encode_record(record))
+                counts['saved'] += 1
+
+    marker.write_text(json.dumps(counts), encoding='utf-8')
+    return counts
+
+
+def synthetic_html(count=HTML_PAGES, seed=2025):
+    """仿照文章页面结构的HTML：导航、脚本、标题、#ozoom 正文和图片、页脚"""
+    rng = random.Random(seed)
+    nav = ''.join(f'<li><a href="/html/node_{i}.html">{_text(rng, 4)}</a></li>' for i in range(30))
+    pages = []
+    for n in range(count):
+        paragraphs = ''.join(f"<p>{part}</p>" for part in _paragraphs(rng, rng.randint(300, 3000)))
+        images = ''.join(f'<p><img src="../../../images/2025-05/{n:03d}_{i}.jpg"></p>'
+                         for i in range(rng.randint(0, 3)))
+        pages.append(
+            '<!DOCTYPE html><html><head><meta charset="utf-8"><title>人民邮电报</title>'
+            f'<script>var pageNo = "{n}"; function track() {{ return 1; }}</script>'
+            '<style>.content p { text-indent: 2em; }</style></head><body>'
+            f'<div class="header"><ul class="nav">{nav}</ul></div>'
+            f'<div class="main"><h1>{_text(rng, 18)}</h1>'
+            f'<div class="date">2025-05-{n % 28 + 1:02d}</div>'
+            f'<div class="author">本报记者 {_text(rng, 3)}</div>'
+            f'<div id="ozoom">{images}{paragraphs}<script>track();</script></div></div>'
+            f'<div class="footer">{_text(rng, 80)}</div></body></html>')
+    return pages
+
+
+def cassette_html(directory, limit=HTML_PAGES):
+    """录像中的真实页面源码"""
+    from cassette import PAGE, load_entries
+
+    pages = [entry['page_source'] for entry in load_entries(directory)
+             if entry['kind'] == PAGE and entry.get('page_source')]
+    return pages[:limit]
+
+
+def _quiet_logging():
+    # 先于各脚本的 setup_logging 配置，之后的调用不再生效：不写日志文件，只输出警告
+    from log_setup import setup_logging
+    setup_logging(level=logging.WARNING)
+
+
+def _measure(fn, rounds, warmup=1):
+    """运行 warmup 次后计时 rounds 次，函数的输出丢弃"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(warmup):
+            fn()
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    return {
+        'rounds': rounds,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def run_parse_cases(cases, pages, rounds):
+    """在子进程中运行：解析 pages 中的每个页面"""
+    _quiet_logging()
+    from improved_crawler import ImprovedArticleCrawler
+    from practical_crawler import PracticalCrawler
+
+    functions = {
+        'parse_article_html': ImprovedArticleCrawler.parse_article_html,
+        'parse_html_content': PracticalCrawler.parse_html_content,
+    }
+    results = {}
+    for case in cases:
+        parse = functions[case]
+        results[case] = _measure(lambda: [parse(html) for html in pages], rounds)
+        results[case]['items'] = len(pages)
+    return results
+
+
+def _reopen_indexes():
+    """关闭进程内的覆盖索引和统计，下次使用时重新打开并与文件对比（数据库文件保留）"""
+    import aggregates
+    import coverage_index
+
+    for module, name in ((coverage_index, '_default_index'), (aggregates, '_default_store')):
+        instance = getattr(module, name)
+        if instance is not None:
+            instance.close()
+            setattr(module, name, None)
+
+
+def run_scan_cases(cases, corpus_dir, rounds):
+    """在子进程中运行：切换到语料目录，覆盖索引等在预热时建立（_cold 用例每轮重新打开）"""
+    os.chdir(corpus_dir)
+    _quiet_logging()
+    import analyze_data
+    import production_fix
+    import universal_crawler
+
+    def check_missing_cold():
+        _reopen_indexes()
+        universal_crawler.check_missing_articles()
+
+    functions = {
+        'check_missing_articles': universal_crawler.check_missing_articles,
+        'check_missing_articles_cold': check_missing_cold,
+        'get_problematic_articles': production_fix.get_problematic_articles,
+        'analyze_downloaded_data': analyze_data.analyze_downloaded_data,
+        'export_article_list': analyze_data.export_article_list,
+    }
+    return {case: _measure(functions[case], rounds) for case in cases}
+
+
+def _in_subprocess(fn, *args):
+    # 每个规模用新的进程：覆盖索引等进程内单例指向各自语料的 state/
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def load_history(path=HISTORY_PATH):
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baselines(history, host, runs):
+    """同一台机器最近 runs 次结果中每个用例中位数的中位数"""
+    samples = {}
+    for entry in reversed(history):
+        if entry.get('host') != host:
+            continue
+        for key, result in entry['results'].items():
+            values = samples.setdefault(key, [])
+            if len(values) < runs:
+                values.append(result['median'])
+    return {key: statistics.median(values) for key, values in samples.items()}
+
+
+def find_regressions(results, baseline, threshold, min_delta):
+    """中位数比基线慢超过 threshold（比例）且超过 min_delta 秒的用例"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        delta = result['median'] - base
+        if delta > base * threshold and delta > min_delta:
+            regressions.append((key, base, result['median']))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline):
+    print(f"\n{'用例':<36} {'最小(ms)':>10} {'中位数(ms)':>11} {'平均(ms)':>10} "
+          f"{'标准差':>9} {'轮数':>5} {'基线(ms)':>10} {'变化':>8}")
+    for key, result in results.items():
+        base = baseline.get(key)
+        change = f"{(result['median'] / base - 1) * 100:+.1f}%" if base else '-'
+        base_ms = f"{base * 1000:.1f}" if base else '-'
+        print(f"{key:<36} {result['min'] * 1000:>10.1f} {result['median'] * 1000:>11.1f} "
+              f"{result['mean'] * 1000:>10.1f} {result['stdev'] * 1000:>9.1f} {result['rounds']:>5} "
+              f"{base_ms:>10} {change:>8}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="解析、扫描和分析路径的基准测试")
+    parser.add_argument('--cases', nargs='+', choices=ALL_CASES, default=list(ALL_CASES))
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100],
+                        help="语料规模（2025年5月的倍数）")
+    parser.add_argument('--rounds', type=int, default=5, help="每个用例计时的次数")
+    parser.add_argument('--cassette', type=Path, help="从录像中取真实页面计时解析")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="中位数比基线慢超过该比例视为性能回退")
+    parser.add_argument('--min-delta', type=float, default=0.002,
+                        help="忽略小于该秒数的变化（计时噪声）")
+    parser.add_argument('--baseline-runs', type=int, default=5, help="基线取最近几次结果")
+    parser.add_argument('--history', type=Path, default=HISTORY_PATH)
+    parser.add_argument('--no-save', action='store_true', help="不把本次结果写入历史")
+    parser.add_argument('--accept', action='store_true',
+                        help="有性能回退时仍写入历史（确认变慢是预期的，之后以此为基线）")
+    parser.add_argument('--rebuild', action='store_true', help="重新生成语料")
+    args = parser.parse_args()
+
+    results = {}
+    parse_cases = [case for case in args.cases if case in PARSE_CASES]
+    scan_cases = [case for case in args.cases if case in SCAN_CASES]
+
+    if parse_cases:
+        pages = cassette_html(args.cassette) if args.cassette else synthetic_html()
+        if not pages:
+            print(f"❌ 录像中没有页面: {args.cassette}")
+            return 1
+        source = 'cassette' if args.cassette else 'synthetic'
+        print(f"解析用例: {len(pages)} 个页面 ({source})")
+        for case, result in _in_subprocess(run_parse_cases, parse_cases, pages, args.rounds).items():
+            results[f"{case}[{source}]"] = result
+
+    for scale in args.scales if scan_cases else []:
+        corpus_dir = (BENCH_DIR / f"corpus_{scale}x").resolve()
+        if args.rebuild and corpus_dir.exists():
+            shutil.rmtree(corpus_dir)
+        start = time.time()
+        counts = build_corpus(corpus_dir, scale)
+        print(f"{scale}x 语料: {counts['issues']} 期, {counts['articles']} 篇文章, "
+              f"已保存 {counts['saved']} 篇 ({time.time() - start:.1f} 秒)")
+        for case, result in _in_subprocess(run_scan_cases, scan_cases, corpus_dir, args.rounds).items():
+            results[f"{case}@{scale}x"] = result
+
+    history = load_history(args.history)
+    host = platform.node()
+    baseline = baselines(history, host, args.baseline_runs)
+    print_results(results, baseline)
+
+    regressions = find_regressions(results, baseline, args.threshold, args.min_delta)
+    # 回退的结果写入历史会拉低基线，几次之后不再报告
+    if regressions and not args.accept and not args.no_save:
+        print("\n有性能回退，结果未写入历史（确认是预期的变化时加 --accept）")
+    elif not args.no_save:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'host': host,
+            'python': platform.python_version(),
+            'results': results,
+            'regressions': [key for key, _, _ in regressions],
+        }
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        print(f"\n结果已写入 {args.history}")
+
+    if regressions:
+        print(f"\n❌ 性能回退（阈值 {args.threshold:.0%}）:")
+        for key, base, median in regressions:
+            print(f"   {key}: {base * 1000:.1f} ms -> {median * 1000:.1f} ms ({(median / base - 1) * 100:+.1f}%)")
+        if args.accept:
+            print("已确认（--accept），作为新的基线")
+            return 0
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+精简浏览器配置 - eager加载 + 通过CDP屏蔽图片/媒体/字体（无头可选）
+只需要 #ozoom 的文本，不必下载图片、字体和音视频资源
+"""
+
+import os
+import json
+import time
+import logging
+from collections import defaultdict
+
+try:
+    import psutil
+except ImportError:  # psutil 可选，仅用于统计Chrome内存
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# 精简模式下屏蔽的资源（Network.setBlockedURLs 支持通配符）
+LEAN_BLOCKED_URL_PATTERNS = [
+    # 图片
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.bmp', '*.svg', '*.ico',
+    # 音视频
+    '*.mp4', '*.webm', '*.ogg', '*.mp3', '*.wav', '*.m4a', '*.flv',
+    # 字体
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+]
+
+
+def lean_headless():
+    """精简模式是否无头运行
+
+    无头浏览器更容易被反爬识别（见 ANTI_CRAWLER_SOLUTION.md），默认有头运行；
+    设置环境变量 CRAWL_HEADLESS=1 时开启，队列worker等子进程会继承该设置。
+    """
+    return os.environ.get('CRAWL_HEADLESS') == '1'
+
+
+def apply_lean_options(chrome_options):
+    """在Chrome启动参数上叠加精简配置"""
+    if lean_headless():
+        chrome_options.add_argument('--headless=new')
+    chrome_options.add_argument('--mute-audio')
+    chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+    chrome_options.add_argument('--disable-extensions')
+    # DOMContentLoaded 后即返回，不等待图片等子资源
+    chrome_options.page_load_strategy = 'eager'
+    # 打开性能日志，用于统计流量和被屏蔽的请求
+    chrome_options.set_capability(
+        'goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def enable_resource_blocking(driver):
+    """通过CDP屏蔽图片、媒体和字体请求"""
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd(
+        'Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URL_PATTERNS})
+    logger.info(f"已启用资源屏蔽: {len(LEAN_BLOCKED_URL_PATTERNS)} 条规则")
+
+
+def chrome_rss_bytes(driver):
+    """统计chromedriver及其所有Chrome子进程的RSS（需要psutil）"""
+    if psutil is None:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return None
+
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total
+
+
+class ProfileStats:
+    """累计页面加载的流量、屏蔽请求数、加载耗时和内存"""
+
+    def __init__(self):
+        self.pages = 0
+        self.bytes_transferred = 0
+        self.load_seconds = 0.0
+        self.blocked = defaultdict(int)
+        self.peak_rss = 0
+
+    def record_page(self, driver, load_seconds):
+        """读取一次页面加载产生的性能日志并累计"""
+        self.pages += 1
+        self.load_seconds += load_seconds
+
+        try:
+            entries = driver.get_log('performance')
+        except Exception as e:
+            logger.debug(f"读取性能日志失败: {e}")
+            entries = []
+
+        request_types = {}
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                request_types[params.get('requestId')] = params.get(
+                    'type', 'Other')
+            elif method == 'Network.loadingFinished':
+                self.bytes_transferred += int(
+                    params.get('encodedDataLength', 0))
+            elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+                resource_type = params.get('type') or request_types.get(
+                    params.get('requestId'), 'Other')
+                self.blocked[resource_type] += 1
+
+        rss = chrome_rss_bytes(driver)
+        if rss:
+            self.peak_rss = max(self.peak_rss, rss)
+
+    def summary(self):
+        """返回统计摘要"""
+        return {
+            'pages': self.pages,
+            'bytes_transferred': self.bytes_transferred,
+            'avg_bytes_per_page': self.bytes_transferred / self.pages if self.pages else 0,
+            'avg_load_seconds': self.load_seconds / self.pages if self.pages else 0,
+            'blocked_requests': dict(self.blocked),
+            'peak_rss': self.peak_rss,
+        }
+
+    def log_summary(self):
+        """输出统计摘要到日志"""
+        s = self.summary()
+        if not s['pages']:
+            return
+        logger.info(
+            f"精简模式统计: 页面 {s['pages']}, "
+            f"平均流量 {s['avg_bytes_per_page'] / 1024:.1f} KB/页, "
+            f"平均加载 {s['avg_load_seconds']:.2f} 秒, "
+            f"屏蔽请求 {sum(s['blocked_requests'].values())} 个 {s['blocked_requests']}, "
+            f"Chrome峰值内存 {s['peak_rss'] / 1024 / 1024:.0f} MB")
+
+
+def _load_once(crawler_cls, url, lean):
+    """用指定配置加载一次页面，返回流量、耗时和内存"""
+    crawler = crawler_cls(lean=lean)
+    try:
+        start = time.time()
+        crawler.driver.get(url)
+        load_seconds = time.time() - start
+        transferred = crawler.driver.execute_script(
+            "return performance.getEntriesByType('navigation')"
+            ".concat(performance.getEntriesByType('resource'))"
+            ".reduce((s, e) => s + (e.transferSize || 0), 0)")
+        rss = chrome_rss_bytes(crawler.driver)
+        return {'bytes': transferred or 0, 'seconds': load_seconds, 'rss': rss}
+    finally:
+        crawler.close()
+
+
+def compare_profiles(url, crawler_cls=None):
+    """分别用普通模式和精简模式加载同一页面，报告节省的流量和内存"""
+    if crawler_cls is None:
+        from practical_crawler import PracticalCrawler
+        crawler_cls = PracticalCrawler
+
+    full = _load_once(crawler_cls, url, lean=False)
+    lean = _load_once(crawler_cls, url, lean=True)
+
+    print(f"页面: {url}")
+    print(f"  流量: {full['bytes'] / 1024:.1f} KB -> {lean['bytes'] / 1024:.1f} KB "
+          f"(节省 {(full['bytes'] - lean['bytes']) / 1024:.1f} KB)")
+    print(f"  加载耗时: {full['seconds']:.2f} 秒 -> {lean['seconds']:.2f} 秒")
+    if full['rss'] and lean['rss']:
+        print(f"  Chrome内存: {full['rss'] / 1024 / 1024:.0f} MB -> "
+              f"{lean['rss'] / 1024 / 1024:.0f} MB "
+              f"(节省 {(full['rss'] - lean['rss']) / 1024 / 1024:.0f} MB)")
+    else:
+        print("  Chrome内存: 未安装psutil，跳过")
+    return full, lean
+
+
+if __name__ == "__main__":
+    import sys
+    test_url = (sys.argv[1] if len(sys.argv) > 1 else
+                "https://rmydb.cnii.com.cn/html/2025/20250520/20250520_001/20250520_001_02_2642.html")
+    compare_profiles(test_url)
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP 响应和页面源码的录制 / 回放
+录制模式下，RenminYoudianCrawler 的 requests 会话和 Selenium 爬虫的浏览器照常访问网站，
+同时把每个响应（状态码、响应头、内容或 page_source）追加到 gzip 压缩的 JSONL 录像中；
+回放模式下不访问网络、不启动浏览器，按原来的顺序从录像返回响应，节奏等待全部跳过，
+整次历史运行可以离线在几秒内重新执行，用于复现问题和性能回归测试。
+
+录像是一个目录，每个录制进程写一个 part-<pid>.jsonl.gz（多进程worker互不干扰）。
+通过环境变量 CRAWL_CASSETTE（录像目录）和 CRAWL_CASSETTE_MODE（record / replay）启用，
+子进程自动继承；也可以用下面的命令包装任意抓取命令。
+
+用法:
+    python cassette.py record cassettes/0501 -- python crawler.py --date 20250501
+    python cassette.py record cassettes/0501 -- python improved_crawler.py data/20250501_data.json
+    python cassette.py replay cassettes/0501 --workdir /tmp/replay -- python improved_crawler.py data/20250501_data.json
+    python cassette.py show cassettes/0501
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import atexit
+import base64
+import shutil
+import argparse
+import logging
+import tempfile
+import threading
+import subprocess
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from log_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_ENV = 'CRAWL_CASSETTE'
+MODE_ENV = 'CRAWL_CASSETTE_MODE'
+RECORD = 'record'
+REPLAY = 'replay'
+
+HTTP = 'http'
+PAGE = 'page'
+
+# 内容已解码，回放时不能再声明压缩或原来的长度
+_DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """回放时录像中没有该请求；作为连接错误交给调用方原有的错误处理"""
+
+
+def replaying():
+    """当前进程是否处于回放模式（回放时跳过所有节奏等待）"""
+    return os.environ.get(MODE_ENV) == REPLAY and bool(os.environ.get(CASSETTE_ENV))
+
+
+def pause(seconds):
+    """抓取节奏中的等待；回放时立即返回"""
+    if not replaying():
+        time.sleep(seconds)
+
+
+def _read_part(path):
+    """读取一个录像分段；进程被杀时最后一条可能不完整，忽略"""
+    entries = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break
+    except (EOFError, OSError) as e:
+        logger.warning(f"录像分段不完整 {path}: {e}")
+    return entries
+
+
+def load_entries(directory):
+    """按录制时间合并所有分段"""
+    entries = []
+    for part in sorted(Path(directory).glob("part-*.jsonl.gz")):
+        entries.extend(_read_part(part))
+    entries.sort(key=lambda entry: (entry['time'], entry['seq']))
+    return entries
+
+
+class Cassette:
+    """一个录像目录：录制时追加写入本进程的分段，回放时按 (类型, 方法, URL) 依次取出响应"""
+
+    def __init__(self, directory, mode):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"未知的录像模式: {mode}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+        self._responses = defaultdict(deque)
+        self._last = {}
+        if mode == REPLAY:
+            if not self.directory.exists():
+                raise FileNotFoundError(f"录像不存在: {self.directory}")
+            for entry in load_entries(self.directory):
+                self._responses[(entry['kind'], entry['method'], entry['url'])].append(entry)
+            logger.info(f"回放录像 {self.directory}: {sum(map(len, self._responses.values()))} 个响应")
+
+    def record(self, kind, method, url, **fields):
+        entry = {'kind': kind, 'method': method, 'url': url,
+                 'time': time.time(), 'seq': 0, **fields}
+        with self._lock:
+            if self._file is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                part = self.directory / f"part-{os.getpid()}.jsonl.gz"
+                self._file = gzip.open(part, 'at', encoding='utf-8')
+            self._seq += 1
+            entry['seq'] = self._seq
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            # 每条都刷新，进程被杀时已录制的响应仍然可用
+            self._file.flush()
+            self.stats[kind] += 1
+
+    def next(self, kind, method, url):
+        """回放下一个响应；同一URL的录制次数用完后重复最后一个"""
+        key = (kind, method, url)
+        with self._lock:
+            queue = self._responses.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[key] = entry
+            else:
+                entry = self._last.get(key)
+            if entry is None:
+                self.stats['miss'] += 1
+                raise CassetteMiss(f"录像中没有该请求: {method} {url}")
+            self.stats[kind] += 1
+            return entry
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        if self.stats:
+            action = "录制" if self.mode == RECORD else "回放"
+            logger.info(f"{action}录像 {self.directory}: 接口 {self.stats[HTTP]}, "
+                        f"页面 {self.stats[PAGE]}"
+                        + (f", 未命中 {self.stats['miss']}" if self.mode == REPLAY else ""))
+
+
+_default_cassette = None
+_default_lock = threading.Lock()
+
+
+def get_cassette():
+    """按环境变量打开进程内共享的录像；未启用时返回 None"""
+    global _default_cassette
+    directory = os.environ.get(CASSETTE_ENV)
+    if not directory:
+        return None
+    with _default_lock:
+        if _default_cassette is None:
+            _default_cassette = Cassette(directory, os.environ.get(MODE_ENV, RECORD))
+            atexit.register(_default_cassette.close)
+        return _default_cassette
+
+
+def _reset_after_fork():
+    # 子进程写自己的分段，不与父进程共用文件句柄
+    global _default_cassette, _default_lock
+    _default_cassette = None
+    _default_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ---- requests ----
+
+def _error_class(name, module, default):
+    cls = getattr(module, name, None)
+    return cls if isinstance(cls, type) and issubclass(cls, default) else default
+
+
+class CassetteAdapter(BaseAdapter):
+    """requests 传输适配器：录制时转发给真实的 HTTPAdapter 并记录，回放时从录像构造响应"""
+
+    def __init__(self, cassette):
+        super().__init__()
+        self.cassette = cassette
+        self.inner = HTTPAdapter() if cassette.mode == RECORD else None
+
+    def send(self, request, **kwargs):
+        if self.cassette.mode == REPLAY:
+            return self._replay(request)
+
+        start = time.time()
+        try:
+            response = self.inner.send(request, **kwargs)
+            content = response.content
+        except requests.exceptions.RequestException as e:
+            self.cassette.record(HTTP, request.method, request.url,
+                                 error=type(e).__name__, message=str(e))
+            raise
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in _DROPPED_HEADERS}
+        self.cassette.record(HTTP, request.method, request.url,
+                             status=response.status_code, reason=response.reason,
+                             headers=headers, encoding=response.encoding,
+                             body=base64.b64encode(content).decode('ascii'),
+                             elapsed=time.time() - start)
+        return response
+
+    def _replay(self, request):
+        entry = self.cassette.next(HTTP, request.method, request.url)
+        if 'error' in entry:
+            raise _error_class(entry['error'], requests.exceptions,
+                               requests.exceptions.RequestException)(entry['message'], request=request)
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry.get('reason')
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = entry.get('encoding')
+        response._content = base64.b64decode(entry['body'])
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(0)
+        return response
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+
+def install(session):
+    """启用录像时让会话的所有请求经过录像，返回会话本身"""
+    cassette = get_cassette()
+    if cassette is not None:
+        adapter = CassetteAdapter(cassette)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    return session
+
+
+# ---- Selenium ----
+
+class RecordingDriver:
+    """包装真实的 WebDriver：每次 get 之后第一次读取 page_source 时记录页面"""
+
+    def __init__(self, driver, cassette):
+        self._driver = driver
+        self._cassette = cassette
+        self._pending = None
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def get(self, url):
+        self._pending = None
+        start = time.time()
+        try:
+            self._driver.get(url)
+        except Exception as e:
+            self._cassette.record(PAGE, 'GET', url, error=type(e).__name__, message=str(e))
+            raise
+        self._pending = (url, time.time() - start)
+
+    @property
+    def page_source(self):
+        source = self._driver.page_source
+        if self._pending is not None:
+            url, load_seconds = self._pending
+            self._pending = None
+            self._cassette.record(PAGE, 'GET', url, page_source=source,
+                                  title=self._driver.title,
+                                  current_url=self._driver.current_url,
+                                  elapsed=load_seconds)
+        return source
+
+
+class ReplayDriver:
+    """不启动浏览器，按录像返回页面；只实现爬虫用到的 WebDriver 接口"""
+
+    def __init__(self, cassette):
+        self._cassette = cassette
+        self.page_source = ''
+        self.title = ''
+        self.current_url = 'data:,'
+
+    def get(self, url):
+        entry = self._cassette.next(PAGE, 'GET', url)
+        if 'error' in entry:
+            from selenium.common import exceptions
+            raise _error_class(entry['error'], exceptions,
+                               exceptions.WebDriverException)(entry['message'])
+        self.page_source = entry['page_source']
+        self.title = entry['title']
+        self.current_url = entry['current_url']
+
+    def execute_script(self, script, *args):
+        return None
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def get_log(self, log_type):
+        return []
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def quit(self):
+        pass
+
+
+def start_browser(chrome_options):
+    """Selenium 爬虫启动浏览器的入口：回放时返回 ReplayDriver，录制时包装真实浏览器"""
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == REPLAY:
+        return ReplayDriver(cassette)
+
+    from driver_cache import start_chrome
+    driver = start_chrome(chrome_options)
+    if cassette is not None:
+        return RecordingDriver(driver, cassette)
+    return driver
+
+
+# ---- 命令行 ----
+
+def _resolve_scripts(command, base_dir):
+    """在其他目录回放时，命令中的 .py 脚本仍指向当前目录中的文件"""
+    resolved = []
+    for arg in command:
+        if arg.endswith('.py') and (base_dir / arg).is_file():
+            arg = str((base_dir / arg).resolve())
+        resolved.append(arg)
+    return resolved
+
+
+def run_with_cassette(directory, mode, command, workdir=None):
+    """在启用录像的环境中运行命令，返回退出码"""
+    env = dict(os.environ, **{CASSETTE_ENV: str(Path(directory).resolve()), MODE_ENV: mode})
+    cwd = Path.cwd()
+    if workdir is not None:
+        workdir = Path(workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+        # 回放输入（data.json 等）复制到工作目录，回放的写入不影响当前目录
+        for name in ('data',):
+            if (cwd / name).is_dir() and not (workdir / name).exists():
+                shutil.copytree(cwd / name, workdir / name)
+        command = _resolve_scripts(command, cwd)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(cwd), env.get('PYTHONPATH')]))
+
+    start = time.time()
+    result = subprocess.run(command, cwd=workdir or cwd, env=env)
+    action = "录制" if mode == RECORD else "回放"
+    print(f"{action}完成: 用时 {time.time() - start:.1f} 秒, 退出码 {result.returncode}"
+          + (f", 工作目录 {workdir}" if workdir else ""))
+    return result.returncode
+
+
+def show(directory):
+    entries = load_entries(directory)
+    if not entries:
+        print(f"录像为空: {directory}")
+        return
+    size = sum(part.stat().st_size for part in Path(directory).glob("part-*.jsonl.gz"))
+    kinds = Counter(entry['kind'] for entry in entries)
+    statuses = Counter(entry.get('status') or entry.get('error') or 'ok' for entry in entries)
+    first = datetime.fromtimestamp(entries[0]['time'])
+    last = datetime.fromtimestamp(entries[-1]['time'])
+    print(f"录像: {directory} ({size / 1024 / 1024:.1f} MB)")
+    print(f"录制时间: {first:%Y-%m-%d %H:%M:%S} - {last:%Y-%m-%d %H:%M:%S} "
+          f"({(last - first).total_seconds() / 60:.1f} 分钟)")
+    print(f"响应: 接口 {kinds[HTTP]}, 页面 {kinds[PAGE]}, "
+          f"不同URL {len({entry['url'] for entry in entries})}")
+    print("结果: " + ", ".join(f"{status} {count}" for status, count in statuses.most_common()))
+
+
+def main():
+    """主函数"""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="抓取响应的录制与回放")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record', help="运行命令并录制所有响应")
+    record_parser.add_argument('cassette', type=Path, help="录像目录")
+    replay_parser = subparsers.add_parser('replay', help="离线回放录像运行命令")
+    replay_parser.add_argument('cassette', type=Path, help="录像目录")
+    replay_parser.add_argument('--workdir', type=Path,
+                               help="在该目录中运行（默认新建临时目录，不影响当前目录的 data/、articles/ 和 state/）")
+    replay_parser.add_argument('--in-place', action='store_true', help="直接在当前目录回放")
+    show_parser = subparsers.add_parser('show', help="显示录像内容统计")
+    show_parser.add_argument('cassette', type=Path, help="录像目录")
+    # -- 之后为要运行的命令，原样传递
+    argv = sys.argv[1:]
+    command = []
+    if '--' in argv:
+        split = argv.index('--')
+        argv, command = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        show(args.cassette)
+        return 0
+
+    if not command:
+        parser.error("缺少要运行的命令，例如: -- python crawler.py --date 20250501")
+
+    if args.command == 'record':
+        return run_with_cassette(args.cassette, RECORD, command)
+
+    if not args.cassette.exists():
+        print(f"❌ 录像不存在: {args.cassette}")
+        return 1
+    workdir = None
+    if not args.in_place:
+        workdir = args.workdir or Path(tempfile.mkdtemp(prefix='replay-'))
+    return run_with_cassette(args.cassette, REPLAY, command, workdir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,53 +4,35 @@
 简单的问题文章统计和修复测试
 """
 
-import json
 import os
 from pathlib import Path
 
+from coverage_index import get_coverage
+from schema import SchemaError, load_record
+
 def count_problematic_articles():
-    """统计问题文章数量"""
+    """统计问题文章数量（总数和问题列表来自覆盖索引，只读取问题文章本身）"""
     articles_dir = Path("articles")
-    problematic_count = 0
-    total_count = 0
+    coverage = get_coverage()
+    _, _, total_count, valid_count = coverage.totals()
     problematic_details = []
     
-    for date_dir in articles_dir.iterdir():
-        if not date_dir.is_dir():
+    for date_str, article_href in coverage.invalid_articles():
+        article_file = articles_dir / date_str / article_href.replace('.html', '.json')
+        try:
+            record = load_record(article_file)
+        except (OSError, SchemaError) as e:
+            print(f"读取失败: {article_file} - {e}")
             continue
-            
-        for article_file in date_dir.glob("*.json"):
-            total_count += 1
-            try:
-                with open(article_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                content = data.get('content', {})
-                title = content.get('title', '')
-                article_content = content.get('content', '')
-                
-                # 检查是否是问题文章
-                is_problematic = (
-                    title == '491 Forbidden' or
-                    article_content == '无内容' or
-                    '491 Forbidden' in title or
-                    len(article_content) < 50
-                )
-                
-                if is_problematic:
-                    problematic_count += 1
-                    metadata = data.get('metadata', {})
-                    problematic_details.append({
-                        'date': date_dir.name,
-                        'file': article_file.name,
-                        'title': metadata.get('mainTitle', '未知'),
-                        'content_length': len(article_content)
-                    })
-                    
-            except Exception as e:
-                print(f"读取失败: {article_file} - {e}")
+        
+        problematic_details.append({
+            'date': date_str,
+            'file': article_file.name,
+            'title': record.metadata.main_title or '未知',
+            'content_length': len(record.content.content or '')
+        })
     
-    return total_count, problematic_count, problematic_details
+    return total_count, total_count - valid_count, problematic_details
 
 def main():
     print("正在统计问题文章...")
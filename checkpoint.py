@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量修复的断点日志与优雅退出
+日志为只追加的JSON Lines文件，每条记录写入后立即fsync，进程崩溃也不会丢失已完成的进度
+"""
+
+import os
+import json
+import time
+import uuid
+import signal
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = Path("state") / "journals"
+
+# 日志事件
+PLAN = 'plan'
+ATTEMPT = 'attempt'
+OUTCOME = 'outcome'
+END = 'end'
+
+
+class RunJournal:
+    """一次批量运行的进度日志：计划 -> 每篇文章的尝试/结果 -> 结束"""
+
+    def __init__(self, path, run_id=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.fd = os.open(str(self.path),
+                          os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+
+        # 崩溃可能留下没有换行的半行，先补上换行，避免与新记录拼在一起
+        size = os.fstat(self.fd).st_size
+        if size and os.pread(self.fd, 1, size - 1) != b'\n':
+            os.write(self.fd, b'\n')
+
+    def _append(self, record):
+        record = {'ts': time.time(), 'run_id': self.run_id, **record}
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        os.write(self.fd, line.encode('utf-8'))
+        os.fsync(self.fd)
+
+    def plan(self, items):
+        """记录本次运行要处理的文章列表（每项需包含 key）"""
+        self._append({'event': PLAN, 'items': items})
+
+    def attempt(self, key):
+        """开始处理某篇文章"""
+        self._append({'event': ATTEMPT, 'key': key})
+
+    def outcome(self, key, outcome, duration_s=None, error=None, stages=None):
+        """记录处理结果：success / failed / error；stages 为各阶段耗时（秒）"""
+        record = {'event': OUTCOME, 'key': key, 'outcome': outcome,
+                  'duration_s': duration_s, 'error': error}
+        if stages:
+            record['stages'] = stages
+        self._append(record)
+
+    def end(self, status):
+        """记录运行结束：finished / interrupted"""
+        self._append({'event': END, 'status': status})
+
+    def close(self):
+        os.close(self.fd)
+
+    @classmethod
+    def resume(cls, path):
+        """读取最近一次运行的状态，返回 (journal, state)；没有可恢复的运行时返回 (None, None)"""
+        state = load_last_run(path)
+        if state is None or state['ended']:
+            return None, None
+        return cls(path, run_id=state['run_id']), state
+
+
+def read_records(path):
+    """逐条读取日志记录，跳过崩溃时可能写了一半的最后一行"""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"跳过不完整的日志行: {path}")
+
+
+def load_last_run(path):
+    """汇总最近一次运行：计划、已完成、处理中断的文章"""
+    state = None
+    for record in read_records(path):
+        if record['event'] == PLAN:
+            state = {
+                'run_id': record['run_id'],
+                'items': record['items'],
+                'outcomes': {},
+                'in_flight': None,
+                'ended': False,
+            }
+        elif state is None or record['run_id'] != state['run_id']:
+            continue
+        elif record['event'] == ATTEMPT:
+            state['in_flight'] = record['key']
+        elif record['event'] == OUTCOME:
+            state['outcomes'][record['key']] = record['outcome']
+            state['in_flight'] = None
+        elif record['event'] == END:
+            state['ended'] = record['status'] == 'finished'
+    return state
+
+
+def remaining_items(state):
+    """计划中尚未得到结果的文章（包括崩溃时正在处理的那篇）"""
+    return [item for item in state['items'] if item['key'] not in state['outcomes']]
+
+
+class GracefulShutdown:
+    """捕获SIGINT/SIGTERM：第一次只设置退出标志，让当前文章处理完；第二次SIGINT立即中断"""
+
+    def __init__(self):
+        self.requested = False
+        self._previous = {}
+        self._pid = os.getpid()
+
+    def _handle(self, signum, frame):
+        if os.getpid() != self._pid and signum == signal.SIGTERM:
+            # fork 出的子进程在建立自己的退出处理之前沿用了父进程的处理函数，
+            # 此时设置的是父进程对象的副本，按默认行为直接退出
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+            return
+        if self.requested and signum == signal.SIGINT:
+            raise KeyboardInterrupt
+        self.requested = True
+        logger.warning(
+            f"收到信号 {signal.Signals(signum).name}，处理完当前文章后退出（再次Ctrl+C立即中断）")
+
+    def __enter__(self):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            self._previous[signum] = signal.signal(signum, self._handle)
+        return self
+
+    def sleep(self, seconds):
+        """可被退出信号打断的等待，返回是否完整等待；回放录像时不等待"""
+        from cassette import replaying
+
+        if replaying():
+            return not self.requested
+        deadline = time.time() + seconds
+        while not self.requested:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 1.0))
+        return False
+
+    def __exit__(self, exc_type, exc, tb):
+        for signum, handler in self._previous.items():
+            signal.signal(signum, handler)
+        return False
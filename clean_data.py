@@ -2,59 +2,236 @@
 # -*- coding: utf-8 -*-
 """
 清理无效的HTML文件，只保留有效的JSON数据文件
+每个文件只读取开头几KB判断类型（HTML、JSON、空文件），再检查结尾是否完整；
+无效文件移入隔离目录并记录原因清单，不直接删除，误判时可以恢复而不必重新抓取
+
+用法:
+    python clean_data.py                       # 清理 data/
+    python clean_data.py --dry-run             # 只显示结果，不移动文件
+    python clean_data.py --validate            # 对通过检查的文件再做完整的结构校验
+    python clean_data.py --restore quarantine/20250601-120000-123456-4242
 """
 
 import os
+import re
+import sys
 import json
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
-def clean_invalid_files():
-    """清理无效的文件"""
-    data_dir = Path("data")
-    
+from aggregates import aggregate_issue, retract_issue
+from coverage_index import forget_issue, note_issue
+from schema import SchemaError, decode_issue, load_issue
+
+QUARANTINE_DIR = Path("quarantine")
+MANIFEST_NAME = "manifest.jsonl"
+
+PREFIX_BYTES = 4096
+TAIL_BYTES = 64
+
+# 分类结果
+VALID = 'valid'
+EMPTY = 'empty'            # 空文件或只有空白
+EMPTY_DATA = 'empty_data'  # 空数组 []
+HTML = 'html'              # 反爬页面、错误页等
+TRUNCATED = 'truncated'    # 结尾不完整
+NOT_JSON = 'not_json'
+SCHEMA = 'schema'          # --validate 时结构不符
+
+_BOM = b'\xef\xbb\xbf'
+_ISSUE_NAME = re.compile(r'(\d{8})_data\.json')
+_WHITESPACE = b' \t\r\n'
+
+
+def sniff(path):
+    """只读取文件开头和结尾判断类型，返回 (分类, 说明)"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(PREFIX_BYTES)
+        if size > PREFIX_BYTES:
+            f.seek(max(size - TAIL_BYTES, PREFIX_BYTES))
+            tail = f.read()
+        else:
+            tail = head
+
+    head = head[len(_BOM):] if head.startswith(_BOM) else head
+    stripped = head.lstrip(_WHITESPACE)
+    if not stripped:
+        return (EMPTY, f"{size} 字节") if size <= PREFIX_BYTES else (NOT_JSON, "开头全是空白")
+
+    # HTML页面（<!DOCTYPE、<html、<?xml ...）总是以 < 开头；不在JSON正文里搜索，避免误判
+    if stripped.startswith(b'<'):
+        return HTML, stripped[:60].decode('utf-8', 'replace')
+
+    if not stripped.startswith(b'['):
+        return NOT_JSON, stripped[:60].decode('utf-8', 'replace')
+    if stripped[1:].lstrip(_WHITESPACE).startswith(b']'):
+        return EMPTY_DATA, "[]"
+    if not tail.rstrip(_WHITESPACE).endswith(b']'):
+        return TRUNCATED, f"结尾: {tail.rstrip()[-20:].decode('utf-8', 'replace')}"
+    return VALID, None
+
+
+def validate(path):
+    """完整解码并校验 data.json 的结构"""
+    try:
+        pages = decode_issue(Path(path).read_bytes(), source=path)
+    except SchemaError as e:
+        return SCHEMA, str(e)[:100]
+    if not pages:
+        return EMPTY_DATA, "[]"
+    return VALID, f"{len(pages)} 条数据"
+
+
+def classify(path, full_validate=False):
+    kind, detail = sniff(path)
+    if kind == VALID and full_validate:
+        kind, detail = validate(path)
+    return kind, detail
+
+
+def _issue_date(path):
+    """期次数据文件 YYYYMMDD_data.json 的日期，其他文件返回 None"""
+    match = _ISSUE_NAME.fullmatch(Path(path).name)
+    return match.group(1) if match else None
+
+
+def _issue_removed(path):
+    # 覆盖索引和滚动统计中撤销该期，否则隔离后仍计为已下载；
+    # 只直接更新已有的记录，不触发会重新读取数据文件的刷新或重建
+    date_str = _issue_date(path)
+    if date_str:
+        forget_issue(date_str)
+        retract_issue(date_str)
+
+
+def _issue_restored(path):
+    date_str = _issue_date(path)
+    if not date_str:
+        return
+    try:
+        stat = Path(path).stat()
+        pages = load_issue(path)
+    except (OSError, SchemaError):
+        return
+    note_issue(date_str, pages, lightweight=True)
+    aggregate_issue(date_str, pages, (stat.st_mtime_ns, stat.st_size), lightweight=True)
+
+
+class Quarantine:
+    """隔离目录：按运行时间建子目录，保留原相对路径，原因写入 manifest.jsonl"""
+
+    def __init__(self, root=QUARANTINE_DIR):
+        # 同一秒内的两次运行（或并行运行）不能共用目录，加上微秒和进程号
+        self.run_dir = Path(root) / f"{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}"
+        self.count = 0
+
+    def move(self, path, reason, detail):
+        path = Path(path)
+        target = self.run_dir / (Path(*path.parts[1:]) if path.is_absolute() else path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        size = path.stat().st_size
+        shutil.move(str(path), str(target))
+        _issue_removed(path)
+        entry = {
+            'original': path.as_posix(),
+            'quarantined': target.as_posix(),
+            'reason': reason,
+            'detail': detail,
+            'size': size,
+            'time': datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(self.run_dir / MANIFEST_NAME, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.count += 1
+
+
+def restore(run_dir):
+    """把某次清理隔离的文件移回原位置（原位置已有文件时跳过），返回恢复的文件数"""
+    manifest = Path(run_dir) / MANIFEST_NAME
+    restored = 0
+    with open(manifest, 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    for entry in entries:
+        source, original = Path(entry['quarantined']), Path(entry['original'])
+        if not source.exists():
+            continue
+        if original.exists():
+            print(f"跳过 {original}: 原位置已有文件")
+            continue
+        original.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(source), str(original))
+        _issue_restored(original)
+        print(f"已恢复: {original} ({entry['reason']})")
+        restored += 1
+    return restored
+
+
+def clean_invalid_files(data_dir=Path("data"), workers=8, dry_run=False,
+                        full_validate=False, quarantine_root=QUARANTINE_DIR):
+    """清理无效的文件：并行分类，无效文件移入隔离目录"""
+    data_dir = Path(data_dir)
+
     if not data_dir.exists():
         print("data目录不存在")
         return
-    
+
     print(f"开始清理 {data_dir} 目录...")
-    
-    valid_count = 0
-    invalid_count = 0
-    
-    files = list(data_dir.glob("*.json"))
+
+    files = sorted(data_dir.glob("*.json"))
     print(f"找到 {len(files)} 个文件")
-    
-    for file_path in files:
-        try:
-            print(f"检查文件: {file_path.name}")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                
-            # 检查是否是HTML内容
-            if content.startswith('<!DOCTYPE') or '<html' in content.lower():
-                print(f"删除HTML文件: {file_path.name}")
-                file_path.unlink()
-                invalid_count += 1
-            else:
-                # 尝试解析JSON
-                try:
-                    data = json.loads(content)
-                    if isinstance(data, list) and len(data) > 0:
-                        print(f"保留有效文件: {file_path.name} ({len(data)} 条数据)")
-                        valid_count += 1
-                    else:
-                        print(f"删除空数据文件: {file_path.name}")
-                        file_path.unlink()
-                        invalid_count += 1
-                except json.JSONDecodeError as e:
-                    print(f"删除非JSON文件: {file_path.name} (JSON解析错误: {str(e)[:50]}...)")
-                    file_path.unlink()
-                    invalid_count += 1
-                    
-        except Exception as e:
-            print(f"处理文件 {file_path.name} 时出错: {e}")
-    
-    print(f"\n清理完成! 保留有效文件: {valid_count}, 删除无效文件: {invalid_count}")
+
+    # 分类只读取文件首尾几KB，瓶颈在I/O，用线程池并行
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda path: classify(path, full_validate), files))
+
+    quarantine = Quarantine(quarantine_root)
+    valid_count = 0
+    reasons = {}
+    for file_path, (kind, detail) in zip(files, results):
+        if kind == VALID:
+            valid_count += 1
+            continue
+        reasons[kind] = reasons.get(kind, 0) + 1
+        action = "将隔离" if dry_run else "隔离"
+        print(f"{action}文件: {file_path.name} ({kind}{': ' + detail if detail else ''})")
+        if not dry_run:
+            try:
+                quarantine.move(file_path, kind, detail)
+            except OSError as e:
+                print(f"处理文件 {file_path.name} 时出错: {e}")
+
+    invalid_count = sum(reasons.values())
+    summary = ", ".join(f"{kind} {count}" for kind, count in sorted(reasons.items()))
+    print(f"\n清理完成! 保留有效文件: {valid_count}, 无效文件: {invalid_count}"
+          f"{' (' + summary + ')' if summary else ''}")
+    if quarantine.count:
+        print(f"已移入隔离目录: {quarantine.run_dir}")
+        print(f"如需恢复: python clean_data.py --restore {quarantine.run_dir}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="清理无效的数据文件")
+    parser.add_argument('--dir', type=Path, default=Path("data"), help="要清理的目录")
+    parser.add_argument('--workers', type=int, default=8, help="并行线程数")
+    parser.add_argument('--dry-run', action='store_true', help="只显示结果，不移动文件")
+    parser.add_argument('--validate', action='store_true',
+                        help="对通过首尾检查的文件再做完整的结构校验（需要读取整个文件）")
+    parser.add_argument('--restore', type=Path, metavar='RUN_DIR',
+                        help="把某次清理隔离的文件移回原位置")
+    args = parser.parse_args()
+
+    if args.restore:
+        print(f"已恢复 {restore(args.restore)} 个文件")
+        return
+
+    clean_invalid_files(args.dir, workers=args.workers, dry_run=args.dry_run,
+                        full_validate=args.validate)
+
 
 if __name__ == "__main__":
-    clean_invalid_files()
+    sys.exit(main())
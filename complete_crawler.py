@@ -4,48 +4,25 @@
 补充爬取所有遗漏的文章内容
 """
 
-import json
 import os
+import argparse
 from pathlib import Path
 import logging
-from improved_crawler import ImprovedArticleCrawler
+from coverage_index import get_coverage
+from log_setup import setup_logging
 
 # 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('complete_crawler.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('complete_crawler.log')
 logger = logging.getLogger(__name__)
 
 def check_missing_articles():
-    """检查每个日期遗漏的文章"""
-    data_dir = Path("data")
-    articles_dir = Path("articles")
-    
+    """检查每个日期遗漏的文章（读取覆盖索引，不再遍历目录）"""
     missing_info = []
     
-    for json_file in sorted(data_dir.glob("*.json")):
-        date_str = json_file.stem.replace('_data', '')
-        
-        # 读取JSON数据
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # 统计应有的文章数
-        total_expected = 0
-        for page_data in data:
-            total_expected += len(page_data.get('onePageArticleList', []))
-        
-        # 统计已爬取的文章数
-        date_articles_dir = articles_dir / date_str
-        if date_articles_dir.exists():
-            total_crawled = len(list(date_articles_dir.glob("*.json")))
-        else:
-            total_crawled = 0
+    for issue in get_coverage().issues():
+        date_str = issue['date']
+        total_expected = issue['expected']
+        total_crawled = issue['fetched']
         
         missing_count = total_expected - total_crawled
         if missing_count > 0:
@@ -62,6 +39,9 @@ def check_missing_articles():
 
 def crawl_missing_articles(missing_info):
     """爬取遗漏的文章"""
+    # 只有真正抓取时才加载 Selenium / bs4，扫描和状态查询不受影响
+    from improved_crawler import ImprovedArticleCrawler
+
     crawler = None
     try:
         crawler = ImprovedArticleCrawler()
@@ -86,6 +66,11 @@ def crawl_missing_articles(missing_info):
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="补充爬取遗漏的文章")
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help="非交互模式，不询问确认")
+    args = parser.parse_args()
+
     print("检查遗漏的文章...")
     try:
         missing_info = check_missing_articles()
@@ -98,7 +83,7 @@ def main():
             for info in missing_info:
                 print(f"  {info['date']}: 遗漏 {info['missing']} 篇")
             
-            response = input("\n是否开始补充爬取？(y/n): ")
+            response = 'y' if args.yes else input("\n是否开始补充爬取？(y/n): ")
             if response.lower() == 'y':
                 crawl_missing_articles(missing_info)
             else:
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章完整度评分
+用提取到的正文长度与文章自身的 wordNumber 比较，而不是统一的"少于20/50字即无效"：
+字数本来就少的短讯和图片稿不会每次运行都被重新抓取，只有相对发布字数明显过短的文章才需要重抓。
+评分按数组计算，可以一次处理整个文章索引；单篇判断（抓取时使用）不依赖 numpy
+"""
+
+from priority import is_picture_article
+
+# 错误页面的标题
+ERROR_TITLES = ('491 Forbidden', '403 Forbidden', '404 Not Found')
+EMPTY_MARKER = '无内容'
+
+# 正文长度达到 wordNumber 的该比例即视为完整
+COMPLETE_RATIO = 0.5
+# 图片稿的字数主要是图片说明，提取到少量文字即可
+PICTURE_RATIO = 0.05
+# wordNumber 缺失（为0）时使用的预期长度
+DEFAULT_EXPECTED = 50
+# 提取到的正文超过该长度时不论 wordNumber 都视为完整（wordNumber 偶有明显偏大的情况）
+ABSOLUTE_COMPLETE = 1000
+
+NOT_FETCHED = -1  # 长度数组中表示文章文件不存在
+
+
+def is_error_page(content):
+    """是否为错误页面或占位内容（schema.ArticleContent）"""
+    title = content.title or ''
+    return any(marker in title for marker in ERROR_TITLES) or content.content == EMPTY_MARKER
+
+
+def extracted_length(content):
+    """提取到的正文长度，错误页面记为0"""
+    if is_error_page(content):
+        return 0
+    return len((content.content or '').strip())
+
+
+def _required_ratio(picture):
+    return PICTURE_RATIO if picture else COMPLETE_RATIO
+
+
+def completeness_scores(lengths, word_numbers):
+    """正文长度 / 预期长度，截断到 [0, 1]；未抓取的文章为0"""
+    import numpy as np
+
+    lengths = np.asarray(lengths, dtype=np.float64)
+    word_numbers = np.asarray(word_numbers, dtype=np.float64)
+    expected = np.where(word_numbers > 0, word_numbers, DEFAULT_EXPECTED)
+    return np.clip(lengths / expected, 0.0, 1.0)
+
+
+def complete_mask(lengths, word_numbers, pictures):
+    """每篇文章是否已完整抓取（布尔数组）"""
+    import numpy as np
+
+    lengths = np.asarray(lengths)
+    scores = completeness_scores(lengths, word_numbers)
+    required = np.where(np.asarray(pictures, dtype=bool),
+                        _required_ratio(True), _required_ratio(False))
+    return (lengths > 0) & ((scores >= required) | (lengths >= ABSOLUTE_COMPLETE))
+
+
+def is_complete(content, metadata):
+    """单篇文章的内容是否完整（content 为 schema.ArticleContent，metadata 为 schema.ArticleMeta）"""
+    length = extracted_length(content)
+    expected = metadata.word_number if metadata.word_number > 0 else DEFAULT_EXPECTED
+    score = min(length / expected, 1.0)
+    return length > 0 and (score >= _required_ratio(is_picture_article(metadata))
+                           or length >= ABSOLUTE_COMPLETE)
+
+
+def picture_mask(index):
+    """文章索引中每篇是否为图片稿（与 priority.is_picture_article 一致）"""
+    import numpy as np
+
+    return np.fromiter(
+        (('（图片）' in title) or bool(pic_author.strip())
+         for title, pic_author in zip(index.titles, index.pic_authors)),
+        dtype=bool, count=len(index))
+
+
+def index_lengths(index, lengths):
+    """按索引行排列的正文长度数组；lengths 为 {(日期, articleHref): 长度}，不在其中的为 NOT_FETCHED"""
+    import numpy as np
+
+    return np.fromiter(
+        (lengths.get((date_str, href), NOT_FETCHED)
+         for date_str, href in zip(index.dates, index.hrefs)),
+        dtype=np.int64, count=len(index))
+
+
+def score_index(index, lengths):
+    """整个索引的 (正文长度, 完整度, 是否完整) 三个数组"""
+    import numpy as np
+
+    lengths = index_lengths(index, lengths)
+    word_numbers = np.array(index.word_numbers, dtype=np.int64)
+    scores = completeness_scores(lengths, word_numbers)
+    return lengths, scores, complete_mask(lengths, word_numbers, picture_mask(index))
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化的数据覆盖索引
+每年一个按天的位图记录哪些日期已有 data.json，每期记录应有/已抓/有效文章数，每篇记录正文长度；
+写入 data.json 和文章文件时同步更新，任意日期范围的缺失查询不再需要遍历目录。
+文章文件被删除、隔离或替换时所在日期目录的修改时间会变化，打开索引时只重新扫描这些日期
+
+用法:
+    python coverage_index.py rebuild
+    python coverage_index.py missing 20250101 20250531
+    python coverage_index.py status
+"""
+
+import os
+import sys
+import sqlite3
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from completeness import extracted_length, is_complete
+from log_setup import setup_logging
+from schema import SchemaError, load_issue, load_record
+from work_queue import STATE_DIR, connect
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COVERAGE_DB = STATE_DIR / "coverage.db"
+
+BITMAP_BYTES = 46  # 366 天
+
+
+def _parse_date(date_str):
+    return datetime.strptime(date_str, "%Y%m%d")
+
+
+def _day_bit(date_obj):
+    return date_obj.timetuple().tm_yday - 1
+
+
+class CoverageIndex:
+    """按天位图 + 每期文章计数"""
+
+    def __init__(self, db_path=DEFAULT_COVERAGE_DB):
+        self.db_path = Path(db_path)
+        # 写入钩子可能来自其他线程，调用方负责串行化
+        self.conn = connect(self.db_path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS days (
+                year INTEGER PRIMARY KEY,
+                bitmap BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS issues (
+                date TEXT PRIMARY KEY,
+                expected INTEGER NOT NULL DEFAULT 0,
+                fetched INTEGER NOT NULL DEFAULT 0,
+                valid INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS articles (
+                date TEXT NOT NULL,
+                href TEXT NOT NULL,
+                valid INTEGER NOT NULL,
+                length INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, href)
+            );
+            CREATE TABLE IF NOT EXISTS article_dirs (
+                date TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL
+            );
+        """)
+        # 旧版索引没有正文长度，需要重建
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(articles)")}
+        self.needs_rebuild = 'length' not in columns
+        if self.needs_rebuild:
+            self.conn.execute("ALTER TABLE articles ADD COLUMN length INTEGER NOT NULL DEFAULT 0")
+
+    def _set_day(self, date_obj, present=True):
+        row = self.conn.execute(
+            "SELECT bitmap FROM days WHERE year = ?", (date_obj.year,)).fetchone()
+        bitmap = bytearray(row['bitmap'] if row else bytes(BITMAP_BYTES))
+        bit = _day_bit(date_obj)
+        if present:
+            bitmap[bit >> 3] |= 1 << (bit & 7)
+        else:
+            bitmap[bit >> 3] &= ~(1 << (bit & 7)) & 0xFF
+        self.conn.execute("INSERT OR REPLACE INTO days (year, bitmap) VALUES (?, ?)",
+                          (date_obj.year, bytes(bitmap)))
+
+    def mark_issue(self, date_str, expected):
+        """记录某期 data.json 已下载及其应有文章数"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._set_day(_parse_date(date_str))
+            self.conn.execute("""
+                INSERT INTO issues (date, expected) VALUES (?, ?)
+                ON CONFLICT(date) DO UPDATE SET expected = excluded.expected
+            """, (date_str, expected))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def unmark_issue(self, date_str):
+        """某期 data.json 被删除或移走：清除位图并把应有文章数置0（已抓的文章仍保留）"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._set_day(_parse_date(date_str), present=False)
+            self.conn.execute("UPDATE issues SET expected = 0 WHERE date = ?", (date_str,))
+            self.conn.execute("DELETE FROM issues WHERE date = ? AND fetched = 0", (date_str,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def record_article(self, date_str, article_href, valid, length=0):
+        """记录一篇文章已写入、是否完整及正文长度（重复写入同一篇只更新有效计数）"""
+        valid = int(bool(valid))
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT valid FROM articles WHERE date = ? AND href = ?",
+                (date_str, article_href)).fetchone()
+            self.conn.execute(
+                "INSERT OR IGNORE INTO issues (date) VALUES (?)", (date_str,))
+            if row is None:
+                self.conn.execute(
+                    "INSERT INTO articles (date, href, valid, length) VALUES (?, ?, ?, ?)",
+                    (date_str, article_href, valid, length))
+                self.conn.execute(
+                    "UPDATE issues SET fetched = fetched + 1, valid = valid + ? WHERE date = ?",
+                    (valid, date_str))
+            else:
+                self.conn.execute(
+                    "UPDATE articles SET valid = ?, length = ? WHERE date = ? AND href = ?",
+                    (valid, length, date_str, article_href))
+                if row['valid'] != valid:
+                    self.conn.execute(
+                        "UPDATE issues SET valid = valid + ? WHERE date = ?",
+                        (valid - row['valid'], date_str))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _bitmaps(self, first_year, last_year):
+        rows = self.conn.execute(
+            "SELECT year, bitmap FROM days WHERE year BETWEEN ? AND ?",
+            (first_year, last_year)).fetchall()
+        return {row['year']: row['bitmap'] for row in rows}
+
+    def has_issue(self, date_str):
+        date_obj = _parse_date(date_str)
+        bitmap = self._bitmaps(date_obj.year, date_obj.year).get(date_obj.year)
+        if bitmap is None:
+            return False
+        bit = _day_bit(date_obj)
+        return bool(bitmap[bit >> 3] & (1 << (bit & 7)))
+
+    def missing_between(self, start, end):
+        """[start, end] 范围内没有 data.json 的日期（YYYYMMDD 列表）"""
+        start_obj, end_obj = _parse_date(start), _parse_date(end)
+        bitmaps = self._bitmaps(start_obj.year, end_obj.year)
+        missing = []
+        day = start_obj
+        while day <= end_obj:
+            bitmap = bitmaps.get(day.year)
+            bit = _day_bit(day)
+            if bitmap is None or not bitmap[bit >> 3] & (1 << (bit & 7)):
+                missing.append(day.strftime("%Y%m%d"))
+            day += timedelta(days=1)
+        return missing
+
+    def issue_counts(self, date_str):
+        """某期的 (应有, 已抓, 有效) 文章数，未记录时返回 None"""
+        row = self.conn.execute(
+            "SELECT expected, fetched, valid FROM issues WHERE date = ?",
+            (date_str,)).fetchone()
+        return tuple(row) if row else None
+
+    def issues(self, start=None, end=None, incomplete_only=False):
+        """范围内各期的计数，返回 [{'date', 'expected', 'fetched', 'valid'}]"""
+        sql = "SELECT date, expected, fetched, valid FROM issues WHERE date BETWEEN ? AND ?"
+        if incomplete_only:
+            sql += " AND valid < expected"
+        rows = self.conn.execute(
+            sql + " ORDER BY date", (start or '00000000', end or '99999999')).fetchall()
+        return [dict(row) for row in rows]
+
+    def article_lengths(self):
+        """所有已写入文章的正文长度，返回 {(日期, articleHref): 长度}（completeness.score_index 使用）"""
+        rows = self.conn.execute("SELECT date, href, length FROM articles")
+        return {(row['date'], row['href']): row['length'] for row in rows}
+
+    def invalid_articles(self):
+        """已写入但内容无效的文章，返回 [(日期, articleHref)]"""
+        rows = self.conn.execute(
+            "SELECT date, href FROM articles WHERE valid = 0 ORDER BY date, href").fetchall()
+        return [(row['date'], row['href']) for row in rows]
+
+    def totals(self):
+        """(期数, 应有, 已抓, 有效) 合计"""
+        row = self.conn.execute("""
+            SELECT COALESCE(SUM(expected > 0), 0), COALESCE(SUM(expected), 0),
+                   COALESCE(SUM(fetched), 0), COALESCE(SUM(valid), 0)
+            FROM issues
+        """).fetchone()
+        return tuple(row)
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM issues LIMIT 1").fetchone() is None
+
+    def _scan_date(self, date_str, date_dir):
+        """重新读取某个日期目录下的全部文章（在调用方的事务中执行）"""
+        self.conn.execute("DELETE FROM articles WHERE date = ?", (date_str,))
+        fetched = valid = 0
+        if date_dir.is_dir():
+            # 先记录修改时间：扫描期间新写入的文件会让下次检查再扫描一遍
+            self.conn.execute("INSERT OR REPLACE INTO article_dirs (date, mtime_ns) VALUES (?, ?)",
+                              (date_str, date_dir.stat().st_mtime_ns))
+            for article_file in date_dir.glob("*.json"):
+                try:
+                    record = load_record(article_file)
+                    ok = int(is_complete(record.content, record.metadata))
+                    length = extracted_length(record.content)
+                except (OSError, SchemaError):
+                    ok = length = 0
+                href = article_file.name.replace('.json', '.html')
+                self.conn.execute(
+                    "INSERT INTO articles (date, href, valid, length) VALUES (?, ?, ?, ?)",
+                    (date_str, href, ok, length))
+                fetched += 1
+                valid += ok
+        else:
+            self.conn.execute("DELETE FROM article_dirs WHERE date = ?", (date_str,))
+        self.conn.execute("INSERT OR IGNORE INTO issues (date) VALUES (?)", (date_str,))
+        self.conn.execute("UPDATE issues SET fetched = ?, valid = ? WHERE date = ?",
+                          (fetched, valid, date_str))
+
+    def refresh(self, articles_dir=Path("articles")):
+        """重新扫描修改时间与记录不同的日期目录（以及已被删除的目录），返回扫描的日期数
+
+        目录的修改时间在其中的文件新增、删除或改名（包括原子写入）时变化；
+        原地修改文件内容不会改变目录的修改时间，这种情况需要 rebuild
+        """
+        articles_dir = Path(articles_dir)
+        current = {}
+        if articles_dir.exists():
+            for date_dir in articles_dir.iterdir():
+                if date_dir.is_dir():
+                    current[date_dir.name] = date_dir.stat().st_mtime_ns
+        recorded = {row['date']: row['mtime_ns'] for row in
+                    self.conn.execute("SELECT date, mtime_ns FROM article_dirs")}
+        indexed = {row['date'] for row in self.conn.execute("SELECT DISTINCT date FROM articles")}
+        changed = sorted({date_str for date_str, mtime_ns in current.items()
+                          if recorded.get(date_str) != mtime_ns}
+                         | (indexed.union(recorded) - current.keys()))
+        if not changed:
+            return 0
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for date_str in changed:
+                self._scan_date(date_str, articles_dir / date_str)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        logger.info(f"覆盖索引已重新扫描 {len(changed)} 个日期目录")
+        return len(changed)
+
+    def rebuild(self, data_dir=Path("data"), articles_dir=Path("articles")):
+        """遍历 data/ 和 articles/ 重新生成索引（首次使用或文件被手工改动后）"""
+        data_dir, articles_dir = Path(data_dir), Path(articles_dir)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("DELETE FROM days")
+            self.conn.execute("DELETE FROM issues")
+            self.conn.execute("DELETE FROM articles")
+            self.conn.execute("DELETE FROM article_dirs")
+
+            for json_file in sorted(data_dir.glob("*_data.json")):
+                date_str = json_file.stem.replace('_data', '')
+                try:
+                    pages = load_issue(json_file)
+                except (OSError, SchemaError) as e:
+                    logger.warning(f"读取数据文件失败 {json_file}: {e}")
+                    continue
+                self._set_day(_parse_date(date_str))
+                self.conn.execute(
+                    "INSERT INTO issues (date, expected) VALUES (?, ?)",
+                    (date_str, sum(len(page.one_page_article_list) for page in pages)))
+
+            if articles_dir.exists():
+                for date_dir in sorted(articles_dir.iterdir()):
+                    if date_dir.is_dir():
+                        self._scan_date(date_dir.name, date_dir)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.needs_rebuild = False
+
+        issues, expected, fetched, valid = self.totals()
+        logger.info(f"覆盖索引已重建: {issues} 期, 应有 {expected} 篇, "
+                    f"已抓 {fetched} 篇, 有效 {valid} 篇")
+
+    def close(self):
+        self.conn.close()
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_coverage(refresh=False):
+    """进程内共享的覆盖索引；首次使用时从现有文件重建（索引为空）或重新扫描有变化的日期目录，
+    refresh=True 时每次调用都检查（用于根据索引决定重抓哪些文章之前）"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            index = CoverageIndex()
+            if index.is_empty() or index.needs_rebuild:
+                index.rebuild()
+            else:
+                index.refresh()
+            _default_index = index
+        elif refresh:
+            _default_index.refresh()
+        return _default_index
+
+
+def _reset_after_fork():
+    global _default_index, _default_lock
+    _default_index = None
+    _default_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _update_existing(update):
+    """不刷新、不重建地更新索引（调用方持有 _default_lock）
+
+    进程内已打开索引时直接使用；否则只打开数据库，索引尚未构建（或需要重建）时不做任何事，
+    之后首次使用时的构建会包含这次的变化
+    """
+    if _default_index is not None:
+        update(_default_index)
+        return
+    index = CoverageIndex()
+    try:
+        if index.needs_rebuild:
+            # 打开时已升级了表结构，清空后由下次 get_coverage 重建
+            index.conn.execute("DELETE FROM issues")
+        elif not index.is_empty():
+            update(index)
+    finally:
+        index.close()
+
+
+def note_issue(date_str, pages, lightweight=False):
+    """data.json 写入后调用；索引更新失败只记录警告，不影响抓取
+
+    lightweight=True 时只更新已有的索引，不触发首次构建或重新扫描（见 _update_existing）
+    """
+    expected = sum(len(page.one_page_article_list) for page in pages)
+    try:
+        if lightweight:
+            with _default_lock:
+                _update_existing(lambda index: index.mark_issue(date_str, expected))
+            return
+        index = get_coverage()
+        with _default_lock:
+            index.mark_issue(date_str, expected)
+    except sqlite3.Error as e:
+        logger.warning(f"更新覆盖索引失败 {date_str}: {e}")
+
+
+def forget_issue(date_str):
+    """data.json 被删除或移走后调用（如 clean_data.py 隔离文件时）
+
+    只更新已有的索引：隔离时其余文件可能也是坏的，不能为此重新扫描或重建
+    """
+    try:
+        with _default_lock:
+            _update_existing(lambda index: index.unmark_issue(date_str))
+    except sqlite3.Error as e:
+        logger.warning(f"更新覆盖索引失败 {date_str}: {e}")
+
+
+def note_article(date_str, record):
+    """文章文件写入后调用（record 为 schema.ArticleRecord），按 completeness 判断是否完整"""
+    article_href = record.metadata.article_href
+    try:
+        index = get_coverage()
+        with _default_lock:
+            index.record_article(date_str, article_href,
+                                 is_complete(record.content, record.metadata),
+                                 extracted_length(record.content))
+    except sqlite3.Error as e:
+        logger.warning(f"更新覆盖索引失败 {date_str}/{article_href}: {e}")
+
+
+def main():
+    """主函数"""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="数据覆盖索引")
+    parser.add_argument('--db', type=Path, default=DEFAULT_COVERAGE_DB,
+                        help="索引数据库路径")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help="遍历 data/ 和 articles/ 重建索引")
+    missing_parser = subparsers.add_parser('missing', help="列出日期范围内缺失的期次和不完整的期次")
+    missing_parser.add_argument('start', help="开始日期 YYYYMMDD")
+    missing_parser.add_argument('end', help="结束日期 YYYYMMDD")
+    subparsers.add_parser('status', help="显示总体覆盖情况")
+    args = parser.parse_args()
+
+    index = CoverageIndex(args.db)
+    try:
+        if args.command == 'rebuild':
+            index.rebuild()
+            return
+        index.refresh()
+        if args.command == 'missing':
+            missing = index.missing_between(args.start, args.end)
+            print(f"缺失期次: {len(missing)} 天")
+            for date_str in missing:
+                print(f"   {date_str}")
+            incomplete = index.issues(args.start, args.end, incomplete_only=True)
+            print(f"文章不完整的期次: {len(incomplete)} 期")
+            for issue in incomplete:
+                print(f"   {issue['date']}: 应有{issue['expected']}篇, "
+                      f"已抓{issue['fetched']}篇, 有效{issue['valid']}篇")
+        else:
+            issues, expected, fetched, valid = index.totals()
+            print(f"期数: {issues}")
+            print(f"应有文章: {expected}")
+            print(f"已抓取: {fetched}")
+            print(f"有效: {valid} ({valid / expected * 100 if expected else 0:.1f}%)")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
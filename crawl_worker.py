@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程文章抓取worker池
+从共享的持久化队列（work_queue.py）领取任务，每个worker进程拥有独立的浏览器，
+所有worker共享一个全局速率预算
+
+用法:
+    python crawl_worker.py enqueue              # 扫描遗漏/无效文章并加入队列
+    python crawl_worker.py enqueue --retry-failed  # 同时重试已失败的任务
+    python crawl_worker.py run --workers 3      # 启动3个worker处理队列
+    python crawl_worker.py status               # 查看队列状态
+"""
+
+import os
+import sys
+import argparse
+import threading
+import logging
+import multiprocessing
+from pathlib import Path
+
+from checkpoint import GracefulShutdown
+from log_setup import PROCESS_TEXT_FORMAT, setup_logging
+from negative_cache import article_reason
+from priority import article_value
+from work_queue import DEFAULT_QUEUE_DB, RateBudget, WorkQueue
+
+# 设置日志
+setup_logging('crawl_worker.log', fmt=PROCESS_TEXT_FORMAT)
+logger = logging.getLogger(__name__)
+
+
+def enqueue_missing_articles(db_path=DEFAULT_QUEUE_DB, retry_failed=False):
+    """扫描遗漏和无效的文章并按价值加入队列
+
+    已失败的任务默认不重新入队，retry_failed=True 时清零尝试次数后重试
+    """
+    from universal_crawler import check_missing_articles
+
+    queue = WorkQueue(db_path)
+    count = 0
+    try:
+        for info in check_missing_articles():
+            for ref in info['missing_articles']:
+                value = article_value(ref, ref.page_no, info['date'])
+                if queue.enqueue(info['date'], ref.page_no, ref.to_meta(), value,
+                                 retry=retry_failed):
+                    count += 1
+    finally:
+        queue.close()
+
+    logger.info(f"已加入队列: {count} 篇文章")
+    return count
+
+
+class LeaseKeeper(threading.Thread):
+    """处理任务期间定期延长租约，worker崩溃后租约自然过期"""
+
+    def __init__(self, db_path, key, worker_id, visibility_timeout):
+        super().__init__(daemon=True)
+        self.db_path = db_path
+        self.key = key
+        self.worker_id = worker_id
+        # 每次续约延长 visibility_timeout，租约过期前续约三次
+        self.visibility_timeout = visibility_timeout
+        self.interval = visibility_timeout / 3
+        self.stopped = threading.Event()
+
+    def run(self):
+        queue = WorkQueue(self.db_path, visibility_timeout=self.visibility_timeout)
+        try:
+            while not self.stopped.wait(self.interval):
+                if not queue.heartbeat(self.key, self.worker_id):
+                    logger.warning(f"租约已丢失: {self.key}")
+                    break
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def worker_main(worker_id, db_path, interval, lean, visibility_timeout,
+                keep_running=False):
+    """worker进程主循环：领取任务 -> 抓取 -> 确认
+
+    keep_running=True 时队列为空也不退出（守护进程模式），直到收到SIGINT/SIGTERM
+    """
+    queue = WorkQueue(db_path, visibility_timeout=visibility_timeout)
+    rate_budget = RateBudget(db_path, interval=interval)
+    crawler = None
+    processed = 0
+
+    try:
+        with GracefulShutdown() as shutdown:
+            while not shutdown.requested:
+                job = queue.lease(worker_id)
+                if job is None:
+                    if not keep_running and not queue.has_unfinished():
+                        break
+                    # 等待新任务，或等待其他worker的任务完成/租约过期
+                    shutdown.sleep(30)
+                    continue
+
+                key = job['job_key']
+
+                # 已知无法获取的文章直接标记失败，不启动浏览器也不占用速率预算
+                reason = article_reason(job['date'], job['metadata'].article_href)
+                if reason:
+                    logger.info(f"[{worker_id}] 任务在负缓存中 ({reason})，跳过 {key}")
+                    queue.fail(key, worker_id, f"负缓存: {reason}", permanent=True)
+                    continue
+
+                # 首次领到任务时才启动浏览器，空闲的worker不占用Chrome
+                if crawler is None:
+                    from practical_crawler import PracticalCrawler
+                    crawler = PracticalCrawler(
+                        lean=lean, rate_limiter=rate_budget)
+
+                logger.info(
+                    f"[{worker_id}] 领取任务 {key} (第 {job['attempts']} 次尝试)")
+
+                keeper = LeaseKeeper(db_path, key, worker_id, visibility_timeout)
+                keeper.start()
+                try:
+                    success = crawler.fix_single_article(
+                        job['date'], job['page_no'], job['metadata'])
+                except Exception as e:
+                    logger.error(f"[{worker_id}] 处理任务出错 {key}: {e}")
+                    success = False
+                    error = str(e)
+                else:
+                    error = None if success else '抓取失败'
+                finally:
+                    keeper.stop()
+
+                if success:
+                    queue.complete(key, worker_id)
+                else:
+                    # 本次抓取确认了文章无法获取（404等）时不再重试
+                    reason = article_reason(job['date'], job['metadata'].article_href,
+                                            hit=False)
+                    queue.fail(key, worker_id, error, permanent=reason is not None)
+                processed += 1
+
+        logger.info(f"[{worker_id}] 退出，共处理 {processed} 个任务")
+    finally:
+        if crawler:
+            crawler.close()
+        rate_budget.close()
+        queue.close()
+
+
+def start_workers(workers, db_path=DEFAULT_QUEUE_DB, interval=60.0, lean=True,
+                  visibility_timeout=1800, keep_running=False):
+    """启动worker进程，返回进程列表"""
+    processes = []
+    for i in range(workers):
+        worker_id = f"{os.uname().nodename}-{os.getpid()}-w{i}"
+        process = multiprocessing.Process(
+            target=worker_main,
+            args=(worker_id, db_path, interval, lean, visibility_timeout,
+                  keep_running),
+            name=f"worker-{i}")
+        process.start()
+        processes.append(process)
+
+    logger.info(f"已启动 {workers} 个worker，全局请求间隔 {interval:.0f} 秒")
+    return processes
+
+
+def run_workers(workers, db_path=DEFAULT_QUEUE_DB, interval=60.0, lean=True,
+                visibility_timeout=1800):
+    """启动多个worker进程并等待全部结束"""
+    processes = start_workers(workers, db_path, interval, lean,
+                              visibility_timeout)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("收到中断，等待worker处理完当前任务后退出")
+        for process in processes:
+            process.join()
+
+
+def print_status(db_path=DEFAULT_QUEUE_DB):
+    """打印队列状态"""
+    queue = WorkQueue(db_path)
+    try:
+        stats = queue.stats()
+        coverage = queue.value_coverage()
+    finally:
+        queue.close()
+
+    print(f"队列: {db_path}")
+    for status in ('pending', 'leased', 'done', 'failed'):
+        print(f"  {status}: {stats.get(status, 0)}")
+    print(f"  价值加权完成度: {coverage[0]:.1f}/{coverage[1]:.1f} = "
+          f"{coverage[0] / coverage[1] * 100 if coverage[1] else 100:.1f}%")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="多进程文章抓取worker池")
+    parser.add_argument('--db', type=Path, default=DEFAULT_QUEUE_DB,
+                        help="队列数据库路径")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help="扫描遗漏/无效文章并加入队列")
+    enqueue_parser.add_argument('--retry-failed', action='store_true',
+                                help="已失败的任务清零尝试次数后重新入队")
+
+    run_parser = subparsers.add_parser('run', help="启动worker处理队列")
+    run_parser.add_argument('--workers', type=int, default=2,
+                            help="worker进程数")
+    run_parser.add_argument('--interval', type=float, default=60.0,
+                            help="所有worker合计的请求间隔（秒）")
+    run_parser.add_argument('--visibility-timeout', type=float, default=1800,
+                            help="任务租约时长（秒），worker崩溃后任务在此时间后回到队列")
+    run_parser.add_argument('--no-lean', action='store_true',
+                            help="使用完整浏览器配置")
+    run_parser.add_argument('--headless', action='store_true',
+                            help="精简模式下无头运行（更容易被反爬识别）")
+
+    subparsers.add_parser('status', help="查看队列状态")
+
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        enqueue_missing_articles(args.db, retry_failed=args.retry_failed)
+    elif args.command == 'run':
+        if args.headless:
+            os.environ['CRAWL_HEADLESS'] = '1'
+        run_workers(args.workers, args.db, args.interval,
+                    lean=not args.no_lean,
+                    visibility_timeout=args.visibility_timeout)
+    elif args.command == 'status':
+        print_status(args.db)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,22 +6,23 @@
 """
 
 import requests
-import json
 import os
-import time
+import argparse
 from datetime import datetime, timedelta
 from pathlib import Path
 import logging
+import msgspec
+from aggregates import aggregate_issue
+from cassette import install, pause
+from coverage_index import note_issue
+from log_setup import log_context, setup_logging
+from negative_cache import date_reason, note_no_issue, observe_no_issue
+from retry_policy import THROTTLED, TRANSIENT, classify_page
+from schema import SchemaError, decode_issue, format_json
+from storage import write_bytes
 
 # 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('crawler.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('crawler.log')
 logger = logging.getLogger(__name__)
 
 
@@ -37,6 +38,8 @@ class RenminYoudianCrawler:
             'Connection': 'keep-alive',
             'Referer': 'https://rmydb.cnii.com.cn/'
         })
+        # 启用录像时录制或回放所有请求（cassette.py）
+        install(self.session)
 
         # 创建数据存储目录
         self.data_dir = Path("data")
@@ -65,44 +68,69 @@ class RenminYoudianCrawler:
 
         return urls
 
-    def download_data(self, date_str, url):
-        """下载单个data.json文件"""
+    def download_data(self, date_str, url, check_negative=True):
+        """下载单个data.json文件（期间的日志带上日期）
+
+        check_negative=False 表示调用方已经查询过负缓存
+        """
+        with log_context(date=date_str, stage='download'):
+            return self._download_data(date_str, url, check_negative)
+
+    def _download_data(self, date_str, url, check_negative=True):
+        reason = date_reason(date_str) if check_negative else None
+        if reason:
+            logger.info(f"{date_str} 在负缓存中 ({reason})，跳过")
+            return False
+
         try:
             logger.info(f"正在下载: {date_str} - {url}")
 
             response = self.session.get(url, timeout=30)
+            if response.status_code == 404:
+                logger.warning(f"{date_str} 返回404，该日期无数据")
+                note_no_issue(date_str, 'http 404')
+                return False
             response.raise_for_status()
 
             # 检查响应内容类型
             content_type = response.headers.get('content-type', '').lower()
             
-            # 尝试解析JSON
+            # 尝试按 data.json 的结构解码并校验
             try:
-                data = response.json()
+                pages = decode_issue(response.content, source=date_str)
                 
                 # 检查是否是有效的新闻数据
-                if isinstance(data, list) and len(data) > 0:
-                    logger.info(f"成功下载 {date_str}: {len(data)} 条数据")
+                if len(pages) > 0:
+                    logger.info(f"成功下载 {date_str}: {len(pages)} 条数据")
                     
-                    # 保存JSON数据
+                    # 保存原始JSON数据（格式化，保留所有字段）
                     file_path = self.data_dir / f"{date_str}_data.json"
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, ensure_ascii=False, indent=2)
+                    write_bytes(file_path, format_json(response.content))
+                    note_issue(date_str, pages)
+                    aggregate_issue(date_str, pages)
                     
                     logger.info(f"已保存到: {file_path}")
                     return True
                 else:
-                    logger.warning(f"{date_str} 返回空数据或无效数据格式")
+                    logger.warning(f"{date_str} 返回空数据")
+                    note_no_issue(date_str, 'empty')
                     return False
                     
-            except json.JSONDecodeError:
+            except msgspec.ValidationError as e:
+                logger.warning(f"{date_str} 数据格式不符合预期: {e}")
+                return False
+            except SchemaError:
                 # 检查是否返回HTML页面
                 response_text = response.text.strip()
                 if response_text.startswith('<!DOCTYPE') or '<html' in response_text.lower():
-                    if 'Please enable JavaScript' in response_text:
-                        logger.warning(f"{date_str} 需要JavaScript，可能该日期无数据或需要浏览器访问")
+                    if ('Please enable JavaScript' in response_text
+                            or classify_page(None, response_text) in (THROTTLED, TRANSIENT)):
+                        # 反爬验证或限流页面只说明这次请求被拦截，不能据此判断不出报
+                        logger.warning(f"{date_str} 需要JavaScript或被限流，可能需要浏览器访问")
                     else:
+                        # 单次HTML响应也可能是临时的错误页面，多次运行中都出现才记为不出报
                         logger.warning(f"{date_str} 返回HTML页面而非JSON数据")
+                        observe_no_issue(date_str, 'html')
                     return False
                 else:
                     logger.error(f"{date_str} 返回未知格式数据: {response_text[:100]}...")
@@ -124,9 +152,17 @@ class RenminYoudianCrawler:
         failed_count = 0
         success_dates = []
         failed_dates = []
+        skipped_dates = []
 
         for date_str, url in urls:
-            success = self.download_data(date_str, url)
+            # 已知不出报的日期不再请求（只查询一次，命中数只计一次）
+            reason = date_reason(date_str)
+            if reason:
+                logger.info(f"{date_str} 在负缓存中 ({reason})，跳过")
+                skipped_dates.append(date_str)
+                continue
+
+            success = self.download_data(date_str, url, check_negative=False)
             if success:
                 success_count += 1
                 success_dates.append(date_str)
@@ -135,9 +171,10 @@ class RenminYoudianCrawler:
                 failed_dates.append(date_str)
 
             # 添加延迟，避免请求过于频繁
-            time.sleep(1)
+            pause(1)
 
-        logger.info(f"爬取完成! 成功: {success_count}, 失败: {failed_count}")
+        logger.info(f"爬取完成! 成功: {success_count}, 失败: {failed_count}, "
+                    f"负缓存跳过: {len(skipped_dates)}")
         
         if success_dates:
             logger.info(f"成功下载的日期: {', '.join(success_dates)}")
@@ -156,20 +193,34 @@ class RenminYoudianCrawler:
 
 def main():
     """主函数"""
+    today = datetime.now()
+    parser = argparse.ArgumentParser(description="人民邮电报 data.json 爬虫")
+    parser.add_argument('--year', type=int, default=today.year, help="年份")
+    parser.add_argument('--month', type=int, default=today.month, help="月份")
+    parser.add_argument('--date', help="只爬取单个日期 (YYYYMMDD)")
+    parser.add_argument('--test-date', default="20250603",
+                        help="正式爬取前用于测试连通性的日期")
+    args = parser.parse_args()
+
     print("开始运行人民邮电报数据爬虫...")
 
     try:
         crawler = RenminYoudianCrawler()
 
+        if args.date:
+            success = crawler.crawl_single_date(args.date)
+            print(f"{args.date}: {'成功' if success else '失败或无数据'}")
+            return
+
         # 先测试单个日期
         print("测试单个日期...")
         logger.info("测试单个日期...")
-        test_success = crawler.crawl_single_date("20250603")
+        test_success = crawler.crawl_single_date(args.test_date)
 
         if test_success:
-            print("测试成功，开始爬取2025年5月的所有数据...")
-            logger.info("测试成功，开始爬取2025年5月的所有数据...")
-            crawler.crawl_month(2025, 5)
+            print(f"测试成功，开始爬取{args.year}年{args.month}月的所有数据...")
+            logger.info(f"测试成功，开始爬取{args.year}年{args.month}月的所有数据...")
+            crawler.crawl_month(args.year, args.month)
         else:
             print("测试失败，请检查网络连接或URL格式")
             logger.error("测试失败，请检查网络连接或URL格式")
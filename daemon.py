@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+无人值守的守护进程 - 新一期报纸发布后自动抓取
+轮询当天的 data.json（指数退避），发布后把该期文章加入抓取队列，
+后台worker持续处理队列，并定期重新扫描、重试无效文章
+
+用法:
+    python daemon.py --workers 2 --interval 60
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from log_setup import PROCESS_TEXT_FORMAT, setup_logging
+
+# 设置日志
+setup_logging('daemon.log', fmt=PROCESS_TEXT_FORMAT)
+logger = logging.getLogger(__name__)
+
+from checkpoint import GracefulShutdown
+from crawl_worker import enqueue_missing_articles, start_workers
+from crawler import RenminYoudianCrawler
+from negative_cache import article_reason
+from priority import article_value
+from schema import iter_articles, load_issue
+from work_queue import DEFAULT_QUEUE_DB, WorkQueue
+
+
+def enqueue_issue(date_str, db_path=DEFAULT_QUEUE_DB, data_dir=Path("data"),
+                  articles_dir=Path("articles")):
+    """把某一期中尚未抓取的文章按价值加入队列"""
+    pages = load_issue(data_dir / f"{date_str}_data.json")
+
+    queue = WorkQueue(db_path)
+    count = 0
+    try:
+        for page_no, article in iter_articles(pages):
+            file_path = articles_dir / date_str / \
+                article.article_href.replace('.html', '.json')
+            if file_path.exists() or article_reason(date_str, article.article_href):
+                continue
+            value = article_value(article, page_no, date_str)
+            if queue.enqueue(date_str, page_no, article, value):
+                count += 1
+    finally:
+        queue.close()
+
+    logger.info(f"{date_str}: 已加入队列 {count} 篇文章")
+    return count
+
+
+class IssueDaemon:
+    """轮询新一期报纸并驱动后台worker抓取"""
+
+    def __init__(self, db_path=DEFAULT_QUEUE_DB, workers=1, interval=60.0,
+                 lean=True, poll_min=60, poll_max=600, rescan_hours=6,
+                 catch_up_days=7):
+        self.db_path = db_path
+        self.workers = workers
+        self.interval = interval
+        self.lean = lean
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.rescan_seconds = rescan_hours * 3600
+        self.catch_up_days = catch_up_days
+        self.crawler = RenminYoudianCrawler()
+
+    def issue_exists(self, date_str):
+        return (self.crawler.data_dir / f"{date_str}_data.json").exists()
+
+    def fetch_issue(self, date_str):
+        """尝试下载某一期，成功则加入队列"""
+        if self.crawler.crawl_single_date(date_str):
+            enqueue_issue(date_str, self.db_path, self.crawler.data_dir)
+            return True
+        return False
+
+    def catch_up(self):
+        """启动时补齐最近几天停机期间错过的期次（每个日期只尝试一次）"""
+        today = datetime.now()
+        for days_ago in range(self.catch_up_days, 0, -1):
+            date_str = (today - timedelta(days=days_ago)).strftime("%Y%m%d")
+            if not self.issue_exists(date_str):
+                self.fetch_issue(date_str)
+                time.sleep(1)
+
+    def run(self):
+        """主循环，直到收到SIGINT/SIGTERM"""
+        processes = []
+        last_rescan = 0.0
+
+        with GracefulShutdown() as shutdown:
+            try:
+                processes = start_workers(self.workers, self.db_path, self.interval,
+                                          self.lean, keep_running=True)
+                self.catch_up()
+
+                poll_delay = self.poll_min
+                polling_date = None
+
+                while not shutdown.requested:
+                    # 定期重新扫描，把无效文章重新放回队列
+                    if time.time() - last_rescan >= self.rescan_seconds:
+                        enqueue_missing_articles(self.db_path)
+                        last_rescan = time.time()
+
+                    today = datetime.now().strftime("%Y%m%d")
+                    if today != polling_date:
+                        polling_date = today
+                        poll_delay = self.poll_min
+
+                    if self.issue_exists(today) or self.fetch_issue(today):
+                        # 今天的报纸已入队，等到第二天零点再开始轮询
+                        tomorrow = (datetime.now() + timedelta(days=1)).replace(
+                            hour=0, minute=0, second=0, microsecond=0)
+                        wait = min((tomorrow - datetime.now()).total_seconds(),
+                                   self.rescan_seconds)
+                        logger.info(f"{today} 已获取，{wait / 60:.0f} 分钟后再检查")
+                        shutdown.sleep(max(wait, 1))
+                        continue
+
+                    # 尚未发布：指数退避，上限为 poll_max
+                    logger.info(f"{today} 尚未发布，{poll_delay:.0f} 秒后重试")
+                    shutdown.sleep(poll_delay)
+                    poll_delay = min(poll_delay * 2, self.poll_max)
+            finally:
+                # 信号只发给守护进程时worker不会自己退出；worker把SIGTERM当作处理完当前文章后退出
+                logger.info("守护进程退出，等待worker处理完当前任务")
+                for process in processes:
+                    process.terminate()
+                for process in processes:
+                    process.join()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="自动抓取新一期报纸的守护进程")
+    parser.add_argument('--db', type=Path, default=DEFAULT_QUEUE_DB,
+                        help="队列数据库路径")
+    parser.add_argument('--workers', type=int, default=1, help="worker进程数")
+    parser.add_argument('--interval', type=float, default=60.0,
+                        help="所有worker合计的请求间隔（秒）")
+    parser.add_argument('--poll-min', type=float, default=60,
+                        help="轮询当天 data.json 的初始间隔（秒）")
+    parser.add_argument('--poll-max', type=float, default=600,
+                        help="轮询间隔上限（秒）")
+    parser.add_argument('--rescan-hours', type=float, default=6,
+                        help="重新扫描无效文章的间隔（小时）")
+    parser.add_argument('--catch-up-days', type=int, default=7,
+                        help="启动时补齐最近几天的期次")
+    parser.add_argument('--no-lean', action='store_true',
+                        help="使用完整浏览器配置")
+    parser.add_argument('--headless', action='store_true',
+                        help="精简模式下无头运行（更容易被反爬识别）")
+    args = parser.parse_args()
+
+    if args.headless:
+        os.environ['CRAWL_HEADLESS'] = '1'
+
+    daemon = IssueDaemon(args.db, args.workers, args.interval,
+                         lean=not args.no_lean, poll_min=args.poll_min,
+                         poll_max=args.poll_max, rescan_hours=args.rescan_hours,
+                         catch_up_days=args.catch_up_days)
+    daemon.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+作者、栏目维度表
+原始字段含全角空格和身份前缀（"本报记者　李晓东"、"记者　苏德悦"），同一个人会被拆成多个键；
+这里把原始字符串规范化为实体（作者可能有多人），并分配整数ID：
+文章索引只保存原始值的ID，统计时按整数计数后再映射到实体
+"""
+
+import re
+import unicodedata
+
+def _longest_first(words):
+    return tuple(sorted(words, key=len, reverse=True))
+
+
+# 身份前缀和独立出现的身份词（"供稿：李四"、"本版撰文 张三"），长的在前
+ROLE_WORDS = _longest_first((
+    '本报特约记者', '本报特约通讯员', '本报记者', '本报通讯员', '本报评论员', '本版撰文',
+    '特约记者', '特约通讯员', '通讯员', '评论员', '实习生', '记者',
+    '供稿单位', '供稿人', '供稿', '撰文'))
+# 职务：出现在名字前时去掉（"董事长 杨杰"），以职务结尾的词（"中国移动董事长"）整个丢弃
+TITLE_WORDS = _longest_first((
+    '党组书记', '党委书记', '党组成员', '董事长', '副董事长', '总经理', '副总经理', '总裁',
+    '副总裁', '总工程师', '总会计师', '首席执行官', '首席技术官', '总编辑', '副总编辑',
+    '秘书长', '副秘书长', '理事长', '会长', '副会长', '主任', '副主任', '院长', '副院长',
+    '局长', '副局长', '部长', '副部长', '厅长', '副厅长', '处长', '副处长', '书记', '主席'))
+# 机构名的结尾（"江苏省通信管理局"、"中国信通院"），署名中的机构不是作者
+ORG_SUFFIXES = _longest_first((
+    '院', '公司', '工会', '集团', '协会', '学会', '联盟', '委员会', '办公室', '中心',
+    '大学', '学校', '局', '厅', '研究所', '分所', '报社', '杂志社', '编辑部'))
+# 署名中可以直接丢弃的词（"本报记者 张三 报道"）
+NOISE_WORDS = {'报道', '整理', '摄', '摄影', '文', '图', '等'}
+
+# 只按标点拆分，空白在 _words 中处理：空白隔开的单字要先拼回名字（"李　明" -> "李明"）
+_AUTHOR_SEPARATORS = re.compile(r'[、,，;；/|]+')
+_BYLINE_MARK = re.compile(r'^[文图]\s*[/／:：]\s*')
+_BRACKETS = '【】[]「」《》()'
+_WHITESPACE = re.compile(r'\s+')
+_CJK_CHAR = re.compile(r'[\u4e00-\u9fff]')
+
+
+def _nfkc(value):
+    # 全角空格、全角字母数字转换为半角
+    return unicodedata.normalize('NFKC', value or '').strip()
+
+
+def _strip_prefixes(token, words):
+    stripped = True
+    while stripped and token:
+        stripped = False
+        for word in words:
+            if token.startswith(word):
+                token = token[len(word):].lstrip(':：')
+                stripped = True
+                break
+    return token
+
+
+def _words(chunk):
+    """按空白拆成词，连续的单个汉字拼成一个名字；末尾的 "摄"/"文" 等不拼入"""
+    words = []
+    run = []
+    for word in chunk.split():
+        if len(word) == 1 and _CJK_CHAR.match(word):
+            run.append(word)
+            continue
+        words.extend(_join_run(run))
+        run = []
+        words.append(word)
+    words.extend(_join_run(run))
+    return words
+
+
+def _join_run(run):
+    if len(run) > 2 and run[-1] in NOISE_WORDS:
+        return [''.join(run[:-1]), run[-1]]
+    return [''.join(run)] if run else []
+
+
+def _is_organization(token):
+    return len(token) >= 3 and token.endswith(ORG_SUFFIXES)
+
+
+def split_authors(raw):
+    """把原始署名拆成规范化的作者名元组
+
+    "本报记者　张三　通讯员　李四" -> ("张三", "李四")，"本报记者　李　明" -> ("李明",)；
+    身份词、职务、机构名和 "报道"/"摄" 等不计为作者
+    """
+    names = []
+    for chunk in _AUTHOR_SEPARATORS.split(_BYLINE_MARK.sub('', _nfkc(raw))):
+        for token in _words(chunk):
+            token = _strip_prefixes(_BYLINE_MARK.sub('', token), ROLE_WORDS)
+            name = _strip_prefixes(token, TITLE_WORDS)
+            if (not name or name in NOISE_WORDS or name.endswith(TITLE_WORDS)
+                    or _is_organization(name) or name in names):
+                continue
+            names.append(name)
+    return tuple(names)
+
+
+def normalize_column(raw):
+    """规范化栏目名：半角化、去掉首尾括号、合并空白"""
+    column = _nfkc(raw).strip(_BRACKETS)
+    column = _WHITESPACE.sub(' ', column).strip()
+    return (column,) if column else ()
+
+
+class Dimension:
+    """字符串 <-> 整数ID，ID 0 固定表示空值"""
+
+    __slots__ = ('names', 'ids')
+
+    def __init__(self):
+        self.names = ['']
+        self.ids = {'': 0}
+
+    def __len__(self):
+        return len(self.names)
+
+    def id(self, name):
+        """返回名称的ID，新名称分配下一个ID"""
+        i = self.ids.get(name)
+        if i is None:
+            i = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def name(self, i):
+        return self.names[i]
+
+
+class DimensionTable:
+    """原始值维度 + 规范化实体维度
+
+    每个不同的原始字符串一个ID（文章索引中保存的就是它），
+    members[原始ID] 为它对应的实体ID元组
+    """
+
+    __slots__ = ('normalize', 'raw', 'entities', 'members')
+
+    def __init__(self, normalize):
+        self.normalize = normalize
+        self.raw = Dimension()
+        self.entities = Dimension()
+        self.members = [()]
+
+    def intern(self, raw):
+        """返回原始值的ID，新值在这里规范化一次"""
+        raw_id = self.raw.ids.get(raw)
+        if raw_id is None:
+            raw_id = self.raw.id(raw)
+            self.members.append(tuple(self.entities.id(name) for name in self.normalize(raw)))
+        return raw_id
+
+    def raw_value(self, raw_id):
+        return self.raw.names[raw_id]
+
+    def entity_names(self, raw_id):
+        return [self.entities.names[i] for i in self.members[raw_id]]
+
+    def label(self, raw_id):
+        """规范化后的显示值，多个作者用顿号连接"""
+        return '、'.join(self.entity_names(raw_id))
+
+    def raw_counts(self, raw_ids):
+        """每个原始ID出现的次数（列表下标为ID）"""
+        counts = [0] * len(self.raw)
+        for raw_id in raw_ids:
+            counts[raw_id] += 1
+        return counts
+
+    def entity_counts(self, raw_ids):
+        """每个实体出现的文章数，返回 {实体名: 篇数}；多作者的文章计入每位作者"""
+        counts = [0] * len(self.entities)
+        for raw_id, n in enumerate(self.raw_counts(raw_ids)):
+            if n:
+                for entity_id in self.members[raw_id]:
+                    counts[entity_id] += n
+        return {self.entities.names[i]: n for i, n in enumerate(counts) if n}
+
+    def raw_categorical_codes(self, raw_ids):
+        """按原始值编码，返回 (codes, categories)，空值编码为 -1"""
+        return [raw_id - 1 for raw_id in raw_ids], self.raw.names[1:]
+
+    def categorical_codes(self, raw_ids):
+        """按规范化显示值编码，返回 (codes, categories)，空值编码为 -1（用于 pandas.Categorical.from_codes）"""
+        labels = Dimension()
+        label_codes = [labels.id(self.label(raw_id)) - 1 for raw_id in range(len(self.raw))]
+        return [label_codes[raw_id] for raw_id in raw_ids], labels.names[1:]
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+chromedriver 路径缓存
+ChromeDriverManager().install() 每次调用都可能访问网络；这里只解析一次，
+路径写入 state/chromedriver.json，之后的进程和浏览器重启直接使用本地文件
+
+用法:
+    python driver_cache.py            # 显示当前缓存的路径
+    python driver_cache.py --refresh  # 重新解析（Chrome升级后）
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+
+from log_setup import setup_logging
+from storage import write_json
+from work_queue import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+DRIVER_CACHE_FILE = STATE_DIR / "chromedriver.json"
+
+# 设置该环境变量时直接使用指定的 chromedriver，不做任何解析
+DRIVER_PATH_ENV = 'CHROMEDRIVER_PATH'
+
+# 驱动与已安装的Chrome版本不匹配时的报错，只有这类错误需要重新解析驱动；
+# "session not created" 也用于 DevToolsActivePort 等启动失败，需同时提到版本
+VERSION_MISMATCH_MARKER = 'this version of chromedriver only supports'
+SESSION_NOT_CREATED = 'session not created'
+
+_resolved = None
+_lock = threading.Lock()
+
+
+def _usable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def _read_cache():
+    try:
+        with open(DRIVER_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('path')
+    except (OSError, ValueError):
+        return None
+
+
+def _install():
+    # 只有缓存失效时才需要 webdriver_manager
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    start = time.time()
+    path = ChromeDriverManager().install()
+    write_json(DRIVER_CACHE_FILE, {'path': path, 'resolved_at': time.time()})
+    logger.info(f"已解析 chromedriver: {path} ({time.time() - start:.1f} 秒)")
+    return path
+
+
+def chromedriver_path(refresh=False):
+    """返回 chromedriver 路径：环境变量 > 进程内缓存 > 本地缓存文件 > ChromeDriverManager"""
+    global _resolved
+    env_path = os.environ.get(DRIVER_PATH_ENV)
+    if env_path:
+        return env_path
+
+    with _lock:
+        if refresh:
+            _resolved = None
+        elif _resolved and _usable(_resolved):
+            return _resolved
+
+        path = None if refresh else _read_cache()
+        if not _usable(path):
+            path = _install()
+        _resolved = path
+        return path
+
+
+def invalidate():
+    """缓存的驱动无法启动浏览器时调用（如Chrome已升级），下次重新解析"""
+    global _resolved
+    with _lock:
+        _resolved = None
+        try:
+            DRIVER_CACHE_FILE.unlink()
+        except FileNotFoundError:
+            pass
+    logger.info("已清除 chromedriver 缓存")
+
+
+def is_version_mismatch(error):
+    """启动失败是否因为驱动与Chrome版本不匹配（而不是内存不足、端口占用等临时问题）"""
+    message = str(getattr(error, 'msg', None) or error).lower()
+    if VERSION_MISMATCH_MARKER in message:
+        return True
+    return SESSION_NOT_CREATED in message and 'version' in message
+
+
+def start_chrome(chrome_options):
+    """用缓存的 chromedriver 启动Chrome；驱动与Chrome版本不匹配时重新解析一次"""
+    from selenium import webdriver
+    from selenium.common.exceptions import WebDriverException
+    from selenium.webdriver.chrome.service import Service
+
+    try:
+        return webdriver.Chrome(service=Service(chromedriver_path()), options=chrome_options)
+    except WebDriverException as e:
+        if os.environ.get(DRIVER_PATH_ENV) or not is_version_mismatch(e):
+            raise
+        logger.warning(f"缓存的 chromedriver 与Chrome版本不匹配，重新解析: {e}")
+        invalidate()
+        return webdriver.Chrome(service=Service(chromedriver_path()), options=chrome_options)
+
+
+def main():
+    """主函数"""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="chromedriver 路径缓存")
+    parser.add_argument('--refresh', action='store_true', help="重新解析并更新缓存")
+    args = parser.parse_args()
+
+    print(chromedriver_path(refresh=args.refresh))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览器健康状况跟踪
+根据Chrome进程树的内存（RSS）、最近页面加载耗时的p95相对会话初期的漂移、以及浏览器错误率决定何时重启，
+取代固定的每会话请求数：内存或延迟提前恶化时及时重启，状态良好时不做无谓的重启
+"""
+
+import logging
+import statistics
+from collections import deque
+
+from browser_profile import chrome_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def percentile(values, pct):
+    """最近邻法百分位数"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class DriverHealth:
+    """单个WebDriver会话的健康信号"""
+
+    def __init__(self, window=20, baseline_pages=5, rss_limit_mb=1500,
+                 rss_growth=3.0, p95_drift=2.0, error_rate_limit=0.4,
+                 min_samples=8, max_requests=300):
+        self.window = window
+        self.baseline_pages = baseline_pages  # 会话开始的前几页作为延迟和内存基线（内存取中位数，避开冷启动）
+        self.rss_limit = rss_limit_mb * MB
+        self.rss_growth = rss_growth          # 内存超过基线的倍数
+        self.p95_drift = p95_drift            # 最近p95超过基线p95的倍数
+        self.error_rate_limit = error_rate_limit
+        self.min_samples = min_samples
+        self.max_requests = max_requests      # 信号都不可用时的兜底上限
+        self.reset()
+
+    def reset(self):
+        """浏览器重启后清空"""
+        self.requests = 0
+        self.load_times = deque(maxlen=self.window)
+        self.errors = deque(maxlen=self.window)
+        self.baseline_times = []
+        self.baseline_p95 = None
+        self.baseline_rss_samples = []
+        self.baseline_rss = None
+        self.rss = None
+
+    def record(self, driver, load_seconds=None, error=False):
+        """记录一次页面访问；error=True 表示浏览器层面的失败（超时、会话异常）
+
+        页面加载成功后的解析错误等不是浏览器的问题，调用方不应记为错误
+        """
+        self.requests += 1
+        self.errors.append(1 if error else 0)
+        if load_seconds is not None and not error:
+            self.load_times.append(load_seconds)
+            if self.baseline_p95 is None:
+                self.baseline_times.append(load_seconds)
+                if len(self.baseline_times) >= self.baseline_pages:
+                    self.baseline_p95 = percentile(self.baseline_times, 95)
+
+        rss = chrome_rss_bytes(driver)
+        if rss:
+            self.rss = rss
+            if self.baseline_rss is None:
+                # 第一页时Chrome刚启动，内存偏低；取前几页的中位数作为基线
+                self.baseline_rss_samples.append(rss)
+                if len(self.baseline_rss_samples) >= self.baseline_pages:
+                    self.baseline_rss = statistics.median(self.baseline_rss_samples)
+
+    def should_recycle(self):
+        """返回 (是否需要重启, 原因)"""
+        if self.rss and self.rss > self.rss_limit:
+            return True, f"Chrome内存 {self.rss / MB:.0f} MB 超过上限 {self.rss_limit / MB:.0f} MB"
+
+        if self.rss and self.baseline_rss and self.rss > self.baseline_rss * self.rss_growth:
+            return True, (f"Chrome内存 {self.rss / MB:.0f} MB 为会话初期的 "
+                          f"{self.rss / self.baseline_rss:.1f} 倍")
+
+        if len(self.errors) >= self.min_samples:
+            error_rate = sum(self.errors) / len(self.errors)
+            if error_rate > self.error_rate_limit:
+                return True, f"最近 {len(self.errors)} 次访问错误率 {error_rate:.0%}"
+
+        if self.baseline_p95 and len(self.load_times) >= self.min_samples:
+            p95 = percentile(self.load_times, 95)
+            if p95 > self.baseline_p95 * self.p95_drift:
+                return True, (f"加载耗时p95 {p95:.1f} 秒, 会话初期 {self.baseline_p95:.1f} 秒")
+
+        if self.requests >= self.max_requests:
+            return True, f"已达到兜底请求数 {self.max_requests}"
+
+        return False, None
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'rss_mb': self.rss / MB if self.rss else None,
+            'baseline_rss_mb': self.baseline_rss / MB if self.baseline_rss else None,
+            'p95': percentile(self.load_times, 95),
+            'baseline_p95': self.baseline_p95,
+            'error_rate': sum(self.errors) / len(self.errors) if self.errors else 0.0,
+        }
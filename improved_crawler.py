@@ -5,39 +5,55 @@
 """
 
 import requests
-import json
 import os
 import time
 import random
+import argparse
+from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
 import logging
-from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
+from assets import AssetWorker, image_sources
+from cassette import pause, replaying, start_browser
+from browser_profile import (ProfileStats, apply_lean_options,
+                             enable_resource_blocking, lean_headless)
+from completeness import is_complete
+from coverage_index import note_article
+from driver_health import DriverHealth
+from log_setup import log_context, log_event, setup_logging
+from negative_cache import article_reason, note_fetch_outcome
+from planner import stage_delta
+from retry_policy import (OK, PARSE, CircuitBreaker, RetryPolicy, classify_exception,
+                          classify_page, classify_parsed)
+from schema import (ArticleContent, ArticleRecord, SchemaError, iter_articles,
+                    load_issue, load_record, save_record)
+from checkpoint import JOURNAL_DIR, GracefulShutdown, RunJournal
+from work_queue import job_key
 import re
 
 # 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('improved_crawler.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('improved_crawler.log')
 logger = logging.getLogger(__name__)
 
 
 class ImprovedArticleCrawler:
-    def __init__(self):
+    def __init__(self, lean=False, rate_limiter=None, download_assets=True):
         self.base_url = "https://rmydb.cnii.com.cn/html"
+        # 多进程worker共享的全局速率预算（work_queue.RateBudget），为None时使用本地随机延迟
+        self.rate_limiter = rate_limiter
+        # 精简模式：eager加载 + 屏蔽图片/媒体/字体（CRAWL_HEADLESS=1 时无头）
+        self.lean = lean
+        self.profile_stats = ProfileStats()
+        # 失败分类与重试等待；熔断器状态在所有worker进程间共享
+        self.retry_policy = RetryPolicy()
+        self.circuit = CircuitBreaker()
+        self.last_outcome = None
         self.setup_driver()
 
         # 创建文章存储目录
@@ -49,7 +65,12 @@ class ImprovedArticleCrawler:
 
         # 请求计数器和延迟控制
         self.request_count = 0
-        self.max_requests_per_session = 20  # 每个会话最多请求数 - 减少以增加重置频率
+        # 浏览器健康状况，决定何时重启会话
+        self.health = DriverHealth()
+        # 各阶段累计耗时（秒），写入断点日志供 planner 建立成本模型
+        self.timings = defaultdict(float)
+        # 正文图片在后台并发下载，不占用文章之间的节奏等待
+        self.assets = AssetWorker() if download_assets else None
 
     def setup_driver(self):
         """设置Chrome WebDriver with anti-detection"""
@@ -60,7 +81,8 @@ class ImprovedArticleCrawler:
             chrome_options.add_argument('--no-sandbox')
             chrome_options.add_argument('--disable-dev-shm-usage')
             chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
+            if not (self.lean and lean_headless()):
+                chrome_options.add_argument('--window-size=1920,1080')
             chrome_options.add_argument(
                 '--disable-blink-features=AutomationControlled')
             chrome_options.add_experimental_option(
@@ -78,14 +100,20 @@ class ImprovedArticleCrawler:
             chrome_options.add_argument(
                 f'--user-agent={random.choice(user_agents)}')
 
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(
-                service=service, options=chrome_options)
+            if self.lean:
+                apply_lean_options(chrome_options)
+
+            # chromedriver 路径只解析一次，浏览器重启时直接使用本地缓存；
+            # 启用录像时录制页面，回放时不启动浏览器
+            self.driver = start_browser(chrome_options)
 
             # 执行反检测脚本
             self.driver.execute_script(
                 "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
+            if self.lean:
+                enable_resource_blocking(self.driver)
+
             self.driver.set_page_load_timeout(60)
             logger.info("Chrome WebDriver 初始化成功")
         except Exception as e:
@@ -103,13 +131,23 @@ class ImprovedArticleCrawler:
         """智能延迟 - 根据请求数量调整延迟时间"""
         self.request_count += 1
 
-        if self.request_count > self.max_requests_per_session:
+        # 内存、加载耗时或错误率恶化时重启浏览器
+        recycle, reason = self.health.should_recycle()
+        if recycle:
             # 重新创建浏览器会话
-            logger.info("达到最大请求数，重新创建浏览器会话")
+            logger.info(f"重新创建浏览器会话: {reason}")
+            recycle_start = time.time()
             self.driver.quit()
-            time.sleep(random.uniform(120, 180))  # 长时间休息 2-3分钟
+            pause(random.uniform(120, 180))  # 长时间休息 2-3分钟
             self.setup_driver()
+            self.health.reset()
             self.request_count = 0
+            self.timings['recycle'] += time.time() - recycle_start
+
+        if self.rate_limiter is not None and not replaying():
+            # 由全局速率预算统一调度所有worker的请求间隔
+            self.timings['pacing'] += self.rate_limiter.acquire()
+            return
 
         # 根据请求数量动态调整延迟 - 有随机波动的间隔
         if self.request_count < 10:
@@ -120,60 +158,104 @@ class ImprovedArticleCrawler:
             delay = random.uniform(70, 90)  # 70-90秒的随机值
 
         logger.info(f"等待 {delay:.1f} 秒 (请求数: {self.request_count})")
-        time.sleep(delay)
-
-    def extract_article_content(self, url):
-        """提取文章内容 - 增强错误处理"""
-        max_retries = 3
-
-        for retry in range(max_retries):
-            try:
-                logger.info(f"正在访问: {url} (尝试 {retry + 1}/{max_retries})")
-
-                # 智能延迟
-                self.smart_delay()
-
-                # 访问页面
-                self.driver.get(url)
-
-                # 等待页面加载 - 增加延迟
-                time.sleep(random.uniform(8, 15))
-
-                # 检查是否被重定向或返回错误页面
-                current_url = self.driver.current_url
-                if current_url != url:
-                    logger.warning(f"页面被重定向: {current_url}")
-
-                # 检查页面标题是否包含错误信息
-                page_title = self.driver.title
-
-                # 获取页面HTML
-                html_content = self.driver.page_source
-
-                # 检查HTML内容是否包含错误信息
-                if any(error in html_content.lower() for error in ['403 forbidden', '404 not found', '500 internal server error']):
-                    logger.warning("页面内容包含错误信息")
-                    if retry < max_retries - 1:
-                        logger.info("等待后重试...")
-                        time.sleep(random.uniform(40, 80))
-                        continue
+        pause(delay)
+        self.timings['pacing'] += delay
+
+    def fetch_page_source(self, url, retry=0):
+        """访问一次页面，返回 (页面HTML, 结果分类)；是否重试由调用方决定"""
+        max_retries = self.retry_policy.max_attempts
+
+        # 站点熔断期间在这里等待，恢复前只有一个探测请求
+        wait_start = time.time()
+        if not replaying():
+            # 回放时录像中的限流响应原样返回，不按实际时间等待熔断
+            self.circuit.wait(url)
+        self.timings['circuit'] += time.time() - wait_start
+        try:
+            logger.info(f"正在访问: {url} (尝试 {retry + 1}/{max_retries})")
+
+            # 智能延迟
+            self.smart_delay()
+
+            # 访问页面
+            load_start = time.time()
+            self.driver.get(url)
+            load_seconds = time.time() - load_start
+            if self.lean:
+                self.profile_stats.record_page(self.driver, load_seconds)
+
+            # 等待页面加载 - 增加延迟
+            pause(random.uniform(8, 15))
+
+            # 检查是否被重定向或返回错误页面
+            current_url = self.driver.current_url
+            if current_url != url:
+                logger.warning(f"页面被重定向: {current_url}")
+
+            # 获取页面HTML
+            html_content = self.driver.page_source
+            self.timings['load'] += time.time() - load_start
+
+            # 根据标题和页面开头判断错误类型
+            outcome = classify_page(self.driver.title, html_content)
+            self.health.record(self.driver, load_seconds)
+            if outcome != OK:
+                logger.warning(f"页面内容包含错误信息: {outcome}")
+            log_event(logger, f"页面加载完成: {load_seconds:.1f} 秒", stage='fetch',
+                      outcome=outcome, seconds=load_seconds)
+            return html_content, outcome
+
+        except TimeoutException as e:
+            outcome = classify_exception(e)
+            log_event(logger, f"页面加载超时 (尝试 {retry + 1}/{max_retries})", stage='fetch',
+                      outcome=outcome, level=logging.WARNING)
+            self.health.record(self.driver, error=True)
+            return None, outcome
+        except Exception as e:
+            logger.error(f"提取文章内容失败 (尝试 {retry + 1}/{max_retries}): {e}")
+            # 只有浏览器异常计入错误率，页面加载后的其他错误不是浏览器的问题
+            if isinstance(e, WebDriverException):
+                self.health.record(self.driver, error=True)
+            return None, classify_exception(e)
+
+    def should_retry(self, url, outcome, retry):
+        """记录本次结果（熔断器）并按失败类型等待，返回是否需要重试"""
+        self.last_outcome = outcome
+        if outcome == OK:
+            self.circuit.success(url)
+            return False
 
-                # 解析HTML
-                return self.parse_article_html(html_content)
+        tripped = self.circuit.failure(url, outcome)
+        delay = self.retry_policy.delay(outcome, retry)
+        if delay is None:
+            return False
+        if not tripped:
+            # 熔断时由 circuit.wait 负责等待
+            logger.info(f"{outcome} 失败，等待 {delay:.0f} 秒后重试...")
+            pause(delay)
+            self.timings['retry_wait'] += delay
+        return True
 
-            except TimeoutException:
-                logger.warning(f"页面加载超时 (尝试 {retry + 1}/{max_retries})")
-                if retry < max_retries - 1:
-                    time.sleep(random.uniform(30, 60))
-            except Exception as e:
-                logger.error(f"提取文章内容失败 (尝试 {retry + 1}/{max_retries}): {e}")
-                if retry < max_retries - 1:
-                    time.sleep(random.uniform(20, 40))
+    def extract_article_content(self, url):
+        """提取文章内容 - 按失败类型决定是否重试"""
+        parsed = None
+
+        for retry in range(self.retry_policy.max_attempts):
+            html_content, outcome = self.fetch_page_source(url, retry)
+            if outcome == OK:
+                parsed = self.parse_article_html(html_content)
+                outcome = classify_parsed(parsed)
+            if not self.should_retry(url, outcome, retry):
+                break
 
-        logger.error(f"所有重试都失败了: {url}")
+        if outcome == OK or outcome == PARSE:
+            # PARSE: 页面正常但正文为空，交给调用方判断是否保存
+            return parsed
+        logger.error(f"放弃抓取 ({outcome}): {url}")
         return None
 
-    def parse_article_html(self, html_content):
+    @staticmethod
+    def parse_article_html(html_content):
         """解析HTML内容"""
         soup = BeautifulSoup(html_content, 'html.parser')
 
@@ -181,7 +263,8 @@ class ImprovedArticleCrawler:
             'title': None,
             'content': None,
             'publish_date': None,
-            'author': None
+            'author': None,
+            'images': []
         }
 
         # 提取标题
@@ -199,6 +282,8 @@ class ImprovedArticleCrawler:
             # 移除script和style标签
             for script in ozoom_div(["script", "style"]):
                 script.decompose()
+            # 正文中的图片地址，由 assets.AssetWorker 在后台下载
+            article_info['images'] = image_sources(ozoom_div)
 
             # 提取所有段落文本
             paragraphs = ozoom_div.find_all('p')
@@ -254,71 +339,103 @@ class ImprovedArticleCrawler:
 
         return article_info
 
+    def article_path(self, date_str, article_href):
+        """文章保存路径（从articleHref中提取文件名，去掉.html后缀）"""
+        return self.articles_dir / date_str / article_href.replace('.html', '.json')
+
+    @staticmethod
+    def has_valid_record(file_path):
+        """文件已存在且内容完整（与文章的 wordNumber 相比不过短）"""
+        if not file_path.exists():
+            return False
+        try:
+            existing = load_record(file_path)
+        except (OSError, SchemaError):
+            return False
+        return is_complete(existing.content, existing.metadata)
+
+    def save_article(self, date_str, article_metadata, article_content, url):
+        """组装并保存文章记录（article_content 为解析结果字典）"""
+        file_path = self.article_path(date_str, article_metadata.article_href)
+        record = ArticleRecord(
+            metadata=article_metadata,
+            content=ArticleContent(**article_content),
+            crawl_time=datetime.now().isoformat(),
+            source_url=url
+        )
+
+        try:
+            save_record(file_path, record)
+            note_article(date_str, record)
+            log_event(logger, f"文章已保存: {file_path}", stage='write', outcome='saved')
+            if self.assets:
+                self.assets.submit(file_path, record)
+            return True
+        except Exception as e:
+            logger.error(f"保存文章失败: {e}")
+            return False
+
     def crawl_single_article(self, date_str, page_no, article_metadata):
-        """爬取单篇文章"""
-        article_href = article_metadata.get('articleHref')
+        """爬取单篇文章（article_metadata 为 schema.ArticleMeta）
+
+        这篇文章期间的日志都带上日期和链接，结束时记录一条包含耗时和结果的日志
+        """
+        with log_context(date=date_str, href=article_metadata.article_href):
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                success = self._crawl_single_article(date_str, page_no, article_metadata)
+                outcome = 'success' if success else 'failed'
+                return success
+            finally:
+                log_event(logger, f"文章处理结束: {outcome}", stage='article', outcome=outcome,
+                          seconds=time.perf_counter() - started)
+
+    def _crawl_single_article(self, date_str, page_no, article_metadata):
+        article_href = article_metadata.article_href
         if not article_href:
             logger.warning("文章链接为空")
             return False
 
         # 构建文章URL
         url = self.build_article_url(date_str, page_no, article_href)
-
-        # 构建文件路径
-        date_dir = self.articles_dir / date_str
-        date_dir.mkdir(exist_ok=True)
-
-        # 从articleHref中提取文件名（去掉.html后缀）
-        file_name = article_href.replace('.html', '.json')
-        file_path = date_dir / file_name
+        file_path = self.article_path(date_str, article_href)
 
         # 如果文件已存在且内容不是错误的，跳过
-        if file_path.exists():
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-                    existing_content = existing_data.get('content', {})
-                    if (existing_content.get('content') != '无内容' and
-                        existing_content.get('title') != '491 Forbidden' and
-                            existing_content.get('content')):
-                        logger.info(f"文章已存在且有效，跳过: {file_path}")
-                        return True
-            except:
-                pass
+        if self.has_valid_record(file_path):
+            logger.info(f"文章已存在且有效，跳过: {file_path}")
+            return True
+
+        # 已知无法获取的文章（404、无正文的图片稿）不再请求
+        reason = article_reason(date_str, article_href)
+        if reason:
+            logger.info(f"文章在负缓存中 ({reason})，跳过: {file_path}")
+            return False
 
         # 提取文章内容
-        main_title = article_metadata.get('mainTitle', '未知标题')
+        main_title = article_metadata.main_title or '未知标题'
         logger.info(f"正在爬取文章: {main_title} - {url}")
 
         article_content = self.extract_article_content(url)
+        note_fetch_outcome(date_str, article_metadata, self.last_outcome, url)
 
         if article_content is None:
             logger.error(f"无法提取文章内容: {url}")
             return False
 
-        # 组装完整的文章数据
-        article_data = {
-            'metadata': article_metadata,
-            'content': article_content,
-            'crawl_time': datetime.now().isoformat(),
-            'source_url': url
-        }
-
         # 保存文章数据
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(article_data, f, ensure_ascii=False, indent=2)
-            logger.info(f"文章已保存: {file_path}")
-            return True
-        except Exception as e:
-            logger.error(f"保存文章失败: {e}")
-            return False
+        return self.save_article(date_str, article_metadata, article_content, url)
 
-    def crawl_articles_from_json(self, json_file_path, start_from_article=0):
-        """从JSON文件爬取文章"""
+    def crawl_articles_from_json(self, json_file_path, start_from_article=0,
+                                 journal=None, completed=(), shutdown=None):
+        """从JSON文件爬取文章
+
+        journal: checkpoint.RunJournal，记录每篇文章的尝试和结果
+        completed: 断点恢复时已有结果的文章键，直接跳过
+        shutdown: checkpoint.GracefulShutdown，收到退出信号后处理完当前文章即停止
+        """
         try:
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            pages = load_issue(json_file_path)
 
             # 提取日期
             date_str = Path(json_file_path).stem.replace('_data', '')
@@ -329,18 +446,33 @@ class ImprovedArticleCrawler:
             total_articles = 0
             current_article_index = 0
 
-            for page_data in data:
-                page_no = page_data.get('pageNo', '001')
-                articles = page_data.get('onePageArticleList', [])
+            for page in pages:
+                page_no = page.page_no
+
+                for article in page.one_page_article_list:
+                    if shutdown is not None and shutdown.requested:
+                        logger.info(f"{date_str} 收到退出信号，停止爬取")
+                        return success_count, total_articles
 
-                for article in articles:
-                    if current_article_index < start_from_article:
+                    key = job_key(date_str, article.article_href)
+                    if current_article_index < start_from_article or key in completed:
                         current_article_index += 1
                         continue
 
                     total_articles += 1
 
-                    if self.crawl_single_article(date_str, page_no, article):
+                    if journal is not None:
+                        journal.attempt(key)
+                    started = time.time()
+                    timings = dict(self.timings)
+                    success = self.crawl_single_article(
+                        date_str, page_no, article)
+                    if journal is not None:
+                        journal.outcome(key, 'success' if success else 'failed',
+                                        time.time() - started,
+                                        stages=stage_delta(timings, self.timings))
+
+                    if success:
                         success_count += 1
 
                     current_article_index += 1
@@ -356,27 +488,56 @@ class ImprovedArticleCrawler:
     def close(self):
         """关闭浏览器"""
         if hasattr(self, 'driver'):
+            if self.lean:
+                self.profile_stats.log_summary()
             self.driver.quit()
             logger.info("浏览器已关闭")
+        self.circuit.close()
+        if self.assets:
+            self.assets.close()
 
 
 def main():
-    """主函数 - 修复5月1日的文章"""
-    print("开始修复5月1日的文章...")
+    """主函数 - 爬取指定日期的文章，支持断点恢复"""
+    parser = argparse.ArgumentParser(description="爬取指定日期的文章内容")
+    parser.add_argument('json_file', nargs='?', default="data/20250501_data.json",
+                        help="data.json 文件路径")
+    parser.add_argument('--resume', action='store_true',
+                        help="从断点日志继续上次中断的运行")
+    args = parser.parse_args()
+
+    json_file = Path(args.json_file)
+    if not json_file.exists():
+        print(f"未找到数据文件: {json_file}")
+        return
+
+    date_str = json_file.stem.replace('_data', '')
+    journal_path = JOURNAL_DIR / f"improved_crawler_{date_str}.jsonl"
+    print(f"开始爬取 {date_str} 的文章...")
 
     crawler = None
+    journal = None
     try:
-        crawler = ImprovedArticleCrawler()
+        completed = set()
+        if args.resume:
+            journal, state = RunJournal.resume(journal_path)
+            if journal is None:
+                print("没有可恢复的运行")
+                return
+            completed = set(state['outcomes'])
+            print(f"恢复运行 {journal.run_id}: 跳过已处理的 {len(completed)} 篇")
+        else:
+            journal = RunJournal(journal_path)
+            journal.plan([{'key': job_key(date_str, article.article_href)}
+                          for _, article in iter_articles(load_issue(json_file))])
 
-        # 专门修复5月1日的文章
-        json_file = Path("data/20250501_data.json")
-        if json_file.exists():
-            # 从第11篇开始爬取（前10篇已经有了）
+        crawler = ImprovedArticleCrawler()
+        with GracefulShutdown() as shutdown:
             success, total = crawler.crawl_articles_from_json(
-                json_file, start_from_article=10)
-            print(f"5月1日修复结果: {success}/{total}")
-        else:
-            print("未找到5月1日数据文件")
+                json_file, journal=journal, completed=completed,
+                shutdown=shutdown)
+        journal.end('interrupted' if shutdown.requested else 'finished')
+        print(f"{date_str} 爬取结果: {success}/{total}")
 
     except Exception as e:
         print(f"程序执行出错: {e}")
@@ -386,6 +547,8 @@ def main():
     finally:
         if crawler:
             crawler.close()
+        if journal:
+            journal.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键词趋势
+分词阶段在进程池中用 jieba 切分文章正文，按内容哈希缓存词序列（state/tokens.db），
+同样的正文只分词一次；趋势引擎在缓存之上构建 文章 x 词 的稀疏矩阵（state/trends/），
+按日、周、月汇总只是一次稀疏矩阵乘法，多年数据的趋势查询在几秒内完成
+
+用法:
+    python keyword_trends.py tokenize --workers 4
+    python keyword_trends.py trend 人工智能 5G --freq week
+    python keyword_trends.py trend 人工智能 --freq month --start 20240101 --per-10k --export ai.csv
+"""
+
+import io
+import os
+import re
+import json
+import sys
+import zlib
+import hashlib
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+except ImportError:  # jieba 可选，仅用于分词
+    jieba = None
+
+try:
+    from scipy import sparse
+except ImportError:  # scipy 可选，仅用于趋势计算
+    sparse = None
+
+from completeness import is_complete
+from log_setup import setup_logging
+from schema import SchemaError, load_record
+from storage import encode_json, write_many
+from work_queue import STATE_DIR, connect
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKENS_DB = STATE_DIR / "tokens.db"
+TRENDS_DIR = STATE_DIR / "trends"
+
+FREQS = ('day', 'week', 'month')
+
+# 只保留含汉字、字母或数字的词，标点和空白丢弃
+_WORD = re.compile(r'[\w一-鿿]')
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def tokenize(text):
+    """切分一段正文，英文字母统一小写（5G 和 5g 视为同一个词）"""
+    return [token.lower() for token in jieba.lcut(text) if _WORD.search(token)]
+
+
+def _tokenize_job(item):
+    """在分词进程中执行，返回 (内容哈希, 压缩后的词序列)"""
+    digest, text = item
+    return digest, zlib.compress('\n'.join(tokenize(text)).encode('utf-8'))
+
+
+def _decode_tokens(blob):
+    text = zlib.decompress(blob).decode('utf-8')
+    return text.split('\n') if text else []
+
+
+class TokenCache:
+    """文章文件 -> 内容哈希 -> 词序列"""
+
+    def __init__(self, db_path=DEFAULT_TOKENS_DB):
+        self.db_path = Path(db_path)
+        self.conn = connect(self.db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                key TEXT PRIMARY KEY,       -- 日期/articleHref
+                date TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                hash TEXT                   -- 内容无效时为空
+            );
+            CREATE TABLE IF NOT EXISTS tokens (
+                hash TEXT PRIMARY KEY,
+                tokens BLOB NOT NULL
+            );
+        """)
+
+    def _scan(self, articles_dir):
+        """找出新增或修改过的文章文件，返回 (需要读取的文件, 已删除的键)"""
+        known = {row['key']: (row['mtime_ns'], row['size'])
+                 for row in self.conn.execute("SELECT key, mtime_ns, size FROM files")}
+        changed, seen = [], set()
+        for date_dir in sorted(Path(articles_dir).iterdir()):
+            if not date_dir.is_dir():
+                continue
+            for entry in os.scandir(date_dir):
+                if not entry.name.endswith('.json'):
+                    continue
+                key = f"{date_dir.name}/{entry.name.replace('.json', '.html')}"
+                seen.add(key)
+                stat = entry.stat()
+                if known.get(key) != (stat.st_mtime_ns, stat.st_size):
+                    changed.append((key, date_dir.name, Path(entry.path), stat))
+        return changed, set(known) - seen
+
+    def update(self, articles_dir=Path("articles"), workers=None):
+        """分词新增或修改过的文章，返回新分词的篇数"""
+        if jieba is None:
+            raise RuntimeError("未安装jieba，请运行: pip install jieba")
+        if not Path(articles_dir).exists():
+            return 0
+        changed, removed = self._scan(articles_dir)
+
+        rows, pending = [], {}
+        for key, date_str, path, stat in changed:
+            digest = None
+            try:
+                record = load_record(path)
+                content = record.content
+                if is_complete(content, record.metadata):
+                    text = f"{content.title or ''}\n{content.content}"
+                    digest = content_hash(text)
+                    pending[digest] = text
+            except (OSError, SchemaError) as e:
+                logger.warning(f"读取文章失败 {path}: {e}")
+            rows.append((key, date_str, stat.st_mtime_ns, stat.st_size, digest))
+
+        # 已缓存的内容不再分词
+        cached = {row['hash'] for row in self.conn.execute("SELECT hash FROM tokens")}
+        jobs = [(digest, text) for digest, text in pending.items() if digest not in cached]
+        if jobs:
+            logger.info(f"分词 {len(jobs)} 篇文章（{workers or os.cpu_count()} 个进程）")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_tokenize_job, jobs, chunksize=16))
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tokens (hash, tokens) VALUES (?, ?)", results)
+            self.conn.execute("COMMIT")
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany("""
+            INSERT OR REPLACE INTO files (key, date, mtime_ns, size, hash)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+        self.conn.executemany("DELETE FROM files WHERE key = ?", [(key,) for key in removed])
+        self.conn.execute("COMMIT")
+        return len(jobs)
+
+    def documents(self):
+        """所有有效文章 (键, 日期, 内容哈希)，按键排序"""
+        rows = self.conn.execute(
+            "SELECT key, date, hash FROM files WHERE hash IS NOT NULL ORDER BY key")
+        return [(row['key'], row['date'], row['hash']) for row in rows]
+
+    def tokens(self, digest):
+        row = self.conn.execute("SELECT tokens FROM tokens WHERE hash = ?", (digest,)).fetchone()
+        return _decode_tokens(row['tokens']) if row else []
+
+    def close(self):
+        self.conn.close()
+
+
+class TermMatrix:
+    """文章 x 词 的稀疏计数矩阵；只有新增文章时追加行，文章被修改或删除时重建"""
+
+    def __init__(self, trends_dir=TRENDS_DIR):
+        self.trends_dir = Path(trends_dir)
+        self.vocab = {}        # 词 -> 列号
+        self.docs = []         # [(键, 日期, 内容哈希)]
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.int32)
+
+    @property
+    def _matrix_path(self):
+        return self.trends_dir / "term_matrix.npz"
+
+    @property
+    def _meta_path(self):
+        return self.trends_dir / "term_matrix.json"
+
+    def load(self):
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.matrix = sparse.load_npz(self._matrix_path).tocsr()
+        except (OSError, ValueError):
+            return self
+        self.vocab = {term: i for i, term in enumerate(meta['vocab'])}
+        self.docs = [tuple(doc) for doc in meta['docs']]
+        return self
+
+    def save(self):
+        buf = io.BytesIO()
+        sparse.save_npz(buf, self.matrix)
+        vocab = sorted(self.vocab, key=self.vocab.get)
+        meta = {'vocab': vocab, 'docs': [list(doc) for doc in self.docs]}
+        # 矩阵和词表必须一致，一起落盘
+        write_many([(self._matrix_path, buf.getvalue()),
+                    (self._meta_path, encode_json(meta))])
+
+    def _rows(self, cache, docs):
+        indptr, indices, data = [0], [], []
+        for _, _, digest in docs:
+            counts = {}
+            for token in cache.tokens(digest):
+                column = self.vocab.get(token)
+                if column is None:
+                    column = self.vocab[token] = len(self.vocab)
+                counts[column] = counts.get(column, 0) + 1
+            indices.extend(counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.array(data, dtype=np.int32), np.array(indices, dtype=np.int64), np.array(indptr)),
+            shape=(len(docs), len(self.vocab)))
+
+    def sync(self, cache):
+        """与分词缓存同步，返回新增的行数"""
+        docs = cache.documents()
+        known = set(self.docs)
+        if not known.issubset(docs):
+            # 有文章被修改或删除，整体重建
+            logger.info("文章有修改或删除，重建词矩阵")
+            self.vocab, self.docs = {}, []
+            self.matrix = sparse.csr_matrix((0, 0), dtype=np.int32)
+            known = set()
+
+        new_docs = [doc for doc in docs if doc not in known]
+        if not new_docs:
+            return 0
+        rows = self._rows(cache, new_docs)
+        old = self.matrix
+        old.resize((old.shape[0], len(self.vocab)))
+        self.matrix = sparse.vstack([old, rows], format='csr')
+        self.docs.extend(new_docs)
+        self.save()
+        logger.info(f"词矩阵: {len(self.docs)} 篇文章, {len(self.vocab)} 个词")
+        return len(new_docs)
+
+
+def period_label(date_str, freq):
+    if freq == 'day':
+        return date_str
+    if freq == 'month':
+        return date_str[:6]
+    year, week, _ = datetime.strptime(date_str, "%Y%m%d").isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _count_sequence(tokens, parts):
+    """词序列中连续出现 parts 的次数"""
+    n = len(parts)
+    first = parts[0]
+    return sum(1 for i, token in enumerate(tokens)
+               if token == first and tokens[i:i + n] == parts)
+
+
+def term_counts(matrix, term, cache):
+    """每篇文章中 term 的出现次数（长度为文章数的数组）
+
+    词表中没有的词（"数字经济" 被切分成 "数字"、"经济"）按同样的分词结果在词序列中匹配连续出现：
+    先用词矩阵筛出所有组成词都出现过的文章，只读取这些文章的词序列
+    """
+    column = matrix.vocab.get(term)
+    if column is not None:
+        return matrix.matrix[:, column].toarray().ravel()
+
+    counts = np.zeros(matrix.matrix.shape[0], dtype=np.int64)
+    if jieba is None:
+        logger.warning(f"词表中没有 {term}，未安装jieba，无法按分词结果匹配")
+        return counts
+    parts = tokenize(term)
+    columns = sorted({matrix.vocab.get(part) for part in parts})
+    if len(parts) < 2 or None in columns:
+        logger.warning(f"词表中没有 {term}，所有文章中都没有出现")
+        return counts
+
+    present = np.asarray((matrix.matrix[:, columns] > 0).sum(axis=1)).ravel()
+    candidates = np.flatnonzero(present == len(columns))
+    for i in candidates:
+        counts[i] = _count_sequence(cache.tokens(matrix.docs[i][2]), parts)
+    logger.info(f"{term} 按分词 {'/'.join(parts)} 匹配: {len(candidates)} 篇候选文章")
+    return counts
+
+
+def trend(matrix, terms, freq='week', start=None, end=None, per_10k=False, cache=None):
+    """各周期中每个词的出现次数（或每万词中的次数），返回 pandas.DataFrame（行为周期，列为词）
+
+    词表中没有的多词短语需要读取分词缓存，cache 为空时打开默认的 TokenCache
+    """
+    import pandas as pd
+
+    rows = [i for i, (_, date_str, _) in enumerate(matrix.docs)
+            if (start is None or date_str >= start) and (end is None or date_str <= end)]
+    labels = [period_label(matrix.docs[i][1], freq) for i in rows]
+    periods, inverse = np.unique(np.array(labels, dtype=str), return_inverse=True)
+
+    # 周期 x 文章 的指示矩阵，与 文章 x 词 相乘得到 周期 x 词
+    indicator = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int64), (inverse, np.array(rows, dtype=np.int64))),
+        shape=(len(periods), matrix.matrix.shape[0]))
+    terms = [term.lower() for term in terms]
+
+    own_cache = cache is None and any(term not in matrix.vocab for term in terms)
+    if own_cache:
+        cache = TokenCache()
+    try:
+        result = np.zeros((len(periods), len(terms)), dtype=np.int64)
+        for j, term in enumerate(terms):
+            result[:, j] = indicator @ term_counts(matrix, term, cache)
+    finally:
+        if own_cache:
+            cache.close()
+
+    if per_10k:
+        totals = np.asarray((indicator @ matrix.matrix).sum(axis=1)).ravel()
+        result = result / np.maximum(totals, 1)[:, None] * 10000
+    return pd.DataFrame(result, index=pd.Index(periods, name=freq), columns=terms)
+
+
+def load_trends(articles_dir=Path("articles"), workers=None):
+    """分词新文章并同步词矩阵，返回 TermMatrix"""
+    if sparse is None:
+        raise RuntimeError("未安装scipy，请运行: pip install scipy")
+    cache = TokenCache()
+    try:
+        cache.update(articles_dir, workers)
+        matrix = TermMatrix().load()
+        matrix.sync(cache)
+    finally:
+        cache.close()
+    return matrix
+
+
+def main():
+    """主函数"""
+    setup_logging()
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--articles-dir', type=Path, default=Path("articles"))
+    common.add_argument('--workers', type=int, help="分词进程数（默认为CPU核数）")
+
+    parser = argparse.ArgumentParser(description="关键词趋势")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('tokenize', parents=[common],
+                          help="分词新增或修改过的文章并更新词矩阵")
+    trend_parser = subparsers.add_parser('trend', parents=[common], help="查询词频趋势")
+    trend_parser.add_argument('terms', nargs='+', help="关键词")
+    trend_parser.add_argument('--freq', choices=FREQS, default='week', help="汇总粒度")
+    trend_parser.add_argument('--start', help="开始日期 YYYYMMDD")
+    trend_parser.add_argument('--end', help="结束日期 YYYYMMDD")
+    trend_parser.add_argument('--per-10k', action='store_true', help="显示每万词中的出现次数")
+    trend_parser.add_argument('--export', type=Path, help="导出为CSV")
+    args = parser.parse_args()
+
+    try:
+        matrix = load_trends(args.articles_dir, args.workers)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+
+    if args.command == 'tokenize':
+        print(f"词矩阵: {len(matrix.docs)} 篇文章, {len(matrix.vocab)} 个词")
+        return
+
+    result = trend(matrix, args.terms, args.freq, args.start, args.end, args.per_10k)
+    if args.export:
+        result.to_csv(args.export, encoding='utf-8-sig')
+        print(f"💾 已导出到: {args.export}")
+    else:
+        print(result.round(2).to_string())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统一的日志配置
+日志调用只把记录放入内存队列，格式化和写文件都由后台线程（QueueListener）完成，抓取线程不再等待磁盘I/O。
+日志文件每行一个JSON对象，除时间、级别、模块和消息外，固定包含
+run_id、date、href、stage、duration_ms、outcome 字段（没有时为 null），可以直接按字段筛选统计；
+控制台仍输出原来的文本格式。
+
+在脚本中调用 setup_logging('xxx.log') 代替 logging.basicConfig；与 basicConfig 一样，
+进程中第一次调用生效，之后的调用不改变配置。
+
+    with log_context(date=date_str, href=article_href):
+        ...                                   # 范围内的日志自动带上 date、href
+    log_event(logger, "页面加载完成", stage='fetch', outcome='ok', seconds=0.81)
+"""
+
+import os
+import sys
+import json
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+PROCESS_TEXT_FORMAT = '%(asctime)s - %(processName)s - %(levelname)s - %(message)s'
+
+# JSON 日志的固定字段
+FIELDS = ('run_id', 'date', 'href', 'stage', 'duration_ms', 'outcome')
+
+# 同一次运行的子进程（队列worker等）继承父进程的 run_id
+RUN_ID_ENV = 'CRAWL_RUN_ID'
+
+_context = contextvars.ContextVar('log_context', default={})
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+def run_id():
+    """本次运行的ID，首次调用时生成并写入环境变量，子进程沿用"""
+    value = os.environ.get(RUN_ID_ENV)
+    if not value:
+        value = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        os.environ[RUN_ID_ENV] = value
+    return value
+
+
+@contextmanager
+def log_context(**fields):
+    """范围内当前线程的日志记录附加这些字段（如 date、href、stage）"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def log_event(logger, message, stage, outcome=None, seconds=None, level=logging.INFO):
+    """记录一条带 stage / outcome / duration_ms 字段的日志"""
+    logger.log(level, message, extra={
+        'stage': stage,
+        'outcome': outcome,
+        'duration_ms': None if seconds is None else round(seconds * 1000),
+    })
+
+
+class ContextQueueHandler(QueueHandler):
+    """在调用线程中只附加上下文字段后入队；同一进程内的队列不需要序列化，消息格式化留给后台线程"""
+
+    def __init__(self, log_queue, run_id):
+        super().__init__(log_queue)
+        self.run_id = run_id
+
+    def prepare(self, record):
+        record.run_id = self.run_id
+        for name, value in _context.get().items():
+            # extra= 中显式给出的字段优先
+            if getattr(record, name, None) is None:
+                setattr(record, name, value)
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.processName,
+        }
+        for name in FIELDS:
+            entry[name] = getattr(record, name, None)
+        entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_file=None, level=logging.INFO, fmt=TEXT_FORMAT):
+    """配置根日志：控制台输出文本，log_file 写入JSON行；已配置过时不做任何事"""
+    global _listener, _handler
+    with _lock:
+        root = logging.getLogger()
+        if _listener is not None or root.handlers:
+            return
+
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter(fmt))
+        handlers = [console]
+        if log_file:
+            file_handler = logging.FileHandler(log_file, encoding='utf-8')
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+
+        log_queue = queue.SimpleQueue()
+        _handler = ContextQueueHandler(log_queue, run_id())
+        root.addHandler(_handler)
+        root.setLevel(level)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """写出队列中剩余的记录并停止后台线程"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _reset_after_fork():
+    # 子进程中没有父进程的后台线程，用新的队列和线程接着写同样的输出
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    _handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+    if 'multiprocessing' in sys.modules:
+        # multiprocessing 的子进程以 os._exit 退出，不执行 atexit；子进程启动时会清空已注册的
+        # Finalize，所以在它自己的 after-fork 回调中注册
+        from multiprocessing import util
+        util.register_after_fork(_handler, lambda _: util.Finalize(None, stop_logging, exitpriority=0))
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
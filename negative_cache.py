@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化的负缓存
+记录确定无法获取的目标（不出报的日期、404的文章、只有图片没有正文的文章），
+按原因设置有效期；所有抓取入口在发请求前先查询，避免每次运行都把延迟预算花在它们身上
+
+用法:
+    python negative_cache.py stats
+    python negative_cache.py list --reason permanent_missing
+    python negative_cache.py clear --reason no_issue
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from log_setup import run_id, setup_logging
+from priority import is_picture_article
+from retry_policy import PARSE, PERMANENT
+from work_queue import STATE_DIR, connect, job_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NEGATIVE_DB = STATE_DIR / "negative_cache.db"
+
+# 原因代码
+NO_ISSUE = 'no_issue'                    # 该日期没有出报（返回HTML或404）
+PERMANENT_MISSING = 'permanent_missing'  # 文章页面404
+EMPTY_PICTURE = 'empty_picture'          # 图片稿，页面上没有可提取的正文
+
+DAY = 24 * 3600
+REASON_TTLS = {
+    NO_ISSUE: 90 * DAY,
+    PERMANENT_MISSING: 30 * DAY,
+    EMPTY_PICTURE: 180 * DAY,
+}
+
+# 最近几天的日期可能只是尚未发布，不记为不出报
+NO_ISSUE_GRACE_DAYS = 3
+
+# 返回HTML页面这类不确定的信号，需要在窗口期内的几次不同运行中都出现才记为不出报
+OBSERVE_MIN_RUNS = 3
+OBSERVE_WINDOW = 30 * DAY
+
+
+class NegativeCache:
+    """键 -> (原因, 过期时间)"""
+
+    def __init__(self, db_path=DEFAULT_NEGATIVE_DB):
+        self.db_path = Path(db_path)
+        # 抓取流水线的多个线程可能共用，调用方负责串行化
+        self.conn = connect(self.db_path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS negatives (
+                key TEXT PRIMARY KEY,
+                reason TEXT NOT NULL,
+                created REAL NOT NULL,
+                expires REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                detail TEXT
+            );
+            CREATE TABLE IF NOT EXISTS observations (
+                key TEXT NOT NULL,
+                run_id TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                seen REAL NOT NULL,
+                detail TEXT,
+                PRIMARY KEY (key, run_id)
+            );
+        """)
+
+    def add(self, key, reason, detail=None, ttl=None):
+        """记录一个确定无法获取的目标"""
+        now = time.time()
+        ttl = REASON_TTLS[reason] if ttl is None else ttl
+        self.conn.execute("""
+            INSERT OR REPLACE INTO negatives (key, reason, created, expires, detail)
+            VALUES (?, ?, ?, ?, ?)
+        """, (key, reason, now, now + ttl, detail))
+        logger.info(f"加入负缓存 {key}: {reason}")
+
+    def observe(self, key, reason, run, detail=None, min_runs=OBSERVE_MIN_RUNS,
+                window=OBSERVE_WINDOW):
+        """记录一次不确定的观察（同一次运行只计一次），在 min_runs 次不同运行中出现后才加入负缓存
+
+        返回窗口期内观察到的运行次数
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "DELETE FROM observations WHERE key = ? AND seen < ?", (key, now - window))
+            self.conn.execute("""
+                INSERT OR REPLACE INTO observations (key, run_id, reason, seen, detail)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, run, reason, now, detail))
+            runs = self.conn.execute(
+                "SELECT COUNT(*) FROM observations WHERE key = ? AND reason = ?",
+                (key, reason)).fetchone()[0]
+            if runs >= min_runs:
+                self.conn.execute("DELETE FROM observations WHERE key = ?", (key,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        if runs >= min_runs:
+            self.add(key, reason, f"{detail} ({runs} 次运行)" if detail else None)
+        else:
+            logger.info(f"{key} 观察到 {reason} ({runs}/{min_runs} 次运行)")
+        return runs
+
+    def lookup(self, key, hit=True):
+        """返回未过期的原因代码，不在缓存中返回 None；hit=True 时计为一次省下的请求"""
+        row = self.conn.execute(
+            "SELECT reason, expires FROM negatives WHERE key = ?", (key,)).fetchone()
+        if row is None or row['expires'] < time.time():
+            return None
+        if hit:
+            self.conn.execute("UPDATE negatives SET hits = hits + 1 WHERE key = ?", (key,))
+        return row['reason']
+
+    def keys(self, reason=None):
+        """所有未过期的键（扫描时批量过滤用）"""
+        sql = "SELECT key FROM negatives WHERE expires >= ?"
+        params = [time.time()]
+        if reason:
+            sql += " AND reason = ?"
+            params.append(reason)
+        return {row['key'] for row in self.conn.execute(sql, params)}
+
+    def remove(self, key):
+        self.conn.execute("DELETE FROM negatives WHERE key = ?", (key,))
+        self.conn.execute("DELETE FROM observations WHERE key = ?", (key,))
+
+    def clear(self, reason=None):
+        """清除全部或某一原因的记录（包括尚未确认的观察），返回删除条数"""
+        if reason:
+            cursor = self.conn.execute("DELETE FROM negatives WHERE reason = ?", (reason,))
+            self.conn.execute("DELETE FROM observations WHERE reason = ?", (reason,))
+        else:
+            cursor = self.conn.execute("DELETE FROM negatives")
+            self.conn.execute("DELETE FROM observations")
+        return cursor.rowcount
+
+    def purge_expired(self):
+        cursor = self.conn.execute("DELETE FROM negatives WHERE expires < ?", (time.time(),))
+        return cursor.rowcount
+
+    def entries(self, reason=None):
+        sql = "SELECT * FROM negatives"
+        params = []
+        if reason:
+            sql += " WHERE reason = ?"
+            params.append(reason)
+        return [dict(row) for row in self.conn.execute(sql + " ORDER BY key", params)]
+
+    def stats(self):
+        """按原因统计：{原因: (有效条数, 命中次数)}"""
+        rows = self.conn.execute("""
+            SELECT reason, COUNT(*), COALESCE(SUM(hits), 0) FROM negatives
+            WHERE expires >= ? GROUP BY reason
+        """, (time.time(),)).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_negative_cache():
+    """进程内共享的负缓存"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = NegativeCache()
+        return _default_cache
+
+
+def _reset_after_fork():
+    global _default_cache, _default_lock
+    _default_cache = None
+    _default_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _lookup(key, hit=True):
+    try:
+        cache = get_negative_cache()
+        with _default_lock:
+            return cache.lookup(key, hit)
+    except sqlite3.Error as e:
+        logger.warning(f"查询负缓存失败 {key}: {e}")
+        return None
+
+
+def _add(key, reason, detail=None):
+    try:
+        cache = get_negative_cache()
+        with _default_lock:
+            cache.add(key, reason, detail)
+    except sqlite3.Error as e:
+        logger.warning(f"写入负缓存失败 {key}: {e}")
+
+
+def date_reason(date_str):
+    """该日期是否已知不出报"""
+    return _lookup(date_str)
+
+
+def article_reason(date_str, article_href, hit=True):
+    """该文章是否已知无法获取"""
+    return _lookup(job_key(date_str, article_href), hit)
+
+
+def _recent(date_str):
+    return datetime.strptime(date_str, "%Y%m%d") > datetime.now() - timedelta(days=NO_ISSUE_GRACE_DAYS)
+
+
+def note_no_issue(date_str, detail=None):
+    """记录不出报的日期（404、空数据等确定的信号）；最近几天的日期可能只是尚未发布，不记录"""
+    if _recent(date_str):
+        return
+    _add(date_str, NO_ISSUE, detail)
+
+
+def observe_no_issue(date_str, detail=None):
+    """记录一次可能不出报的信号（返回HTML页面），在几次不同的运行中都出现后才记为不出报"""
+    if _recent(date_str):
+        return
+    try:
+        cache = get_negative_cache()
+        with _default_lock:
+            cache.observe(date_str, NO_ISSUE, run_id(), detail)
+    except sqlite3.Error as e:
+        logger.warning(f"写入负缓存失败 {date_str}: {e}")
+
+
+def note_dead_article(date_str, article_href, reason, detail=None):
+    """记录无法获取的文章（PERMANENT_MISSING 或 EMPTY_PICTURE）"""
+    _add(job_key(date_str, article_href), reason, detail)
+
+
+def note_fetch_outcome(date_str, metadata, outcome, url=None):
+    """根据抓取结果分类（retry_policy）记录无法获取的文章，返回记录的原因"""
+    if outcome == PERMANENT:
+        reason = PERMANENT_MISSING
+    elif outcome == PARSE and is_picture_article(metadata):
+        reason = EMPTY_PICTURE
+    else:
+        return None
+    note_dead_article(date_str, metadata.article_href, reason, url)
+    return reason
+
+
+def dead_article_keys():
+    """所有已知无法获取的文章键（job_key 格式），扫描问题文章时批量过滤"""
+    try:
+        cache = get_negative_cache()
+        with _default_lock:
+            return cache.keys(PERMANENT_MISSING) | cache.keys(EMPTY_PICTURE)
+    except sqlite3.Error as e:
+        logger.warning(f"读取负缓存失败: {e}")
+        return set()
+
+
+def main():
+    """主函数"""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="负缓存管理")
+    parser.add_argument('--db', type=Path, default=DEFAULT_NEGATIVE_DB,
+                        help="负缓存数据库路径")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="按原因统计")
+    for name, help_text in (('list', "列出记录"), ('clear', "清除记录")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--reason', choices=sorted(REASON_TTLS), help="只处理该原因")
+    subparsers.add_parser('purge', help="删除已过期的记录")
+    args = parser.parse_args()
+
+    cache = NegativeCache(args.db)
+    try:
+        if args.command == 'stats':
+            stats = cache.stats()
+            if not stats:
+                print("负缓存为空")
+            for reason, (count, hits) in sorted(stats.items()):
+                print(f"{reason}: {count} 条, 已节省 {hits} 次请求")
+        elif args.command == 'list':
+            for entry in cache.entries(args.reason):
+                expires = datetime.fromtimestamp(entry['expires']).strftime('%Y-%m-%d')
+                print(f"{entry['key']}\t{entry['reason']}\t到期 {expires}\t{entry['detail'] or ''}")
+        elif args.command == 'clear':
+            print(f"已清除 {cache.clear(args.reason)} 条记录")
+        else:
+            print(f"已删除 {cache.purge_expired()} 条过期记录")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段的文章抓取流水线
+检查 -> 抓取 -> 解析 -> 校验 -> 写入，各阶段之间用有界队列连接：
+浏览器线程只负责访问页面（或按节奏等待），BeautifulSoup解析在进程池中进行，写文件由单独的写入线程完成
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from log_setup import log_context
+from negative_cache import article_reason, note_fetch_outcome
+from retry_policy import OK, PARSE, classify_parsed
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # 阶段结束标记
+
+# 最终结果
+SAVED = 'saved'
+EXISTING = 'existing'   # 已有有效文件
+SKIPPED = 'skipped'     # 在负缓存中
+FAILED = 'failed'
+
+
+class StageStats:
+    """单个阶段的时间分布：处理中 / 等待输入 / 等待下游"""
+
+    def __init__(self, name, slots=1):
+        self.name = name
+        self.slots = slots
+        self.busy = 0.0
+        self.wait_input = 0.0
+        self.wait_output = 0.0
+        self.items = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, field, seconds):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + seconds)
+
+    def get(self, q, timeout=None):
+        start = time.perf_counter()
+        try:
+            return q.get(timeout=timeout)
+        finally:
+            self.add('wait_input', time.perf_counter() - start)
+
+    def put(self, q, item):
+        start = time.perf_counter()
+        q.put(item)
+        self.add('wait_output', time.perf_counter() - start)
+
+    def summary(self):
+        wall = max((self.finished or time.perf_counter()) - (self.started or 0), 1e-9)
+        capacity = wall * self.slots
+        return {
+            'stage': self.name,
+            'items': self.items,
+            'wall_s': wall,
+            'busy_pct': self.busy / capacity * 100,
+            'wait_input_pct': self.wait_input / capacity * 100,
+            'wait_output_pct': self.wait_output / capacity * 100,
+        }
+
+
+def _item_context(item):
+    """该文章的日志带上日期和链接"""
+    return log_context(date=item['date'], href=item['metadata'].article_href)
+
+
+def _timed_parse(parse_fn, html_content):
+    """在解析进程中执行，返回 (解析结果, 耗时)"""
+    start = time.perf_counter()
+    parsed = parse_fn(html_content)
+    return parsed, time.perf_counter() - start
+
+
+class ArticlePipeline:
+    """用 ImprovedArticleCrawler 的浏览器抓取一批文章
+
+    crawler 需要提供 fetch_page_source / should_retry / parse_article_html /
+    article_path / has_valid_record / save_article / build_article_url
+    """
+
+    def __init__(self, crawler, parse_workers=2, queue_size=8, max_fetches=2,
+                 on_result=None):
+        self.crawler = crawler
+        self.parse_workers = parse_workers
+        self.max_fetches = max_fetches  # 解析为空时最多重新访问的总次数
+        self.on_result = on_result      # on_result(item, status) 每篇文章结束时调用
+
+        self.fetch_queue = queue.Queue(maxsize=queue_size)
+        self.retry_queue = queue.Queue()
+        self.parse_queue = queue.Queue(maxsize=queue_size)
+        self.validate_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+
+        self.stats = {
+            'check': StageStats('check'),
+            'fetch': StageStats('fetch'),
+            'parse': StageStats('parse', slots=parse_workers),
+            'validate': StageStats('validate'),
+            'write': StageStats('write'),
+        }
+        self.results = {SAVED: 0, EXISTING: 0, SKIPPED: 0, FAILED: 0}
+        self._outstanding = 0
+        self._lock = threading.Lock()
+
+    # ---- 结果 ----
+
+    def _finish(self, item, status):
+        with self._lock:
+            self.results[status] += 1
+            self._outstanding -= 1
+        if self.on_result:
+            self.on_result(item, status)
+
+    # ---- 阶段 ----
+
+    def _check_stage(self, items):
+        """已有有效文件或在负缓存中的文章不进入抓取队列"""
+        stats = self.stats['check']
+        stats.started = time.perf_counter()
+        try:
+            self._check_items(items)
+        finally:
+            # 出错时也要通知下游结束，避免流水线挂起
+            stats.put(self.fetch_queue, _DONE)
+            stats.finished = time.perf_counter()
+
+    def _check_items(self, items):
+        stats = self.stats['check']
+        for date_str, page_no, metadata in items:
+            start = time.perf_counter()
+            item = {
+                'date': date_str,
+                'page_no': page_no,
+                'metadata': metadata,
+                'url': self.crawler.build_article_url(date_str, page_no, metadata.article_href),
+                'fetches': 0,
+            }
+            file_path = self.crawler.article_path(date_str, metadata.article_href)
+            status = None
+            if self.crawler.has_valid_record(file_path):
+                logger.info(f"文章已存在且有效，跳过: {file_path}")
+                status = EXISTING
+            else:
+                reason = article_reason(date_str, metadata.article_href)
+                if reason:
+                    logger.info(f"文章在负缓存中 ({reason})，跳过: {file_path}")
+                    status = SKIPPED
+            stats.add('busy', time.perf_counter() - start)
+            stats.items += 1
+
+            with self._lock:
+                self._outstanding += 1
+            if status:
+                self._finish(item, status)
+            else:
+                stats.put(self.fetch_queue, item)
+
+    def _next_fetch_item(self, source_done):
+        """优先处理需要重新访问的文章；返回 (文章, 输入是否已结束)，全部完成时文章为 None"""
+        stats = self.stats['fetch']
+        while True:
+            try:
+                return self.retry_queue.get_nowait(), source_done
+            except queue.Empty:
+                pass
+            if source_done:
+                with self._lock:
+                    if self._outstanding == 0:
+                        return None, True
+                try:
+                    return stats.get(self.retry_queue, timeout=0.5), True
+                except queue.Empty:
+                    continue
+            item = stats.get(self.fetch_queue)
+            if item is _DONE:
+                source_done = True
+                continue
+            return item, False
+
+    def _fetch_stage(self):
+        """在当前线程驱动浏览器；节奏等待（smart_delay、重试等待）计为处理时间"""
+        stats = self.stats['fetch']
+        stats.started = time.perf_counter()
+        try:
+            self._fetch_items()
+        finally:
+            stats.put(self.parse_queue, _DONE)
+            stats.finished = time.perf_counter()
+
+    def _fetch_items(self):
+        stats = self.stats['fetch']
+        source_done = False
+        while True:
+            item, source_done = self._next_fetch_item(source_done)
+            if item is None:
+                break
+
+            start = time.perf_counter()
+            url = item['url']
+            main_title = item['metadata'].main_title or '未知标题'
+            with _item_context(item):
+                logger.info(f"正在爬取文章: {main_title} - {url}")
+                try:
+                    for retry in range(self.crawler.retry_policy.max_attempts):
+                        html_content, outcome = self.crawler.fetch_page_source(url, retry)
+                        if not self.crawler.should_retry(url, outcome, retry):
+                            break
+                except Exception as e:
+                    logger.error(f"抓取出错 {url}: {e}")
+                    self._finish(item, FAILED)
+                    continue
+            item['fetches'] += 1
+            stats.add('busy', time.perf_counter() - start)
+            stats.items += 1
+
+            if outcome != OK:
+                note_fetch_outcome(item['date'], item['metadata'], outcome, url)
+                logger.error(f"无法提取文章内容 ({outcome}): {url}")
+                self._finish(item, FAILED)
+                continue
+            item['html'] = html_content
+            stats.put(self.parse_queue, item)
+
+    def _parse_stage(self, pool):
+        """把页面分发到解析进程池，同时在途的页面数不超过进程数的两倍"""
+        stats = self.stats['parse']
+        stats.started = time.perf_counter()
+        in_flight = threading.BoundedSemaphore(self.parse_workers * 2)
+        parse_fn = type(self.crawler).parse_article_html
+
+        def done(future, item):
+            try:
+                parsed, seconds = future.result()
+                stats.add('busy', seconds)
+                item['parsed'] = parsed
+            except Exception as e:
+                logger.error(f"解析失败 {item['url']}: {e}")
+                item['parsed'] = None
+            stats.add('items', 1)
+            start = time.perf_counter()
+            self.validate_queue.put(item)
+            stats.add('wait_output', time.perf_counter() - start)
+            in_flight.release()
+
+        while True:
+            item = stats.get(self.parse_queue)
+            if item is _DONE:
+                break
+            in_flight.acquire()
+            html_content = item.pop('html')
+            future = pool.submit(_timed_parse, parse_fn, html_content)
+            future.add_done_callback(lambda f, item=item: done(f, item))
+
+        # 等待所有在途的解析完成
+        for _ in range(self.parse_workers * 2):
+            in_flight.acquire()
+        stats.put(self.validate_queue, _DONE)
+        stats.finished = time.perf_counter()
+
+    def _validate_stage(self):
+        stats = self.stats['validate']
+        stats.started = time.perf_counter()
+        while True:
+            item = stats.get(self.validate_queue)
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            parsed = item['parsed']
+            outcome = classify_parsed(parsed) if parsed is not None else PARSE
+            stats.add('busy', time.perf_counter() - start)
+            stats.items += 1
+
+            if outcome == PARSE and item['fetches'] < self.max_fetches:
+                # 页面可能未加载完整，重新访问一次
+                logger.info(f"正文为空，重新访问: {item['url']}")
+                self.retry_queue.put(item)
+            elif parsed is None or outcome not in (OK, PARSE):
+                logger.error(f"无法提取文章内容 ({outcome}): {item['url']}")
+                self._finish(item, FAILED)
+            else:
+                if outcome == PARSE:
+                    note_fetch_outcome(item['date'], item['metadata'], outcome, item['url'])
+                stats.put(self.write_queue, item)
+
+        stats.put(self.write_queue, _DONE)
+        stats.finished = time.perf_counter()
+
+    def _write_stage(self):
+        stats = self.stats['write']
+        stats.started = time.perf_counter()
+        while True:
+            item = stats.get(self.write_queue)
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            with _item_context(item):
+                saved = self.crawler.save_article(
+                    item['date'], item['metadata'], item['parsed'], item['url'])
+            stats.add('busy', time.perf_counter() - start)
+            stats.items += 1
+            self._finish(item, SAVED if saved else FAILED)
+        stats.finished = time.perf_counter()
+
+    # ---- 运行 ----
+
+    def run(self, items):
+        """处理 (日期, 页码, schema.ArticleMeta) 序列，返回各结果的数量"""
+        threads = [
+            threading.Thread(target=self._check_stage, args=(items,), name='pipeline-check', daemon=True),
+            threading.Thread(target=self._validate_stage, name='pipeline-validate', daemon=True),
+            threading.Thread(target=self._write_stage, name='pipeline-write', daemon=True),
+        ]
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+            parse_thread = threading.Thread(
+                target=self._parse_stage, args=(pool,), name='pipeline-parse', daemon=True)
+            for thread in threads + [parse_thread]:
+                thread.start()
+
+            # 浏览器只能在一个线程中使用，抓取阶段在当前线程运行
+            self._fetch_stage()
+
+            parse_thread.join()
+            for thread in threads:
+                thread.join()
+
+        self.log_utilization()
+        return dict(self.results)
+
+    def utilization(self):
+        return [stats.summary() for stats in self.stats.values()]
+
+    def log_utilization(self):
+        logger.info(f"流水线完成: 保存 {self.results[SAVED]}, 已存在 {self.results[EXISTING]}, "
+                    f"负缓存跳过 {self.results[SKIPPED]}, 失败 {self.results[FAILED]}")
+        for s in self.utilization():
+            logger.info(
+                f"  {s['stage']:<8} {s['items']:>5} 项  处理 {s['busy_pct']:5.1f}%  "
+                f"等待输入 {s['wait_input_pct']:5.1f}%  等待下游 {s['wait_output_pct']:5.1f}%")
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抓取计划与完成时间预测
+从断点日志（state/journals/*.jsonl）中每篇文章的耗时、各阶段耗时和结果建立成本模型，
+按给定的队列长度和节奏配置做蒙特卡洛模拟，给出预计完成时间及置信区间，
+并推荐能在指定时间内完成、对站点压力最小的配置
+
+用法:
+    python planner.py                          # 预测当前队列
+    python planner.py --articles 120 --deadline 6
+    python planner.py --workers 2 --interval 60
+"""
+
+import sys
+import heapq
+import random
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+from checkpoint import JOURNAL_DIR, OUTCOME, read_records
+
+logger = logging.getLogger(__name__)
+
+# 节奏由浏览器自身的 smart_delay 决定（PracticalCrawler 的分档延迟）
+SMART_DELAY_TIERS = [(8, (60, 90)), (15, (70, 100)), (None, (80, 120))]
+RECYCLE_PAUSE = (120, 180)
+
+# 没有历史数据时的先验
+DEFAULT_SUCCESS_RATE = 0.7
+DEFAULT_SUCCESS_WORK = (10, 20)     # 页面加载 + 等待渲染
+DEFAULT_FAILURE_WORK = (60, 400)    # 含重试等待
+DEFAULT_RECYCLE_RATE = 1 / 50
+DEFAULT_PACING_MEAN = 80            # 旧日志没有阶段耗时时，从总耗时中扣除的节奏等待
+
+# 不属于文章本身处理时间的阶段，由配置决定，模拟时单独生成
+PACED_STAGES = ('pacing', 'recycle')
+
+
+def stage_delta(before, after):
+    """两次 crawler.timings 快照之差，只保留有耗时的阶段"""
+    return {stage: round(after[stage] - before.get(stage, 0.0), 3)
+            for stage in after if after[stage] - before.get(stage, 0.0) > 0}
+
+
+class PlanConfig:
+    """一次运行的节奏配置
+
+    interval=None 时为单浏览器批量模式（production_fix：smart_delay 分档延迟、批次休息、连续失败暂停），
+    否则为队列worker模式（crawl_worker：workers 个浏览器共享每 interval 秒一个请求的全局预算）
+    """
+
+    def __init__(self, workers=1, interval=None, batch_size=5, batch_rest=(60, 120),
+                 fail_streak=3, streak_pause=(1800, 3600), jitter=0.2):
+        self.workers = workers
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_rest = batch_rest
+        self.fail_streak = fail_streak
+        self.streak_pause = streak_pause
+        self.jitter = jitter
+
+    def describe(self):
+        if self.interval is None:
+            return f"单浏览器批量模式, 每批 {self.batch_size} 篇"
+        return (f"{self.workers} 个worker, 全局间隔 {self.interval:.0f} 秒 "
+                f"(crawl_worker.py run --workers {self.workers} --interval {self.interval:.0f})")
+
+
+class CostModel:
+    """每篇文章的处理耗时分布、成功率和浏览器重启频率"""
+
+    def __init__(self, success_work=None, failure_work=None, success_rate=None,
+                 recycle_rate=None, samples=0):
+        self.success_work = success_work or []
+        self.failure_work = failure_work or []
+        self.success_rate = DEFAULT_SUCCESS_RATE if success_rate is None else success_rate
+        self.recycle_rate = DEFAULT_RECYCLE_RATE if recycle_rate is None else recycle_rate
+        self.samples = samples
+
+    @classmethod
+    def from_journals(cls, journal_dir=JOURNAL_DIR):
+        """读取所有断点日志中的文章结果"""
+        success_work, failure_work = [], []
+        recycles = staged = 0
+        for path in sorted(journal_dir.glob("*.jsonl")):
+            for record in read_records(path):
+                if record.get('event') != OUTCOME or record.get('duration_s') is None:
+                    continue
+                if record['outcome'] not in ('success', 'failed', 'error'):
+                    continue
+
+                stages = record.get('stages')
+                if stages:
+                    staged += 1
+                    recycles += 1 if stages.get('recycle') else 0
+                    work = record['duration_s'] - sum(stages.get(s, 0.0) for s in PACED_STAGES)
+                else:
+                    work = record['duration_s'] - DEFAULT_PACING_MEAN
+                work = max(work, 1.0)
+
+                if record['outcome'] == 'success':
+                    success_work.append(work)
+                else:
+                    failure_work.append(work)
+
+        total = len(success_work) + len(failure_work)
+        return cls(
+            success_work=success_work,
+            failure_work=failure_work,
+            success_rate=len(success_work) / total if total else None,
+            recycle_rate=recycles / staged if staged else None,
+            samples=total,
+        )
+
+    def sample_work(self, rng, success):
+        pool = self.success_work if success else self.failure_work
+        if pool:
+            return rng.choice(pool)
+        low, high = DEFAULT_SUCCESS_WORK if success else DEFAULT_FAILURE_WORK
+        return rng.uniform(low, high)
+
+    def describe(self):
+        source = f"{self.samples} 条历史记录" if self.samples else "默认先验（没有历史记录）"
+        return f"{source}, 成功率 {self.success_rate:.0%}, 浏览器重启率 {self.recycle_rate:.1%}"
+
+
+def _smart_delay(rng, request_count):
+    for limit, (low, high) in SMART_DELAY_TIERS:
+        if limit is None or request_count < limit:
+            return rng.uniform(low, high)
+
+
+def _simulate_batch(n_articles, config, model, rng):
+    """单浏览器批量模式：与 production_batch_fix 的循环一致"""
+    t = 0.0
+    request_count = 0
+    streak = 0
+    for i in range(1, n_articles + 1):
+        request_count += 1
+        if rng.random() < model.recycle_rate:
+            t += rng.uniform(*RECYCLE_PAUSE)
+            request_count = 1
+        t += _smart_delay(rng, request_count)
+
+        success = rng.random() < model.success_rate
+        t += model.sample_work(rng, success)
+
+        streak = 0 if success else streak + 1
+        if streak >= config.fail_streak:
+            t += rng.uniform(*config.streak_pause)
+            streak = 0
+
+        if i % config.batch_size == 0 and i < n_articles:
+            t += rng.uniform(*config.batch_rest)
+    return t
+
+
+def _simulate_workers(n_articles, config, model, rng):
+    """队列worker模式：每个请求占用全局预算的一个时间片"""
+    free_at = [0.0] * config.workers
+    heapq.heapify(free_at)
+    next_slot = 0.0
+    finish = 0.0
+    for _ in range(n_articles):
+        start = heapq.heappop(free_at)
+        if rng.random() < model.recycle_rate:
+            start += rng.uniform(*RECYCLE_PAUSE)
+        start = max(start, next_slot)
+        next_slot = start + config.interval * rng.uniform(1 - config.jitter, 1 + config.jitter)
+
+        end = start + model.sample_work(rng, rng.random() < model.success_rate)
+        finish = max(finish, end)
+        heapq.heappush(free_at, end)
+    return finish
+
+
+def simulate(n_articles, config, model, runs=1000, seed=None):
+    """返回 runs 次模拟的总耗时（秒），已排序"""
+    rng = random.Random(seed)
+    run_once = _simulate_batch if config.interval is None else _simulate_workers
+    return sorted(run_once(n_articles, config, model, rng) for _ in range(runs))
+
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def forecast(n_articles, config, model, runs=1000, seed=None, start=None):
+    """预测结果：中位数和 80% 区间（P10-P90），单位秒，以及对应的完成时刻"""
+    durations = simulate(n_articles, config, model, runs, seed)
+    start = start or datetime.now()
+    result = {
+        'articles': n_articles,
+        'p10': _quantile(durations, 0.10),
+        'p50': _quantile(durations, 0.50),
+        'p90': _quantile(durations, 0.90),
+    }
+    for key in ('p10', 'p50', 'p90'):
+        result[f'{key}_at'] = start + timedelta(seconds=result[key])
+    # 每小时请求数（含失败重试前的首次请求），用于比较对站点的压力
+    result['requests_per_hour'] = n_articles / (result['p50'] / 3600) if result['p50'] else 0
+    return result
+
+
+def candidate_configs():
+    """推荐时考虑的配置"""
+    configs = [PlanConfig(batch_size=size) for size in (5, 10)]
+    for workers in (1, 2, 3, 4):
+        for interval in (120, 90, 60, 45, 30):
+            configs.append(PlanConfig(workers=workers, interval=interval))
+    return configs
+
+
+def recommend(n_articles, deadline_hours, model, runs=300, seed=None):
+    """在 P90 不超过期限的配置中选每小时请求数最少的；都不满足时返回最快的一个
+
+    返回 (配置, 预测, 是否满足期限)
+    """
+    results = [(config, forecast(n_articles, config, model, runs, seed))
+               for config in candidate_configs()]
+    deadline = deadline_hours * 3600
+    feasible = [(c, f) for c, f in results if f['p90'] <= deadline]
+    if feasible:
+        config, result = min(feasible, key=lambda cf: (cf[1]['requests_per_hour'], cf[0].workers))
+        return config, result, True
+    config, result = min(results, key=lambda cf: cf[1]['p90'])
+    return config, result, False
+
+
+def format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}小时{rest // 60:02d}分" if hours else f"{rest // 60}分{rest % 60:02d}秒"
+
+
+def print_forecast(n_articles, config, model=None, deadline_hours=None, runs=1000):
+    """打印预测结果（以及可选的推荐配置）"""
+    model = model or CostModel.from_journals()
+    result = forecast(n_articles, config, model, runs)
+    print(f"   - 成本模型: {model.describe()}")
+    print(f"   - 配置: {config.describe()}")
+    print(f"   - 预计耗时: {format_duration(result['p50'])} "
+          f"(80%区间 {format_duration(result['p10'])} - {format_duration(result['p90'])})")
+    print(f"   - 预计完成: {result['p50_at']:%m-%d %H:%M} "
+          f"(最晚 {result['p90_at']:%m-%d %H:%M})")
+
+    if deadline_hours:
+        best, best_result, ok = recommend(n_articles, deadline_hours, model)
+        if ok:
+            print(f"   - 推荐配置（{deadline_hours:g} 小时内完成，请求最少）: {best.describe()}, "
+                  f"P90 {format_duration(best_result['p90'])}, "
+                  f"约 {best_result['requests_per_hour']:.0f} 篇/小时")
+        else:
+            print(f"   - 没有配置能在 {deadline_hours:g} 小时内完成（P90），最快的是: "
+                  f"{best.describe()}, P90 {format_duration(best_result['p90'])}")
+    return result
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="预测抓取完成时间并推荐配置")
+    parser.add_argument('--articles', type=int,
+                        help="文章数（默认为队列中待处理的任务数）")
+    parser.add_argument('--workers', type=int, default=1, help="worker数")
+    parser.add_argument('--interval', type=float,
+                        help="全局请求间隔（秒）；不指定时按单浏览器批量模式预测")
+    parser.add_argument('--batch-size', type=int, default=5, help="批量模式每批篇数")
+    parser.add_argument('--deadline', type=float, help="希望在多少小时内完成，给出推荐配置")
+    parser.add_argument('--runs', type=int, default=1000, help="模拟次数")
+    args = parser.parse_args()
+
+    n_articles = args.articles
+    if n_articles is None:
+        from work_queue import WorkQueue
+        queue = WorkQueue()
+        try:
+            n_articles = queue.stats().get('pending', 0)
+        finally:
+            queue.close()
+    if not n_articles:
+        print("没有待处理的文章")
+        return
+
+    config = PlanConfig(workers=args.workers, interval=args.interval,
+                        batch_size=args.batch_size)
+    print(f"📐 抓取计划: {n_articles} 篇文章")
+    print_forecast(n_articles, config, deadline_hours=args.deadline, runs=args.runs)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
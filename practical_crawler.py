@@ -4,40 +4,57 @@
 实用的反爬虫解决方案 - 基于Selenium的强化版本
 """
 
-import json
 import time
 import random
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime
 import logging
-from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
-from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
+from assets import AssetWorker, image_sources
+from cassette import pause, replaying, start_browser
+from browser_profile import (ProfileStats, apply_lean_options,
+                             enable_resource_blocking, lean_headless)
+from completeness import extracted_length, is_complete
+from coverage_index import note_article
+from driver_health import DriverHealth
+from log_setup import log_context, log_event, setup_logging
+from negative_cache import article_reason, note_fetch_outcome
+from retry_policy import (OK, PARSE, CircuitBreaker, RetryPolicy, classify_exception,
+                          classify_page, classify_parsed)
+from schema import (ArticleContent, ArticleRecord, SchemaError, load_record,
+                    meta_from_dict, save_record)
 
 # 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('practical_crawler.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('practical_crawler.log')
 logger = logging.getLogger(__name__)
 
 
 class PracticalCrawler:
-    def __init__(self):
+    def __init__(self, lean=False, rate_limiter=None, download_assets=True):
         self.base_url = "https://rmydb.cnii.com.cn/html"
+        # 多进程worker共享的全局速率预算（work_queue.RateBudget），为None时使用本地随机延迟
+        self.rate_limiter = rate_limiter
+        # 精简模式：eager加载 + 屏蔽图片/媒体/字体（CRAWL_HEADLESS=1 时无头）
+        self.lean = lean
+        self.profile_stats = ProfileStats()
+        # 失败分类与重试等待；熔断器状态在所有worker进程间共享
+        self.retry_policy = RetryPolicy()
+        self.circuit = CircuitBreaker()
+        self.last_outcome = None
         self.setup_driver()
         self.request_count = 0
-        self.max_requests_per_session = 15  # 每个会话最多请求数
+        # 浏览器健康状况，决定何时重启会话
+        self.health = DriverHealth()
+        # 各阶段累计耗时（秒），写入断点日志供 planner 建立成本模型
+        self.timings = defaultdict(float)
+        # 正文图片在后台并发下载，不占用文章之间的节奏等待
+        self.assets = AssetWorker() if download_assets else None
 
     def setup_driver(self):
         """设置Chrome WebDriver with anti-detection"""
@@ -48,7 +65,8 @@ class PracticalCrawler:
             chrome_options.add_argument('--no-sandbox')
             chrome_options.add_argument('--disable-dev-shm-usage')
             chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
+            if not (self.lean and lean_headless()):
+                chrome_options.add_argument('--window-size=1920,1080')
             chrome_options.add_argument(
                 '--disable-blink-features=AutomationControlled')
             chrome_options.add_experimental_option(
@@ -66,14 +84,20 @@ class PracticalCrawler:
             chrome_options.add_argument(
                 f'--user-agent={random.choice(user_agents)}')
 
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(
-                service=service, options=chrome_options)
+            if self.lean:
+                apply_lean_options(chrome_options)
+
+            # chromedriver 路径只解析一次，浏览器重启时直接使用本地缓存；
+            # 启用录像时录制页面，回放时不启动浏览器
+            self.driver = start_browser(chrome_options)
 
             # 执行反检测脚本
             self.driver.execute_script(
                 "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
+            if self.lean:
+                enable_resource_blocking(self.driver)
+
             self.driver.set_page_load_timeout(60)
             logger.info("Chrome WebDriver 初始化成功")
         except Exception as e:
@@ -84,13 +108,23 @@ class PracticalCrawler:
         """智能延迟策略 - 基于Selenium的增强版"""
         self.request_count += 1
 
-        if self.request_count > self.max_requests_per_session:
+        # 内存、加载耗时或错误率恶化时重启浏览器
+        recycle, reason = self.health.should_recycle()
+        if recycle:
             # 重新创建浏览器会话
-            logger.info("达到最大请求数，重新创建浏览器会话")
+            logger.info(f"重新创建浏览器会话: {reason}")
+            recycle_start = time.time()
             self.driver.quit()
-            time.sleep(random.uniform(120, 180))  # 长时间休息 2-3分钟
+            pause(random.uniform(120, 180))  # 长时间休息 2-3分钟
             self.setup_driver()
+            self.health.reset()
             self.request_count = 0
+            self.timings['recycle'] += time.time() - recycle_start
+
+        if self.rate_limiter is not None and not replaying():
+            # 由全局速率预算统一调度所有worker的请求间隔
+            self.timings['pacing'] += self.rate_limiter.acquire()
+            return
 
         # 根据请求数量动态调整延迟
         if self.request_count < 8:
@@ -101,7 +135,8 @@ class PracticalCrawler:
             delay = random.uniform(80, 120)  # 80-120秒的随机值
 
         logger.info(f"等待 {delay:.1f} 秒 (请求数: {self.request_count})")
-        time.sleep(delay)
+        pause(delay)
+        self.timings['pacing'] += delay
 
     def build_article_url(self, date_str, page_no, article_href):
         """构建文章URL"""
@@ -110,55 +145,101 @@ class PracticalCrawler:
         url = f"{self.base_url}/{year}/{date_str}/{page_dir}/{article_href}"
         return url
 
+    def fetch_page_source(self, url, retry=0):
+        """访问一次页面，返回 (页面HTML, 结果分类)；是否重试由调用方决定"""
+        max_retries = self.retry_policy.max_attempts
+
+        # 站点熔断期间在这里等待，恢复前只有一个探测请求
+        wait_start = time.time()
+        if not replaying():
+            # 回放时录像中的限流响应原样返回，不按实际时间等待熔断
+            self.circuit.wait(url)
+        self.timings['circuit'] += time.time() - wait_start
+        try:
+            logger.info(f"正在访问: {url} (尝试 {retry + 1}/{max_retries})")
+
+            # 智能延迟
+            self.smart_delay()
+
+            # 访问页面
+            load_start = time.time()
+            self.driver.get(url)
+            load_seconds = time.time() - load_start
+            if self.lean:
+                self.profile_stats.record_page(self.driver, load_seconds)
+
+            # 等待页面加载
+            pause(random.uniform(8, 15))
+
+            # 检查是否被重定向或返回错误页面
+            current_url = self.driver.current_url
+            if current_url != url:
+                logger.warning(f"页面被重定向: {current_url}")
+
+            # 获取页面HTML
+            html_content = self.driver.page_source
+            self.timings['load'] += time.time() - load_start
+
+            # 根据标题和页面开头判断错误类型
+            outcome = classify_page(self.driver.title, html_content)
+            self.health.record(self.driver, load_seconds)
+            if outcome != OK:
+                logger.warning(f"页面内容包含错误信息: {outcome}")
+            log_event(logger, f"页面加载完成: {load_seconds:.1f} 秒", stage='fetch',
+                      outcome=outcome, seconds=load_seconds)
+            return html_content, outcome
+
+        except TimeoutException as e:
+            outcome = classify_exception(e)
+            log_event(logger, f"页面加载超时 (尝试 {retry + 1}/{max_retries})", stage='fetch',
+                      outcome=outcome, level=logging.WARNING)
+            self.health.record(self.driver, error=True)
+            return None, outcome
+        except Exception as e:
+            logger.error(f"获取文章内容失败 (尝试 {retry + 1}/{max_retries}): {e}")
+            # 只有浏览器异常计入错误率，页面加载后的其他错误不是浏览器的问题
+            if isinstance(e, WebDriverException):
+                self.health.record(self.driver, error=True)
+            return None, classify_exception(e)
+
+    def should_retry(self, url, outcome, retry):
+        """记录本次结果（熔断器）并按失败类型等待，返回是否需要重试"""
+        self.last_outcome = outcome
+        if outcome == OK:
+            self.circuit.success(url)
+            return False
+
+        tripped = self.circuit.failure(url, outcome)
+        delay = self.retry_policy.delay(outcome, retry)
+        if delay is None:
+            return False
+        if not tripped:
+            # 熔断时由 circuit.wait 负责等待
+            logger.info(f"{outcome} 失败，等待 {delay:.0f} 秒后重试...")
+            pause(delay)
+            self.timings['retry_wait'] += delay
+        return True
+
     def fetch_article_content(self, url):
-        """获取文章内容 - 基于Selenium的增强版"""
-        max_retries = 3
+        """获取文章内容 - 按失败类型决定是否重试"""
+        parsed = None
+
+        for retry in range(self.retry_policy.max_attempts):
+            html_content, outcome = self.fetch_page_source(url, retry)
+            if outcome == OK:
+                parsed = self.parse_html_content(html_content)
+                outcome = classify_parsed(parsed)
+            if not self.should_retry(url, outcome, retry):
+                break
 
-        for retry in range(max_retries):
-            try:
-                logger.info(f"正在访问: {url} (尝试 {retry + 1}/{max_retries})")
-
-                # 智能延迟
-                self.smart_delay()
-
-                # 访问页面
-                self.driver.get(url)
-
-                # 等待页面加载
-                time.sleep(random.uniform(8, 15))
-
-                # 检查是否被重定向或返回错误页面
-                current_url = self.driver.current_url
-                if current_url != url:
-                    logger.warning(f"页面被重定向: {current_url}")
-
-                # 获取页面HTML
-                html_content = self.driver.page_source
-
-                # 检查HTML内容是否包含错误信息
-                if any(error in html_content.lower() for error in ['403 forbidden', '404 not found', '500 internal server error', '491 forbidden']):
-                    logger.warning("页面内容包含错误信息")
-                    if retry < max_retries - 1:
-                        logger.info("等待后重试...")
-                        time.sleep(random.uniform(60, 120))
-                        continue
-
-                # 解析HTML
-                return self.parse_html_content(html_content)
-
-            except TimeoutException:
-                logger.warning(f"页面加载超时 (尝试 {retry + 1}/{max_retries})")
-                if retry < max_retries - 1:
-                    time.sleep(random.uniform(30, 60))
-            except Exception as e:
-                logger.error(f"获取文章内容失败 (尝试 {retry + 1}/{max_retries}): {e}")
-                if retry < max_retries - 1:
-                    time.sleep(random.uniform(20, 40))
-
-        logger.error(f"所有重试都失败了: {url}")
+        if outcome == OK or outcome == PARSE:
+            # PARSE: 页面正常但正文为空，交给调用方判断是否保存
+            return parsed
+        logger.error(f"放弃抓取 ({outcome}): {url}")
         return None
 
-    def parse_html_content(self, html_content):
+    @staticmethod
+    def parse_html_content(html_content):
         """解析HTML内容 - 增强版"""
         soup = BeautifulSoup(html_content, 'html.parser')
 
@@ -166,7 +247,8 @@ class PracticalCrawler:
             'title': None,
             'content': None,
             'publish_date': None,
-            'author': None
+            'author': None,
+            'images': []
         }
 
         # 提取标题
@@ -184,6 +266,8 @@ class PracticalCrawler:
             # 移除script和style标签
             for script in ozoom_div(["script", "style"]):
                 script.decompose()
+            # 正文中的图片地址，由 assets.AssetWorker 在后台下载
+            result['images'] = image_sources(ozoom_div)
 
             # 提取所有段落文本
             paragraphs = ozoom_div.find_all('p')
@@ -244,8 +328,23 @@ class PracticalCrawler:
         return result
 
     def fix_single_article(self, date_str, page_no, metadata):
-        """修复单个文章 - 基于Selenium的增强版"""
-        article_href = metadata.get('articleHref')
+        """修复单个文章 - 基于Selenium的增强版（metadata 为 schema.ArticleMeta）
+
+        这篇文章期间的日志都带上日期和链接，结束时记录一条包含耗时和结果的日志
+        """
+        with log_context(date=date_str, href=metadata.article_href):
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                success = self._fix_single_article(date_str, page_no, metadata)
+                outcome = 'success' if success else 'failed'
+                return success
+            finally:
+                log_event(logger, f"文章处理结束: {outcome}", stage='article', outcome=outcome,
+                          seconds=time.perf_counter() - started)
+
+    def _fix_single_article(self, date_str, page_no, metadata):
+        article_href = metadata.article_href
         if not article_href:
             return False
 
@@ -260,50 +359,57 @@ class PracticalCrawler:
         file_name = article_href.replace('.html', '.json')
         file_path = date_dir / file_name
 
-        # 如果文件已存在且内容不是错误的，跳过
+        # 如果文件已存在且内容完整（与 wordNumber 相比不过短），跳过
         if file_path.exists():
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-                    existing_content = existing_data.get('content', {})
-                    if (existing_content.get('content') != '无内容' and
-                        existing_content.get('title') != '491 Forbidden' and
-                        existing_content.get('content') and
-                            len(existing_content.get('content', '')) > 50):
-                        logger.info(f"文章已存在且有效，跳过: {file_path}")
-                        return True
-            except:
+                existing = load_record(file_path)
+                if is_complete(existing.content, existing.metadata):
+                    logger.info(f"文章已存在且有效，跳过: {file_path}")
+                    return True
+            except (OSError, SchemaError):
                 pass
 
+        # 已知无法获取的文章（404、无正文的图片稿）不再请求
+        reason = article_reason(date_str, article_href)
+        if reason:
+            logger.info(f"文章在负缓存中 ({reason})，跳过: {file_path}")
+            return False
+
         # 获取文章内容
-        main_title = metadata.get('mainTitle', '未知标题')
+        main_title = metadata.main_title or '未知标题'
         logger.info(f"修复文章: {main_title}")
 
-        content = self.fetch_article_content(url)
+        parsed = self.fetch_article_content(url)
+        note_fetch_outcome(date_str, metadata, self.last_outcome, url)
 
-        if content is None:
+        if parsed is None:
             logger.error(f"无法获取文章内容: {url}")
             return False
 
-        # 检查内容质量
-        if (content.get('title') == '491 Forbidden' or
-            content.get('content') == '无内容' or
-                len(content.get('content', '')) < 5):
+        content = ArticleContent(**parsed)
+
+        # 检查内容质量：错误页面和空正文不保存
+        if extracted_length(content) == 0:
             logger.warning(f"获取的内容质量不佳: {content}")
             return False
+        if not is_complete(content, metadata):
+            logger.warning(f"正文长度 {extracted_length(content)} 明显少于发布字数 "
+                           f"{metadata.word_number}，仍保存，之后会再次重抓")
 
         # 保存文章数据
-        article_data = {
-            'metadata': metadata,
-            'content': content,
-            'crawl_time': datetime.now().isoformat(),
-            'source_url': url
-        }
+        record = ArticleRecord(
+            metadata=metadata,
+            content=content,
+            crawl_time=datetime.now().isoformat(),
+            source_url=url
+        )
 
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(article_data, f, ensure_ascii=False, indent=2)
-            logger.info(f"文章已保存: {file_path}")
+            save_record(file_path, record)
+            note_article(date_str, record)
+            log_event(logger, f"文章已保存: {file_path}", stage='write', outcome='saved')
+            if self.assets:
+                self.assets.submit(file_path, record)
             return True
         except Exception as e:
             logger.error(f"保存文章失败: {e}")
@@ -312,8 +418,13 @@ class PracticalCrawler:
     def close(self):
         """关闭浏览器"""
         if hasattr(self, 'driver'):
+            if self.lean:
+                self.profile_stats.log_summary()
             self.driver.quit()
             logger.info("浏览器已关闭")
+        self.circuit.close()
+        if self.assets:
+            self.assets.close()
 
 
 def test_fix_one_article():
@@ -324,7 +435,7 @@ def test_fix_one_article():
     test_article = {
         'date': '20250520',
         'page_no': '001',
-        'metadata': {
+        'metadata': meta_from_dict({
             "wordNumber": 765,
             "picAuthor": "",
             "mainTitle": "4月信息传输、软件和信息技术服务业生产指数同比增长10.4％",
@@ -333,7 +444,7 @@ def test_fix_one_article():
             "articleColumn": "",
             "articleHref": "20250520_001_02_2642.html",
             "articleAuthor": "记者　苏德悦"
-        }
+        })
     }
 
     crawler = PracticalCrawler()
@@ -352,16 +463,14 @@ def test_fix_one_article():
             file_path = Path("articles") / \
                 test_article['date'] / "20250520_001_02_2642.json"
             if file_path.exists():
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    content = data.get('content', {})
-                    print(f"标题: {content.get('title', '无')}")
-                    print(f"内容长度: {len(content.get('content', ''))}")
-                    if content.get('content') and len(content.get('content', '')) > 100:
-                        print(f"内容预览: {content.get('content', '')[:200]}...")
-                        print("✓ 内容提取成功!")
-                    else:
-                        print("⚠ 内容可能仍有问题")
+                content = load_record(file_path).content
+                print(f"标题: {content.title or '无'}")
+                print(f"内容长度: {len(content.content or '')}")
+                if content.content and len(content.content) > 100:
+                    print(f"内容预览: {content.content[:200]}...")
+                    print("✓ 内容提取成功!")
+                else:
+                    print("⚠ 内容可能仍有问题")
         else:
             print("✗ 测试失败")
 
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章价值评分 - 抓取预算有限时优先修复头版、长文和近期文章
+评分只使用 data.json 中已有的元数据
+"""
+
+import math
+from datetime import datetime
+
+# 有栏目的文章（评论、专栏等）适当加权
+COLUMN_BONUS = 0.15
+# 图片新闻的价值折扣
+PICTURE_FACTOR = 0.3
+# 字数达到该值即视为满分
+FULL_WORD_NUMBER = 3000
+# 时效衰减的半衰期（天）
+RECENCY_HALF_LIFE_DAYS = 180
+
+
+def page_weight(page_no):
+    """版面权重：头版(001)为1，后续版面递减"""
+    try:
+        page = int(page_no)
+    except (TypeError, ValueError):
+        page = 1
+    return 1.0 / (1 + 0.5 * (max(page, 1) - 1))
+
+
+def is_picture_article(metadata):
+    """是否为图片新闻"""
+    return '（图片）' in metadata.main_title or bool(metadata.pic_author.strip())
+
+
+def article_value(metadata, page_no, date_str, today=None):
+    """文章本身的价值（0-1之间），与抓取历史无关（metadata 为 schema.ArticleMeta）"""
+    # 版面
+    value = 0.5 * page_weight(page_no)
+
+    # 字数
+    word_number = metadata.word_number
+    value += 0.3 * min(math.log1p(word_number) /
+                       math.log1p(FULL_WORD_NUMBER), 1.0)
+
+    # 栏目
+    if metadata.article_column.strip():
+        value += COLUMN_BONUS
+
+    # 时效
+    try:
+        age_days = ((today or datetime.now()) -
+                    datetime.strptime(date_str, "%Y%m%d")).days
+    except ValueError:
+        age_days = 0
+    value *= 0.5 + 0.5 * 0.5 ** (max(age_days, 0) / RECENCY_HALF_LIFE_DAYS)
+
+    if is_picture_article(metadata):
+        value *= PICTURE_FACTOR
+
+    return round(min(value, 1.0), 4)
+
@@ -5,186 +5,326 @@
 使用经过验证的反爬虫解决方案
 """
 
-import json
 import time
 import random
+import argparse
 from pathlib import Path
 from datetime import datetime
 import logging
 
+from log_setup import setup_logging
+
 # 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('production_fix.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('production_fix.log')
 logger = logging.getLogger(__name__)
 
-# 从practical_crawler导入核心功能
-from practical_crawler import PracticalCrawler
+from checkpoint import (JOURNAL_DIR, GracefulShutdown, RunJournal,
+                        remaining_items)
+from article_index import ArticleIndex
+from completeness import NOT_FETCHED, score_index
+from coverage_index import get_coverage
+from priority import article_value
+from negative_cache import dead_article_keys
+from planner import SMART_DELAY_TIERS, PlanConfig, print_forecast, stage_delta
+from work_queue import FAILED, LEASED, PENDING, WorkQueue, job_key
+
+JOURNAL_PATH = JOURNAL_DIR / "production_fix.jsonl"
 
 def get_problematic_articles():
-    """获取所有问题文章列表"""
+    """获取所有问题文章列表：已抓取、但正文相对自身 wordNumber 明显过短的文章（completeness）"""
     articles_dir = Path("articles")
     problematic = []
     
     print("正在扫描问题文章...")
+    # 已知无法获取的文章（404、无正文的图片稿）不再列为问题文章
+    dead_keys = dead_article_keys()
+    
+    index, _ = ArticleIndex.from_data_dir(
+        Path("data"),
+        on_error=lambda path, e: logger.error(f"读取数据文件失败 {path}: {e}"))
+    # 正文长度来自覆盖索引，整个索引一次评分，不再逐个读取文章文件
+    lengths, _, complete = score_index(index, get_coverage(refresh=True).article_lengths())
     
-    for date_dir in articles_dir.iterdir():
-        if not date_dir.is_dir():
+    for i in range(len(index)):
+        if lengths[i] == NOT_FETCHED or complete[i]:
             continue
-            
-        for article_file in date_dir.glob("*.json"):
-            try:
-                with open(article_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                content = data.get('content', {})
-                title = content.get('title', '')
-                article_content = content.get('content', '')
-                
-                # 检查是否是问题文章
-                is_problematic = (
-                    title == '491 Forbidden' or
-                    article_content == '无内容' or
-                    '491 Forbidden' in title or
-                    len(article_content) < 50
-                )
-                
-                if is_problematic:
-                    metadata = data.get('metadata', {})
-                    
-                    # 从文件名推断页码
-                    filename = article_file.stem
-                    parts = filename.split('_')
-                    page_no = parts[1] if len(parts) >= 3 else '001'
-                    
-                    problematic.append({
-                        'date': date_dir.name,
-                        'page_no': page_no,
-                        'metadata': metadata,
-                        'file_path': article_file,
-                        'title': metadata.get('mainTitle', '未知标题')[:50] + "..."
-                    })
-                    
-            except Exception as e:
-                logger.error(f"读取文件失败 {article_file}: {e}")
+        date_str = index.dates[i]
+        if job_key(date_str, index.hrefs[i]) in dead_keys:
+            continue
+        
+        metadata = index.ref(i).to_meta()
+        page_no = index.page_nos[i]
+        problematic.append({
+            'date': date_str,
+            'page_no': page_no,
+            'metadata': metadata,
+            'file_path': articles_dir / date_str / index.hrefs[i].replace('.html', '.json'),
+            'title': (metadata.main_title or '未知标题')[:50] + "...",
+            'value': article_value(metadata, page_no, date_str)
+        })
     
     return problematic
 
-def production_batch_fix():
-    """生产环境批量修复"""
+def _plan_item(key, date_str, page_no, metadata, value):
+    return {'key': key, 'date': date_str, 'page_no': page_no,
+            'title': metadata.main_title, 'value': value}
+
+
+def preview_plan(queue, problematic_articles, budget):
+    """不写入队列，按问题文章入队后的领取顺序（价值 / (1 + 历史尝试次数)）预览本次修复的文章"""
+    states = queue.job_states()
+    candidates = {}
+    for job in queue.pending_jobs(None):
+        candidates[job['job_key']] = (
+            job['value'] / (1 + job['attempts']),
+            _plan_item(job['job_key'], job['date'], job['page_no'], job['metadata'], job['value']))
+    for article in problematic_articles:
+        key = job_key(article['date'], article['metadata'].article_href)
+        status, attempts = states.get(key, (PENDING, 0))
+        # 与 WorkQueue.enqueue 一致：处理中和已失败的任务不会重新入队
+        if status in (LEASED, FAILED):
+            continue
+        candidates[key] = (
+            article['value'] / (1 + attempts),
+            _plan_item(key, article['date'], article['page_no'], article['metadata'],
+                       article['value']))
+    ordered = sorted(candidates.values(), key=lambda candidate: -candidate[0])
+    return [item for _, item in ordered[:budget]]
+
+
+def production_batch_fix(budget=50, resume=False, assume_yes=False,
+                         plan_only=False, deadline_hours=None):
+    """生产环境批量修复 - 按文章价值从高到低，每次最多修复 budget 篇
+
+    resume=True 时从断点日志继续上次中断的运行，不重新扫描；
+    assume_yes=True 时不做任何交互确认，连续失败时自动暂停后继续；
+    plan_only=True 时只显示预计完成时间（和 deadline_hours 对应的推荐配置），不开始修复
+    """
     print("="*60)
     print("人民邮电报爬虫 - 生产环境批量修复工具")
     print("="*60)
     
-    # 获取问题文章
-    problematic_articles = get_problematic_articles()
+    queue = WorkQueue()
+    journal = None
     
-    if not problematic_articles:
-        print("🎉 没有发现问题文章！所有文章都已成功爬取。")
+    if resume:
+        journal, state = RunJournal.resume(JOURNAL_PATH)
+        if journal is None:
+            print("没有可恢复的运行（上次运行已完成或没有断点日志）")
+            queue.close()
+            return
+        plan = remaining_items(state)
+        print(f"\\n♻️ 恢复运行 {journal.run_id}: 已完成 {len(state['outcomes'])} 篇，剩余 {len(plan)} 篇")
+        if state['in_flight']:
+            print(f"   中断时正在处理: {state['in_flight']}（将重新处理）")
+    else:
+        # 获取问题文章
+        problematic_articles = get_problematic_articles()
+        
+        if not problematic_articles:
+            print("🎉 没有发现问题文章！所有文章都已成功爬取。")
+            queue.close()
+            return
+        
+        if plan_only:
+            # 只预览，不写入持久化队列
+            plan = preview_plan(queue, problematic_articles, budget)
+        else:
+            # 加入抓取队列，队列按 价值 / (1 + 历史尝试次数) 排序
+            for article in problematic_articles:
+                queue.enqueue(article['date'], article['page_no'],
+                              article['metadata'], article['value'])
+            plan = [_plan_item(job['job_key'], job['date'], job['page_no'],
+                               job['metadata'], job['value'])
+                    for job in queue.pending_jobs(budget)]
+        
+        total_problematic = len(problematic_articles)
+        print(f"\\n📊 发现 {total_problematic} 篇问题文章，本次按价值修复前 {len(plan)} 篇")
+    
+    if not plan:
+        print("🎉 没有需要处理的文章")
+        if journal:
+            journal.end('finished')
+            journal.close()
+        queue.close()
         return
     
-    total_articles = len(problematic_articles)
-    print(f"\\n📊 发现 {total_articles} 篇问题文章需要修复")
+    total_articles = len(plan)
     
-    # 显示前10篇文章
-    print("\\n📋 前10篇问题文章:")
-    for i, article in enumerate(problematic_articles[:10], 1):
-        print(f"{i:2d}. {article['date']}: {article['title']}")
+    # 显示优先级最高的10篇文章
+    print("\\n📋 优先级最高的10篇问题文章:")
+    for i, item in enumerate(plan[:10], 1):
+        title = (item['title'] or '未知标题')[:50]
+        print(f"{i:2d}. {item['date']} 第{item['page_no']}版: {title} (价值 {item['value']:.2f})")
     
     if total_articles > 10:
         print(f"    ... 还有 {total_articles - 10} 篇")
     
-    # 设置批次大小
-    batch_size = 5
+    # 节奏配置：下面的修复循环和完成时间预测使用同一份配置
+    config = PlanConfig(batch_size=5)
+    batch_size = config.batch_size
+    delay_low = min(low for _, (low, _) in SMART_DELAY_TIERS)
+    delay_high = max(high for _, (_, high) in SMART_DELAY_TIERS)
     print(f"\\n⚙️ 配置:")
     print(f"   - 批次大小: {batch_size} 篇/批次")
-    print(f"   - 文章间延迟: 60秒 (1分钟)")
-    print(f"   - 批次间延迟: 120-240秒 (2-4分钟)")
-    print(f"   - 预计总时间: {total_articles * 60 / 60:.0f}-{total_articles * 80 / 60:.0f} 分钟")
+    print(f"   - 文章间延迟: {delay_low}-{delay_high}秒 (随请求数分档增加)")
+    print(f"   - 批次间延迟: {config.batch_rest[0]}-{config.batch_rest[1]}秒")
+    print(f"   - 连续失败 {config.fail_streak} 次后暂停: "
+          f"{config.streak_pause[0] // 60}-{config.streak_pause[1] // 60}分钟")
+    # 根据历史运行的耗时和成功率模拟完成时间
+    print_forecast(total_articles, config, deadline_hours=deadline_hours)
+    
+    if plan_only:
+        if journal:
+            journal.close()
+        queue.close()
+        return
     
     # 确认执行
     print("\\n⚠️  注意事项:")
     print("   - 请确保网络连接稳定")
-    print("   - 过程中请勿关闭程序")
+    print("   - Ctrl+C 会在当前文章处理完后安全退出，之后可用 --resume 继续")
     print("   - 如遇到连续失败，程序会自动暂停")
     
-    response = input(f"\\n🚀 是否开始修复？(y/n): ")
+    response = 'y' if assume_yes else input(f"\\n🚀 是否开始修复？(y/n): ")
     if response.lower() != 'y':
         print("❌ 操作已取消")
+        if journal:
+            journal.close()
+        queue.close()
         return
     
+    if journal is None:
+        journal = RunJournal(JOURNAL_PATH)
+        journal.plan(plan)
+    
     # 开始修复
     print(f"\\n🔧 开始批量修复 ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})")
+    print(f"📝 断点日志: {JOURNAL_PATH} (运行 {journal.run_id})")
     print("-" * 60)
     
+    # 从practical_crawler导入核心功能（扫描问题文章时不需要加载 Selenium）
+    from practical_crawler import PracticalCrawler
     crawler = PracticalCrawler()
+    worker_id = f"production-{journal.run_id}"
     success_count = 0
     fail_count = 0
     consecutive_fails = 0
+    stopped = False
+    i = 0
     
-    for i, article in enumerate(problematic_articles, 1):
-        print(f"\\n[{i}/{total_articles}] 修复文章:")
-        print(f"📅 日期: {article['date']}")
-        print(f"📰 标题: {article['title']}")
-        
-        try:
-            success = crawler.fix_single_article(
-                article['date'],
-                article['page_no'],
-                article['metadata']
-            )
+    # 第二次Ctrl+C（KeyboardInterrupt）或意外异常时也要关闭浏览器和断点日志
+    completed = False
+    try:
+        with GracefulShutdown() as shutdown:
+            for item in plan:
+                if shutdown.requested:
+                    stopped = True
+                    break
+            
+                key = item['key']
+                job = queue.lease_key(key, worker_id)
+                if job is None:
+                    # 已被其他worker领取或完成
+                    journal.outcome(key, 'skipped')
+                    continue
             
-            if success:
-                success_count += 1
-                consecutive_fails = 0
-                print(f"✅ 修复成功 (成功率: {success_count}/{i} = {success_count/i*100:.1f}%)")
-            else:
-                fail_count += 1
-                consecutive_fails += 1
-                print(f"❌ 修复失败 (连续失败: {consecutive_fails})")
+                i += 1
+                print(f"\\n[{i}/{total_articles}] 修复文章:")
+                print(f"📅 日期: {job['date']}")
+                print(f"📰 标题: {(job['metadata'].main_title or '未知标题')[:50]}...")
+                print(f"⭐ 价值: {job['value']:.2f} (第 {job['attempts']} 次尝试)")
+            
+                journal.attempt(key)
+                started = time.time()
+                timings = dict(crawler.timings)
+                try:
+                    success = crawler.fix_single_article(
+                        job['date'],
+                        job['page_no'],
+                        job['metadata']
+                    )
                 
-                # 连续失败保护
-                if consecutive_fails >= 3:
-                    print("\\n⚠️ 连续3次失败，可能遇到更严格的反爬虫机制")
-                    print("建议：")
-                    print("1. 暂停30-60分钟后再次尝试")
-                    print("2. 或者增加延迟时间")
-                    
-                    choice = input("是否继续？(y/n): ")
-                    if choice.lower() != 'y':
-                        break
-                    consecutive_fails = 0
+                    if success:
+                        queue.complete(key, worker_id)
+                        journal.outcome(key, 'success', time.time() - started,
+                                        stages=stage_delta(timings, crawler.timings))
+                        success_count += 1
+                        consecutive_fails = 0
+                        print(f"✅ 修复成功 (成功率: {success_count}/{i} = {success_count/i*100:.1f}%)")
+                    else:
+                        queue.fail(key, worker_id, '修复失败')
+                        journal.outcome(key, 'failed', time.time() - started,
+                                        stages=stage_delta(timings, crawler.timings))
+                        fail_count += 1
+                        consecutive_fails += 1
+                        print(f"❌ 修复失败 (连续失败: {consecutive_fails})")
                     
-        except Exception as e:
-            fail_count += 1
-            consecutive_fails += 1
-            print(f"❌ 修复出错: {e}")
-            logger.error(f"修复文章出错: {e}")
-        
-        # 进度报告
-        if i % batch_size == 0 and i < total_articles:
-            print(f"\\n📊 批次完成: {i}/{total_articles}")
-            print(f"📈 当前成功率: {success_count}/{i} = {success_count/i*100:.1f}%")
+                        # 连续失败保护
+                        if consecutive_fails >= config.fail_streak:
+                            print(f"\\n⚠️ 连续{consecutive_fails}次失败，可能遇到更严格的反爬虫机制")
+                            print("建议：")
+                            print(f"1. 暂停{config.streak_pause[0] // 60}-{config.streak_pause[1] // 60}分钟后再次尝试")
+                            print("2. 或者增加延迟时间")
+                        
+                            if assume_yes:
+                                pause = random.uniform(*config.streak_pause)
+                                print(f"⏳ 非交互模式：暂停 {pause / 60:.0f} 分钟后继续")
+                                if not shutdown.sleep(pause):
+                                    stopped = True
+                                    break
+                            else:
+                                choice = input("是否继续？(y/n): ")
+                                if choice.lower() != 'y':
+                                    stopped = True
+                                    break
+                            consecutive_fails = 0
+                        
+                except Exception as e:
+                    queue.fail(key, worker_id, str(e))
+                    journal.outcome(key, 'error', time.time() - started, str(e),
+                                    stages=stage_delta(timings, crawler.timings))
+                    fail_count += 1
+                    consecutive_fails += 1
+                    print(f"❌ 修复出错: {e}")
+                    logger.error(f"修复文章出错: {e}")
             
-            # 批次间更长延迟
-            batch_delay = random.uniform(60, 120)
-            print(f"⏳ 批次间休息 {batch_delay:.0f}s...")
-            time.sleep(batch_delay)
+                # 进度报告
+                if i % batch_size == 0 and i < total_articles:
+                    print(f"\\n📊 批次完成: {i}/{total_articles}")
+                    print(f"📈 当前成功率: {success_count}/{i} = {success_count/i*100:.1f}%")
+                
+                    # 批次间更长延迟
+                    batch_delay = random.uniform(*config.batch_rest)
+                    print(f"⏳ 批次间休息 {batch_delay:.0f}s...")
+                    shutdown.sleep(batch_delay)
+        
+            stopped = stopped or shutdown.requested
+    
+        completed = True
+    finally:
+        crawler.close()
+        journal.end('finished' if completed and not stopped else 'interrupted')
+        journal.close()
+        if not completed:
+            queue.close()
     
     # 最终报告
     print("\\n" + "="*60)
-    print("🏁 批量修复完成")
+    print("⏸️ 批量修复已中断，可使用 --resume 继续" if stopped else "🏁 批量修复完成")
     print("="*60)
     print(f"📊 总体统计:")
     print(f"   - 处理文章: {i}")
     print(f"   - 修复成功: {success_count}")
     print(f"   - 修复失败: {fail_count}")
-    print(f"   - 成功率: {success_count/i*100:.1f}%")
+    print(f"   - 成功率: {success_count/i*100 if i else 0:.1f}%")
+
+    # 按价值加权的覆盖率
+    done_value, total_value, done_count, total_count = queue.value_coverage()
+    queue.close()
+    print(f"   - 队列完成度: {done_count}/{total_count} 篇")
+    print(f"   - 价值加权覆盖率: {done_value:.1f}/{total_value:.1f} = "
+          f"{done_value / total_value * 100 if total_value else 100:.1f}%")
     
     if success_count > 0:
         print(f"\\n✅ 建议下一步:")
@@ -195,5 +335,23 @@ def production_batch_fix():
     print(f"\\n📝 详细日志已保存到: production_fix.log")
     print(f"🕐 完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="生产环境批量修复")
+    parser.add_argument('--budget', type=int, default=50,
+                        help="本次最多修复的文章数")
+    parser.add_argument('--resume', action='store_true',
+                        help="从断点日志继续上次中断的运行")
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help="非交互模式，不询问确认")
+    parser.add_argument('--plan', action='store_true',
+                        help="只显示预计完成时间，不开始修复")
+    parser.add_argument('--deadline', type=float,
+                        help="希望在多少小时内完成，显示推荐的节奏配置")
+    args = parser.parse_args()
+    production_batch_fix(budget=args.budget, resume=args.resume,
+                         assume_yes=args.yes, plan_only=args.plan,
+                         deadline_hours=args.deadline)
+
 if __name__ == "__main__":
-    production_batch_fix()
+    main()
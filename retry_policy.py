@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抓取失败分类与按站点的熔断器
+失败分为永久（404）、限流（491/403）、临时（超时、5xx）和解析失败四类，只对可能成功的失败重试；
+站点被限流时熔断器打开，所有worker暂停，到期后只放一个探测请求，成功才恢复
+"""
+
+import os
+import time
+import random
+import socket
+import logging
+from urllib.parse import urlparse
+
+from work_queue import STATE_DIR, connect
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CIRCUIT_DB = STATE_DIR / "circuit.db"
+
+# 抓取结果分类
+OK = 'ok'
+PERMANENT = 'permanent'   # 页面不存在，重试无意义
+THROTTLED = 'throttled'   # 被反爬限流，需要整个站点暂停
+TRANSIENT = 'transient'   # 超时、服务器错误等，退避后重试
+PARSE = 'parse'           # 页面正常但未解析出正文
+
+# 熔断器状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+THROTTLE_MARKERS = ('491 forbidden', '403 forbidden', 'access denied')
+PERMANENT_MARKERS = ('404 not found', '410 gone')
+TRANSIENT_MARKERS = ('500 internal server error', '502 bad gateway',
+                     '503 service unavailable', '504 gateway time-out',
+                     '504 gateway timeout')
+
+# 错误页面的标记出现在标题和开头部分，只检查这一段，避免正文中引用的文字被误判
+PAGE_HEAD_CHARS = 4096
+
+
+def classify_page(page_title, html_content):
+    """根据页面标题和HTML开头判断是否为错误页面"""
+    head = f"{page_title or ''}\n{html_content[:PAGE_HEAD_CHARS]}".lower()
+    if any(marker in head for marker in THROTTLE_MARKERS):
+        return THROTTLED
+    if any(marker in head for marker in PERMANENT_MARKERS):
+        return PERMANENT
+    if any(marker in head for marker in TRANSIENT_MARKERS):
+        return TRANSIENT
+    return OK
+
+
+def classify_parsed(parsed):
+    """检查解析结果（title/content 字典）"""
+    if '491 Forbidden' in (parsed.get('title') or ''):
+        return THROTTLED
+    content = parsed.get('content')
+    if not content or content == '无内容':
+        return PARSE
+    return OK
+
+
+def classify_exception(error):
+    """浏览器异常（超时、连接中断、会话崩溃）都视为临时失败"""
+    return TRANSIENT
+
+
+def host_of(url):
+    return urlparse(url).netloc
+
+
+class RetryPolicy:
+    """每类失败的重试次数和等待时间"""
+
+    def __init__(self, max_attempts=3, transient_base=20.0, transient_cap=300.0,
+                 parse_retries=1):
+        self.max_attempts = max_attempts
+        self.transient_base = transient_base
+        self.transient_cap = transient_cap
+        self.parse_retries = parse_retries
+
+    def delay(self, outcome, attempt):
+        """第 attempt 次（从0开始）失败后的等待秒数；返回 None 表示不再重试"""
+        if outcome == PERMANENT or attempt >= self.max_attempts - 1:
+            return None
+        if outcome == PARSE:
+            # 页面可能未加载完整，短暂等待后再试一次
+            if attempt >= self.parse_retries:
+                return None
+            return random.uniform(10, 20)
+        if outcome == THROTTLED:
+            return random.uniform(60, 120)
+        # 临时失败：带抖动的指数退避
+        return min(self.transient_base * (2 ** attempt), self.transient_cap) * \
+            random.uniform(0.8, 1.2)
+
+
+class CircuitBreaker:
+    """按站点的熔断器，状态保存在SQLite中，所有worker进程共享"""
+
+    def __init__(self, db_path=DEFAULT_CIRCUIT_DB, failure_threshold=2,
+                 open_seconds=1800, max_open_seconds=4 * 3600,
+                 canary_timeout=600, check_same_thread=True):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.canary_timeout = canary_timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.conn = connect(db_path, check_same_thread=check_same_thread)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS breakers (
+                host TEXT PRIMARY KEY,
+                state TEXT NOT NULL DEFAULT 'closed',
+                failures INTEGER NOT NULL DEFAULT 0,
+                open_until REAL NOT NULL DEFAULT 0,
+                open_seconds REAL NOT NULL,
+                canary_owner TEXT,
+                canary_expires REAL NOT NULL DEFAULT 0
+            )
+        """)
+
+    def _row(self, host):
+        self.conn.execute(
+            "INSERT OR IGNORE INTO breakers (host, open_seconds) VALUES (?, ?)",
+            (host, self.open_seconds))
+        return self.conn.execute(
+            "SELECT * FROM breakers WHERE host = ?", (host,)).fetchone()
+
+    def _transaction(self, fn, *args):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(*args)
+            self.conn.execute("COMMIT")
+            return result
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _try_acquire(self, host):
+        """返回需要继续等待的秒数，0 表示可以发送请求"""
+        now = time.time()
+        row = self._row(host)
+
+        if row['state'] == CLOSED:
+            return 0
+
+        if row['state'] == OPEN:
+            if now < row['open_until']:
+                return row['open_until'] - now
+            # 封锁期结束，由本进程发送探测请求
+            self.conn.execute("""
+                UPDATE breakers SET state = 'half_open', canary_owner = ?, canary_expires = ?
+                WHERE host = ?
+            """, (self.owner, now + self.canary_timeout, host))
+            logger.info(f"{host} 封锁期结束，发送探测请求")
+            return 0
+
+        # 半开：只有探测者可以请求；探测者崩溃后由其他进程接手
+        if row['canary_owner'] == self.owner:
+            return 0
+        if now >= row['canary_expires']:
+            self.conn.execute("""
+                UPDATE breakers SET canary_owner = ?, canary_expires = ? WHERE host = ?
+            """, (self.owner, now + self.canary_timeout, host))
+            logger.info(f"{host} 探测请求超时，接手探测")
+            return 0
+        return min(30.0, row['canary_expires'] - now)
+
+    def wait(self, url):
+        """请求前调用：站点熔断期间阻塞等待"""
+        host = host_of(url)
+        while True:
+            remaining = self._transaction(self._try_acquire, host)
+            if remaining <= 0:
+                return
+            logger.warning(f"{host} 处于熔断状态，等待 {remaining / 60:.1f} 分钟")
+            time.sleep(min(remaining, 60.0))
+
+    def is_open(self, url):
+        """站点是否处于熔断或探测中（只读，不会接手探测；用于图片等附带请求）"""
+        row = self.conn.execute(
+            "SELECT state FROM breakers WHERE host = ?", (host_of(url),)).fetchone()
+        return row is not None and row['state'] != CLOSED
+
+    def _success(self, host):
+        row = self._row(host)
+        if row['state'] != CLOSED:
+            logger.info(f"{host} 探测成功，恢复抓取")
+        self.conn.execute("""
+            UPDATE breakers SET state = 'closed', failures = 0, open_seconds = ?,
+                canary_owner = NULL
+            WHERE host = ?
+        """, (self.open_seconds, host))
+
+    def success(self, url):
+        """请求成功"""
+        self._transaction(self._success, host_of(url))
+
+    def _failure(self, host, outcome):
+        row = self._row(host)
+        now = time.time()
+
+        if outcome in (PERMANENT, PARSE):
+            # 站点正常返回了页面，说明没有被限流
+            self._success(host)
+            return False
+
+        if outcome != THROTTLED:
+            # 临时失败不改变站点状态，但探测者需要释放探测权
+            if row['state'] == HALF_OPEN and row['canary_owner'] == self.owner:
+                self.conn.execute(
+                    "UPDATE breakers SET canary_expires = 0 WHERE host = ?", (host,))
+            return row['state'] == OPEN
+
+        if row['state'] == OPEN:
+            # 熔断前已发出的请求，不再延长封锁
+            return True
+        if row['state'] == HALF_OPEN:
+            if row['canary_owner'] != self.owner:
+                return True
+            # 探测失败：加倍封锁时间
+            open_seconds = min(row['open_seconds'] * 2, self.max_open_seconds)
+        elif row['failures'] + 1 >= self.failure_threshold:
+            open_seconds = row['open_seconds']
+        else:
+            self.conn.execute(
+                "UPDATE breakers SET failures = failures + 1 WHERE host = ?", (host,))
+            return False
+
+        self.conn.execute("""
+            UPDATE breakers SET state = 'open', failures = 0, open_until = ?,
+                open_seconds = ?, canary_owner = NULL
+            WHERE host = ?
+        """, (now + open_seconds, open_seconds, host))
+        logger.warning(f"{host} 被限流，熔断 {open_seconds / 60:.0f} 分钟")
+        return True
+
+    def failure(self, url, outcome):
+        """请求失败，返回站点是否已熔断（熔断时由 wait 负责等待，调用方无需再休眠）"""
+        return self._transaction(self._failure, host_of(url), outcome)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+data.json 版面和文章记录的类型定义
+使用 msgspec 在解码时完成校验，字段缺失或类型错误在读取时一次性报出，
+后续代码直接使用属性访问，不再逐个 .get() 检查
+"""
+
+import logging
+from typing import Optional
+
+import msgspec
+
+from storage import write_bytes
+
+logger = logging.getLogger(__name__)
+
+# 解码失败（非JSON或结构不符）时抛出的异常，ValidationError 是它的子类
+SchemaError = msgspec.DecodeError
+
+
+class ArticleMeta(msgspec.Struct, rename='camel', kw_only=True, dict=True):
+    """data.json 中的一篇文章（onePageArticleList 的元素）
+
+    本类没有定义的字段保存在 extra 中，编码时原样写回
+    """
+    main_title: str
+    article_issue_date: str
+    article_href: str
+    word_number: int = 0
+    pic_author: str = ''
+    issue_number: str = ''
+    article_column: str = ''
+    article_author: str = ''
+
+    @property
+    def extra(self):
+        """data.json 中未定义的字段 {驼峰字段名: 值}"""
+        return self.__dict__.get('_extra') or {}
+
+    @extra.setter
+    def extra(self, value):
+        self.__dict__['_extra'] = dict(value)
+
+
+class _ExactMeta(ArticleMeta, forbid_unknown_fields=True):
+    """解码快速路径：没有额外字段的文章；有额外字段或字段不合法时改为逐篇解码"""
+
+
+class Page(msgspec.Struct, rename='camel', kw_only=True):
+    """data.json 中的一个版面"""
+    page_no: str = '001'
+    one_page_article_list: list[ArticleMeta] = []
+    withdraw_list: list = []
+
+
+class _ExactPage(Page):
+    one_page_article_list: list[_ExactMeta] = []
+
+
+class _LoosePage(Page):
+    one_page_article_list: list = []
+
+
+class ArticleContent(msgspec.Struct, kw_only=True):
+    """从文章页面解析出的内容"""
+    title: Optional[str] = None
+    content: Optional[str] = None
+    publish_date: Optional[str] = None
+    author: Optional[str] = None
+    images: list[str] = []  # 正文（#ozoom）中的图片地址，保持页面中的原样
+
+
+class ArticleAsset(msgspec.Struct, kw_only=True):
+    """文章引用的一张图片；相同内容的图片只在 assets/ 中保存一份"""
+    url: str
+    sha256: str
+    path: str
+    size: int = 0
+    content_type: str = ''
+
+
+class ArticleRecord(msgspec.Struct, kw_only=True):
+    """articles/ 目录下保存的一篇文章"""
+    metadata: ArticleMeta
+    content: ArticleContent
+    crawl_time: str = ''
+    source_url: str = ''
+    assets: list[ArticleAsset] = []
+
+
+class _ExactRecord(ArticleRecord):
+    metadata: _ExactMeta
+
+
+class _LooseRecord(ArticleRecord):
+    metadata: dict
+
+
+_META_FIELDS = frozenset(field.encode_name for field in msgspec.structs.fields(ArticleMeta))
+_RECORD_FIELDS = tuple(field.name for field in msgspec.structs.fields(ArticleRecord))
+
+# strict=False 允许 "1750" 这类字符串数字转换为 int
+_issue_decoder = msgspec.json.Decoder(list[_ExactPage], strict=False)
+_loose_issue_decoder = msgspec.json.Decoder(list[_LoosePage], strict=False)
+_record_decoder = msgspec.json.Decoder(_ExactRecord, strict=False)
+_loose_record_decoder = msgspec.json.Decoder(_LooseRecord, strict=False)
+_meta_decoder = msgspec.json.Decoder(_ExactMeta, strict=False)
+_dict_decoder = msgspec.json.Decoder(dict)
+_encoder = msgspec.json.Encoder()
+
+
+def decode_issue(buf, source=None):
+    """解码一期的 data.json 内容，返回 Page 列表
+
+    不合法的文章跳过并记录日志，不影响同一期的其他文章；
+    只有非JSON或整体结构不符时才抛出 SchemaError。source 用于日志（文件名或日期）
+    """
+    try:
+        return _issue_decoder.decode(buf)
+    except msgspec.ValidationError:
+        pass
+
+    pages = []
+    for page in _loose_issue_decoder.decode(buf):
+        articles = []
+        for i, data in enumerate(page.one_page_article_list, 1):
+            try:
+                articles.append(meta_from_dict(data))
+            except msgspec.ValidationError as e:
+                logger.warning(f"跳过无效的文章 {source or ''} 第{page.page_no}版第{i}篇: {e}")
+        pages.append(Page(page_no=page.page_no, one_page_article_list=articles,
+                          withdraw_list=page.withdraw_list))
+    return pages
+
+
+def load_issue(path):
+    """读取并解码 data/YYYYMMDD_data.json"""
+    with open(path, 'rb') as f:
+        return decode_issue(f.read(), source=path)
+
+
+def iter_articles(pages):
+    """按版面顺序遍历 (页号, 文章元数据)"""
+    for page in pages:
+        for meta in page.one_page_article_list:
+            yield page.page_no, meta
+
+
+def decode_record(buf):
+    """解码文章记录"""
+    try:
+        record = _record_decoder.decode(buf)
+    except msgspec.ValidationError:
+        # 元数据带有额外字段（或不合法，此时 meta_from_dict 抛出异常）
+        record = _loose_record_decoder.decode(buf)
+        record.metadata = meta_from_dict(record.metadata)
+    return ArticleRecord(**{name: getattr(record, name) for name in _RECORD_FIELDS})
+
+
+def load_record(path):
+    """读取并解码 articles/ 下的文章记录"""
+    with open(path, 'rb') as f:
+        return decode_record(f.read())
+
+
+def _meta_builtins(meta):
+    data = msgspec.to_builtins(meta)
+    for key, value in meta.extra.items():
+        data.setdefault(key, value)
+    return data
+
+
+def encode_record(record):
+    """编码文章记录（缩进2，与原有文件格式一致）"""
+    if not record.metadata.extra:
+        return msgspec.json.format(_encoder.encode(record), indent=2)
+    data = msgspec.to_builtins(record)
+    data['metadata'] = _meta_builtins(record.metadata)
+    return msgspec.json.format(_encoder.encode(data), indent=2)
+
+
+def save_record(path, record):
+    """原子写入文章记录"""
+    return write_bytes(path, encode_record(record))
+
+
+def encode_meta(meta):
+    """编码文章元数据（紧凑格式，用于队列等内部存储）"""
+    return _encoder.encode(_meta_builtins(meta) if meta.extra else meta)
+
+
+def decode_meta(buf):
+    """解码文章元数据"""
+    try:
+        return _meta_decoder.decode(buf)
+    except msgspec.ValidationError:
+        return meta_from_dict(_dict_decoder.decode(buf))
+
+
+def meta_from_dict(data):
+    """从普通字典构建文章元数据（字段名为 data.json 中的驼峰形式，其余字段保存在 extra 中）"""
+    meta = msgspec.convert(data, ArticleMeta, strict=False)
+    extra = {key: value for key, value in data.items() if key not in _META_FIELDS}
+    if extra:
+        meta.extra = extra
+    return meta
+
+
+def format_json(buf):
+    """将原始JSON格式化为缩进2的形式，保留所有字段"""
+    return msgspec.json.format(buf, indent=2)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQL 分析控制台
+用嵌入式的 DuckDB（多线程、列式执行）直接在现有的 data/*.json 和 articles/*/*.json 上建立视图，
+不需要转换步骤；临时问题写一条 SQL 即可，不必再写一遍遍历文件的循环
+
+视图:
+    issues    data.json 中列出的每篇文章（date, page_no, title, href, word_number,
+              column_name, author, issue_number, pic_author, issue_date）
+    articles  已抓取的文章文件（date, href, title, content, content_length, crawl_time,
+              source_url 以及 meta_ 开头的元数据字段）
+函数:
+    norm_column(text)   规范化栏目名
+    norm_authors(text)  规范化并拆分作者，返回 VARCHAR[]
+
+用法:
+    python sql_console.py "SELECT column_name, COUNT(*) FROM issues GROUP BY 1 ORDER BY 2 DESC"
+    python sql_console.py -f query.sql --export result.parquet
+    python sql_console.py --materialize      # 生成 Parquet 缓存，之后的查询读取缓存
+    python sql_console.py                    # 交互模式，以 ; 结束一条语句
+"""
+
+import os
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+try:
+    import duckdb
+except ImportError:  # duckdb 可选，仅用于SQL分析
+    duckdb = None
+
+from dimensions import normalize_column, split_authors
+from log_setup import setup_logging
+from work_queue import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+SQL_CACHE_DIR = STATE_DIR / "sql_cache"
+
+_ARTICLE_META = ("STRUCT(mainTitle VARCHAR, articleIssueDate VARCHAR, articleHref VARCHAR, "
+                 "wordNumber VARCHAR, picAuthor VARCHAR, issueNumber VARCHAR, "
+                 "articleColumn VARCHAR, articleAuthor VARCHAR)")
+
+
+def _issues_source(data_dir):
+    pattern = (Path(data_dir) / "*_data.json").as_posix()
+    return f"""
+        WITH pages AS (
+            SELECT regexp_extract(filename, '(\\d{{8}})_data\\.json$', 1) AS date,
+                   pageNo AS page_no,
+                   unnest(onePageArticleList) AS a
+            FROM read_json('{pattern}', format = 'array', filename = true,
+                           columns = {{'pageNo': 'VARCHAR',
+                                       'onePageArticleList': '{_ARTICLE_META}[]'}})
+        )
+        SELECT date, page_no,
+               a.mainTitle AS title,
+               a.articleHref AS href,
+               COALESCE(TRY_CAST(a.wordNumber AS INTEGER), 0) AS word_number,
+               COALESCE(a.articleColumn, '') AS column_name,
+               COALESCE(a.articleAuthor, '') AS author,
+               COALESCE(a.issueNumber, '') AS issue_number,
+               COALESCE(a.picAuthor, '') AS pic_author,
+               a.articleIssueDate AS issue_date
+        FROM pages
+    """
+
+
+def _articles_source(articles_dir):
+    pattern = (Path(articles_dir) / "*" / "*.json").as_posix()
+    return f"""
+        SELECT regexp_extract(filename, '(\\d{{8}})[/\\\\][^/\\\\]+\\.json$', 1) AS date,
+               regexp_extract(filename, '([^/\\\\]+)\\.json$', 1) || '.html' AS href,
+               content.title AS title,
+               content.content AS content,
+               length(COALESCE(content.content, '')) AS content_length,
+               content.publish_date AS publish_date,
+               crawl_time,
+               source_url,
+               metadata.mainTitle AS meta_title,
+               COALESCE(TRY_CAST(metadata.wordNumber AS INTEGER), 0) AS meta_word_number,
+               COALESCE(metadata.articleColumn, '') AS meta_column,
+               COALESCE(metadata.articleAuthor, '') AS meta_author
+        FROM read_json('{pattern}', format = 'auto', filename = true,
+                       columns = {{'metadata': '{_ARTICLE_META}',
+                                   'content': 'STRUCT(title VARCHAR, content VARCHAR, publish_date VARCHAR, author VARCHAR)',
+                                   'crawl_time': 'VARCHAR',
+                                   'source_url': 'VARCHAR'}})
+    """
+
+
+def _has_files(directory, pattern):
+    return next(Path(directory).glob(pattern), None) is not None
+
+
+def _sources_mtime(data_dir, articles_dir):
+    """源文件的最新修改时间；文件写入都是原子替换，目录的 mtime 会随之更新"""
+    mtimes = [Path(data_dir).stat().st_mtime] if Path(data_dir).exists() else []
+    if Path(articles_dir).exists():
+        mtimes.append(Path(articles_dir).stat().st_mtime)
+        mtimes.extend(entry.stat().st_mtime for entry in os.scandir(articles_dir) if entry.is_dir())
+    return max(mtimes, default=0)
+
+
+class SqlConsole:
+    """DuckDB 连接及 issues / articles 视图"""
+
+    def __init__(self, data_dir=Path("data"), articles_dir=Path("articles"),
+                 cache_dir=SQL_CACHE_DIR, use_cache=True, threads=None):
+        if duckdb is None:
+            raise RuntimeError("未安装duckdb，请运行: pip install duckdb")
+        self.data_dir = Path(data_dir)
+        self.articles_dir = Path(articles_dir)
+        self.cache_dir = Path(cache_dir)
+        self.conn = duckdb.connect()
+        self.conn.execute(f"SET threads TO {threads or os.cpu_count() or 1}")
+        self.conn.create_function('norm_column', lambda text: ''.join(normalize_column(text)),
+                                  ['VARCHAR'], 'VARCHAR')
+        self.conn.create_function('norm_authors', lambda text: list(split_authors(text)),
+                                  ['VARCHAR'], 'VARCHAR[]')
+        self.create_views(use_cache)
+
+    def _sources(self):
+        sources = {}
+        if _has_files(self.data_dir, "*_data.json"):
+            sources['issues'] = _issues_source(self.data_dir)
+        else:
+            logger.warning(f"{self.data_dir} 中没有 data.json，不创建 issues 视图")
+        if _has_files(self.articles_dir, "*/*.json"):
+            sources['articles'] = _articles_source(self.articles_dir)
+        else:
+            logger.warning(f"{self.articles_dir} 中没有文章文件，不创建 articles 视图")
+        return sources
+
+    def cache_path(self, name):
+        return self.cache_dir / f"{name}.parquet"
+
+    def cache_fresh(self, name):
+        path = self.cache_path(name)
+        return path.exists() and path.stat().st_mtime >= _sources_mtime(self.data_dir, self.articles_dir)
+
+    def create_views(self, use_cache=True):
+        """建立视图；有比源文件新的 Parquet 缓存时读取缓存"""
+        for name, source in self._sources().items():
+            if use_cache and self.cache_fresh(name):
+                source = f"SELECT * FROM read_parquet('{self.cache_path(name).as_posix()}')"
+                logger.info(f"{name} 视图读取缓存 {self.cache_path(name)}")
+            self.conn.execute(f"CREATE OR REPLACE VIEW {name} AS {source}")
+
+    def materialize(self):
+        """把视图写成 Parquet 缓存（直接从源文件读取，不使用旧缓存）"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for name, source in self._sources().items():
+            path = self.cache_path(name)
+            tmp_path = path.with_suffix('.parquet.tmp')
+            self.conn.execute(
+                f"COPY ({source}) TO '{tmp_path.as_posix()}' (FORMAT parquet, COMPRESSION zstd)")
+            os.replace(tmp_path, path)
+            rows = self.conn.execute(f"SELECT COUNT(*) FROM read_parquet('{path.as_posix()}')").fetchone()[0]
+            logger.info(f"已生成缓存 {path}: {rows} 行")
+        self.create_views(use_cache=True)
+
+    def query(self, sql):
+        return self.conn.sql(sql)
+
+    def export(self, sql, path):
+        """按扩展名把查询结果导出为 CSV 或 Parquet"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == '.parquet':
+            options = "FORMAT parquet, COMPRESSION zstd"
+        elif path.suffix == '.csv':
+            options = "FORMAT csv, HEADER"
+        else:
+            raise ValueError(f"不支持的导出格式: {path.suffix}（支持 .csv / .parquet）")
+        self.conn.execute(f"COPY ({sql.strip().rstrip(';')}) TO '{path.as_posix()}' ({options})")
+
+    def close(self):
+        self.conn.close()
+
+
+def _show(console, sql, max_rows):
+    result = console.query(sql)
+    if result is not None:
+        result.show(max_rows=max_rows)
+
+
+def interactive(console, max_rows):
+    """交互模式：以 ; 结束一条语句，空行或 Ctrl+D 退出"""
+    print("SQL 控制台（视图: issues, articles），以 ; 结束语句，Ctrl+D 退出")
+    buffer = []
+    while True:
+        try:
+            line = input("sql> " if not buffer else "...> ")
+        except EOFError:
+            print()
+            break
+        if not buffer and not line.strip():
+            continue
+        buffer.append(line)
+        if line.rstrip().endswith(';'):
+            try:
+                _show(console, '\n'.join(buffer), max_rows)
+            except duckdb.Error as e:
+                print(f"❌ {e}")
+            buffer = []
+
+
+def main():
+    """主函数"""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description="在 data/ 和 articles/ 上执行SQL查询")
+    parser.add_argument('query', nargs='?', help="SQL语句；不指定时进入交互模式")
+    parser.add_argument('-f', '--file', type=Path, help="从文件读取SQL")
+    parser.add_argument('--export', type=Path, help="把结果导出为 .csv 或 .parquet")
+    parser.add_argument('--materialize', action='store_true',
+                        help=f"生成 Parquet 缓存（{SQL_CACHE_DIR}）")
+    parser.add_argument('--no-cache', action='store_true', help="忽略缓存，直接读取JSON文件")
+    parser.add_argument('--threads', type=int, help="DuckDB线程数（默认为CPU核数）")
+    parser.add_argument('--max-rows', type=int, default=50, help="最多显示的行数")
+    parser.add_argument('--data-dir', type=Path, default=Path("data"))
+    parser.add_argument('--articles-dir', type=Path, default=Path("articles"))
+    args = parser.parse_args()
+
+    if duckdb is None:
+        print("❌ 未安装duckdb，请运行: pip install duckdb")
+        return 1
+
+    console = SqlConsole(args.data_dir, args.articles_dir,
+                         use_cache=not args.no_cache, threads=args.threads)
+    try:
+        if args.materialize:
+            console.materialize()
+
+        sql = args.file.read_text(encoding='utf-8') if args.file else args.query
+        if sql and args.export:
+            console.export(sql, args.export)
+            print(f"💾 已导出到: {args.export}")
+        elif sql:
+            _show(console, sql, args.max_rows)
+        elif not args.materialize:
+            interactive(console, args.max_rows)
+    except (duckdb.Error, ValueError) as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        console.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
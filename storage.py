@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+原子写入文章和期次文件
+先写临时文件并fsync，再rename到最终路径，写入过程中被杀掉也不会留下截断的文件。
+文件内容在rename之前逐个fsync（write_many 先写完一批临时文件，全部fsync后再依次rename）；
+rename所在目录的fsync采用组提交：一个时间窗口内的多次写入只同步一次目录。
+被杀掉的进程留下的临时文件在写入器第一次写入该目录时清理
+"""
+
+import os
+import re
+import json
+import time
+import atexit
+import logging
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 临时文件名: .<文件名>.<pid>.<线程id>.tmp
+_TMP_NAME = re.compile(r'\..+\.\d+\.\d+\.tmp')
+
+
+def encode_json(data):
+    """项目统一的JSON格式（UTF-8、缩进2）"""
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+class AtomicWriter:
+    """原子写入 + 目录fsync组提交"""
+
+    def __init__(self, flush_interval=1.0, max_pending=32):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._started = time.time()
+        self._swept_dirs = set()
+        self._dirty_dirs = {}  # 目录 -> 第一次未同步写入的时间
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name='atomic-writer', daemon=True)
+        self._flusher.start()
+
+    def write_bytes(self, path, payload):
+        """原子写入字节内容，返回写入的字节数"""
+        return self.write_many([(path, payload)])
+
+    def write_many(self, items):
+        """原子写入一批 (路径, 字节内容)，返回写入的总字节数
+
+        先写完所有临时文件，全部fsync后再依次rename，一批文件的落盘合在一起等待
+        """
+        staged = []
+        try:
+            for path, payload in items:
+                path = Path(path)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                self._sweep(path.parent)
+                tmp_path = path.with_name(
+                    f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                fd = os.open(str(tmp_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                staged.append((fd, tmp_path, path, len(payload)))
+                view = memoryview(payload)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+            for fd, _, _, _ in staged:
+                os.fsync(fd)
+        except BaseException:
+            for fd, tmp_path, _, _ in staged:
+                os.close(fd)
+                tmp_path.unlink(missing_ok=True)
+            raise
+
+        for fd, tmp_path, path, _ in staged:
+            os.close(fd)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            for _, _, path, _ in staged:
+                self._dirty_dirs.setdefault(str(path.parent), time.monotonic())
+            self._pending += len(staged)
+            if self._pending >= self.max_pending:
+                self._flush_locked()
+            else:
+                self._wakeup.notify()
+        return sum(size for _, _, _, size in staged)
+
+    def _sweep(self, directory):
+        """删除目录中本写入器启动前遗留的临时文件（写入中被杀掉的进程留下的）"""
+        key = str(directory)
+        if key in self._swept_dirs:
+            return
+        self._swept_dirs.add(key)
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if not _TMP_NAME.fullmatch(entry.name):
+                continue
+            try:
+                if entry.stat().st_mtime < self._started:
+                    os.unlink(entry.path)
+                    logger.info(f"清理遗留的临时文件: {entry.path}")
+            except OSError:
+                continue
+
+    def write_json(self, path, data):
+        """以项目统一的格式（UTF-8、缩进2）原子写入JSON"""
+        return self.write_bytes(path, encode_json(data))
+
+    def flush(self):
+        """立即同步所有待同步的目录"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        dirs = list(self._dirty_dirs)
+        self._dirty_dirs.clear()
+        count = self._pending
+        self._pending = 0
+        for directory in dirs:
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+            except OSError as e:
+                logger.warning(f"无法打开目录进行同步 {directory}: {e}")
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        if dirs:
+            logger.debug(f"组提交: {count} 次写入, 同步 {len(dirs)} 个目录")
+
+    def _flush_loop(self):
+        with self._lock:
+            while not self._closed:
+                if not self._dirty_dirs:
+                    self._wakeup.wait()
+                    continue
+                oldest = min(self._dirty_dirs.values())
+                remaining = oldest + self.flush_interval - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                    continue
+                self._flush_locked()
+
+    def close(self):
+        """同步剩余目录并停止后台线程"""
+        with self._lock:
+            self._flush_locked()
+            self._closed = True
+            self._wakeup.notify()
+        self._flusher.join()
+
+
+_default_writer = None
+_default_lock = threading.Lock()
+
+
+def get_writer():
+    """进程内共享的写入器，退出时自动同步"""
+    global _default_writer
+    with _default_lock:
+        if _default_writer is None:
+            _default_writer = AtomicWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
+
+
+def _reset_after_fork():
+    # 子进程中不存在父进程的后台线程，重新创建写入器
+    global _default_writer, _default_lock
+    _default_writer = None
+    _default_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def write_json(path, data):
+    """原子写入JSON文件"""
+    return get_writer().write_json(path, data)
+
+
+def write_bytes(path, payload):
+    """原子写入字节内容"""
+    return get_writer().write_bytes(path, payload)
+
+
+def write_many(items):
+    """原子写入一批 (路径, 字节内容)"""
+    return get_writer().write_many(items)
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""测试公共配置：脚本都在仓库根目录，直接按模块名导入"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
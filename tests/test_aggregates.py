@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""aggregates: 增量 refresh 与完整 rebuild 的结果一致"""
+
+import json
+
+import pytest
+
+from aggregates import ALL, AUTHOR, COLUMN, AggregateStore
+
+
+def article(href, words, column, author):
+    return {"wordNumber": str(words), "picAuthor": "", "mainTitle": "标题", "issueNumber": "08582",
+            "articleIssueDate": "2025-05-20", "articleColumn": column, "articleHref": href,
+            "articleAuthor": author}
+
+
+def write_issue(data_dir, date_str, *articles):
+    (data_dir / f"{date_str}_data.json").write_text(json.dumps(
+        [{"pageNo": "001", "onePageArticleList": list(articles), "withdrawList": []}],
+        ensure_ascii=False), encoding='utf-8')
+
+
+def _summary(store, period):
+    summary = store.summary(period)
+    if summary is None:
+        return None
+    words = summary['words']
+    return summary['issues'], summary['articles'], (words.n, words.total, words.min, words.max)
+
+
+def snapshot(store):
+    return ([_summary(store, period) for period in (ALL, '202504', '202505', '20250520')],
+            store.top(COLUMN, limit=100), store.top(AUTHOR, limit=100),
+            store.top(COLUMN, '202505', limit=100), store.day_articles())
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / 'data'
+    path.mkdir()
+    write_issue(path, '20250430', article('a.html', 500, '要闻', '记者　张三'))
+    write_issue(path, '20250519', article('b.html', 800, '要闻', '记者　李四'),
+                article('c.html', 300, '信息化', '王五'))
+    write_issue(path, '20250520', article('d.html', 1200, '信息化', '记者　张三'))
+    return path
+
+
+def rebuilt(db_path, data_dir):
+    store = AggregateStore(db_path)
+    store.rebuild(data_dir)
+    try:
+        return snapshot(store)
+    finally:
+        store.close()
+
+
+def test_refresh_matches_rebuild(tmp_path, data_dir):
+    store = AggregateStore(tmp_path / 'incremental.db')
+    try:
+        assert store.is_empty()
+        assert store.refresh(data_dir) == 3
+        assert snapshot(store) == rebuilt(tmp_path / 'r1.db', data_dir)
+
+        # 新增、修改、删除各一期
+        write_issue(data_dir, '20250521', article('e.html', 900, '产业观察', '刘洋'))
+        write_issue(data_dir, '20250520', article('d.html', 100, '要闻', '李四'),
+                    article('f.html', 2000, '要闻', '记者　李四'))
+        (data_dir / '20250430_data.json').unlink()
+        assert store.refresh(data_dir) == 3
+        assert snapshot(store) == rebuilt(tmp_path / 'r2.db', data_dir)
+
+        # 文件没有变化时不再汇总
+        assert store.refresh(data_dir) == 0
+    finally:
+        store.close()
+
+
+def test_unreadable_file_is_retracted(tmp_path, data_dir):
+    store = AggregateStore(tmp_path / 'incremental.db')
+    try:
+        store.refresh(data_dir)
+        (data_dir / '20250520_data.json').write_text('<html>491</html>', encoding='utf-8')
+        store.refresh(data_dir)
+        assert '20250520' not in store.day_articles()
+        assert snapshot(store) == rebuilt(tmp_path / 'r.db', data_dir)
+    finally:
+        store.close()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""assets: 404/410 的图片记录在索引中，之后不再请求"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('requests')
+
+from assets import AssetDownloader, needs_assets  # noqa: E402
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {'content-type': 'text/html'}
+        self.text = ''
+        self.content = b''
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    d = AssetDownloader(root=tmp_path / 'assets', host_interval=0)
+    yield d
+    d.close()
+
+
+def test_missing_image_is_not_requested_again(downloader):
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(url)
+        return _Response(404)
+
+    downloader.session.get = get
+
+    async def fetch_twice():
+        for _ in range(2):
+            assert await downloader.fetch_all('http://x/a/b.html', ['i.jpg']) == []
+
+    asyncio.run(fetch_twice())
+    assert calls == ['http://x/a/i.jpg']
+    assert downloader.index.missing_urls() == {'http://x/a/i.jpg'}
+    assert downloader.stats['missing'] == 1 and downloader.stats['skipped'] == 1
+
+
+def test_needs_assets_ignores_missing():
+    record = SimpleNamespace(source_url='http://x/a/b.html', assets=[SimpleNamespace(url='http://x/a/1.jpg')],
+                             content=SimpleNamespace(images=['1.jpg', '2.jpg']))
+    assert needs_assets(record)
+    assert not needs_assets(record, {'http://x/a/2.jpg'})
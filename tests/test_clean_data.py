@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""clean_data: 隔离/恢复只直接更新已有的索引，不触发刷新或重建"""
+
+import json
+
+import pytest
+
+import aggregates
+import coverage_index
+from aggregates import AggregateStore
+from clean_data import Quarantine, restore
+from coverage_index import CoverageIndex
+
+ARTICLE = {
+    "wordNumber": "765",
+    "picAuthor": "",
+    "mainTitle": "标题",
+    "issueNumber": "08582",
+    "articleIssueDate": "2025-05-20",
+    "articleColumn": "",
+    "articleHref": "20250520_001_02_2642.html",
+    "articleAuthor": "记者　苏德悦",
+}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(coverage_index, '_default_index', None)
+    monkeypatch.setattr(aggregates, '_default_store', None)
+    data = tmp_path / 'data'
+    data.mkdir()
+    # 另留一期，隔离后索引不会变空（空索引在下次使用时会整体重建）
+    for date in ('20250519', '20250520'):
+        (data / f'{date}_data.json').write_text(json.dumps(
+            [{"pageNo": "001", "onePageArticleList": [ARTICLE], "withdrawList": []}],
+            ensure_ascii=False), encoding='utf-8')
+    return tmp_path
+
+
+def _build():
+    index, store = CoverageIndex(), AggregateStore()
+    index.rebuild()
+    store.rebuild()
+    index.close()
+    store.close()
+
+
+def _state():
+    index, store = CoverageIndex(), AggregateStore()
+    try:
+        return index.has_issue('20250520'), '20250520' in store.day_articles()
+    finally:
+        index.close()
+        store.close()
+
+
+def test_quarantine_and_restore_update_existing_indexes(workdir, monkeypatch):
+    _build()
+    assert _state() == (True, True)
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("不应刷新或重建")
+
+    for name in ('refresh', 'rebuild'):
+        monkeypatch.setattr(CoverageIndex, name, forbidden)
+        monkeypatch.setattr(AggregateStore, name, forbidden)
+
+    quarantine = Quarantine()
+    quarantine.move('data/20250520_data.json', 'test', '')
+    assert _state() == (False, False)
+
+    assert restore(quarantine.run_dir) == 1
+    assert _state() == (True, True)
+
+
+def test_unbuilt_indexes_are_left_for_first_use(workdir):
+    Quarantine().move('data/20250520_data.json', 'test', '')
+    index, store = CoverageIndex(), AggregateStore()
+    try:
+        assert index.is_empty() and store.is_empty()
+    finally:
+        index.close()
+        store.close()
+
+
+def test_run_dirs_are_unique(workdir):
+    assert Quarantine().run_dir != Quarantine().run_dir
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""dimensions: 署名拆分、栏目规范化和维度表计数"""
+
+import pytest
+
+from dimensions import DimensionTable, normalize_column, split_authors
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('记者　苏德悦', ('苏德悦',)),
+    ('本报记者　李　明', ('李明',)),
+    ('本报记者　张三　通讯员　李四', ('张三', '李四')),
+    ('本报记者 张三 报道', ('张三',)),
+    ('文/本报记者　王　芳', ('王芳',)),
+    ('图／本报记者 孙 涛', ('孙涛',)),
+    ('记者　张　三　摄', ('张三',)),
+    ('张三、李四', ('张三', '李四')),
+    ('实习生 陈晨 记者 张三', ('陈晨', '张三')),
+    ('本报特约记者　周维', ('周维',)),
+    ('本版撰文　刘　畅', ('刘畅',)),
+    ('供稿人：赵磊', ('赵磊',)),
+    ('供稿单位：中国信息通信研究院', ()),
+    ('中国信通院 何伟', ('何伟',)),
+    ('中国移动董事长　杨杰', ('杨杰',)),
+    ('中国电信党组书记、董事长　柯瑞文', ('柯瑞文',)),
+    ('通讯员 王小明 江苏省通信管理局', ('王小明',)),
+    ('中国移动通信集团有限公司　李华', ('李华',)),
+    ('省邮政工会 赵强', ('赵强',)),
+    ('记者　苏德悦　通讯员　苏德悦', ('苏德悦',)),
+    ('本报评论员', ()),
+    ('', ()),
+    (None, ()),
+])
+def test_split_authors(raw, expected):
+    assert split_authors(raw) == expected
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('【5G前沿】', ('5G前沿',)),
+    ('５Ｇ前沿', ('5G前沿',)),
+    ('  行业  观察 ', ('行业 观察',)),
+    ('', ()),
+])
+def test_normalize_column(raw, expected):
+    assert normalize_column(raw) == expected
+
+
+def test_dimension_table_counts():
+    table = DimensionTable(split_authors)
+    ids = [table.intern(raw) for raw in
+           ('记者　苏德悦', '本报记者　苏德悦', '记者　苏德悦　通讯员　李四', '')]
+    assert ids[3] == 0
+    assert table.raw_value(ids[1]) == '本报记者　苏德悦'
+    assert table.entity_counts(ids) == {'苏德悦': 3, '李四': 1}
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""driver_cache: 只有版本不匹配时才重新解析驱动"""
+
+import pytest
+from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
+
+from driver_cache import is_version_mismatch
+
+
+@pytest.mark.parametrize('error, expected', [
+    (SessionNotCreatedException(
+        "session not created: This version of ChromeDriver only supports Chrome version 119\n"
+        "Current browser version is 120.0.6099.109"), True),
+    (WebDriverException("This version of ChromeDriver only supports Chrome version 114"), True),
+    (SessionNotCreatedException(
+        "session not created: Chrome failed to start: exited normally.\n"
+        "(session not created: DevToolsActivePort file doesn't exist)"), False),
+    (WebDriverException("unknown error: DevToolsActivePort file doesn't exist"), False),
+    (WebDriverException("chrome not reachable"), False),
+])
+def test_is_version_mismatch(error, expected):
+    assert is_version_mismatch(error) is expected
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""driver_health: 基线和重启判断"""
+
+import pytest
+
+import driver_health
+from driver_health import MB, DriverHealth
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    samples = []
+    monkeypatch.setattr(driver_health, 'chrome_rss_bytes', lambda driver: samples.pop(0))
+    return samples
+
+
+def test_rss_baseline_is_median_of_first_pages(rss):
+    health = DriverHealth(baseline_pages=5, rss_growth=3.0)
+    # 冷启动的第一页内存明显偏低，不应作为基线
+    rss.extend([100 * MB, 400 * MB, 420 * MB, 410 * MB, 430 * MB, 900 * MB])
+    for _ in range(5):
+        health.record(None, 1.0)
+    assert health.baseline_rss == 410 * MB
+
+    health.record(None, 1.0)
+    assert health.should_recycle() == (False, None)
+
+
+def test_rss_growth_triggers_recycle(rss):
+    health = DriverHealth(baseline_pages=3, rss_growth=2.0)
+    rss.extend([300 * MB, 300 * MB, 300 * MB, 700 * MB])
+    for _ in range(4):
+        health.record(None, 1.0)
+    recycle, reason = health.should_recycle()
+    assert recycle and '倍' in reason
+
+
+def test_error_rate_and_latency_drift(rss):
+    health = DriverHealth(baseline_pages=3, min_samples=4, error_rate_limit=0.4)
+    rss.extend([None] * 20)
+    for _ in range(3):
+        health.record(None, 1.0)
+    for _ in range(4):
+        health.record(None, 5.0)
+    recycle, reason = health.should_recycle()
+    assert recycle and 'p95' in reason
+
+    health.reset()
+    for error in (True, True, False, True):
+        health.record(None, None if error else 1.0, error=error)
+    recycle, reason = health.should_recycle()
+    assert recycle and '错误率' in reason
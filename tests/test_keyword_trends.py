@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""keyword_trends: 词表中没有的多词短语按分词序列匹配"""
+
+import pytest
+
+pytest.importorskip('jieba')
+pytest.importorskip('scipy')
+pytest.importorskip('pandas')
+
+from keyword_trends import TermMatrix, TokenCache, trend
+from schema import ArticleContent, ArticleMeta, ArticleRecord, save_record
+from storage import get_writer
+
+TEXTS = {
+    ('20250505', 'a'): '大力发展数字经济，推动数字技术与实体经济融合。数字经济规模持续扩大。',
+    ('20250506', 'b'): '加快建设算力网络，5G基站数量继续增长。',
+    ('20250513', 'c'): '数字经济和5G网络协同发展。',
+}
+
+
+@pytest.fixture
+def matrix_and_cache(tmp_path):
+    articles = tmp_path / 'articles'
+    for (date_str, name), text in TEXTS.items():
+        meta = ArticleMeta(main_title='标题', article_issue_date=date_str,
+                           article_href=f'{name}.html', word_number=len(text))
+        save_record(articles / date_str / f'{name}.json',
+                    ArticleRecord(metadata=meta, content=ArticleContent(title='标题', content=text)))
+    get_writer().flush()
+
+    cache = TokenCache(tmp_path / 'tokens.db')
+    cache.update(articles, workers=1)
+    matrix = TermMatrix(tmp_path / 'trends').load()
+    matrix.sync(cache)
+    yield matrix, cache
+    cache.close()
+
+
+def test_single_token_terms(matrix_and_cache):
+    matrix, cache = matrix_and_cache
+    result = trend(matrix, ['5G'], freq='day', cache=cache)
+    assert result['5g'].to_dict() == {'20250505': 0, '20250506': 1, '20250513': 1}
+
+
+def test_multi_token_term_is_matched(matrix_and_cache):
+    matrix, cache = matrix_and_cache
+    assert '数字经济' not in matrix.vocab
+    result = trend(matrix, ['数字经济', '算力网络'], freq='week', cache=cache)
+    assert result['数字经济'].tolist() == [2, 1]
+    assert result['算力网络'].tolist() == [1, 0]
+
+
+def test_unknown_term_is_zero(matrix_and_cache):
+    matrix, cache = matrix_and_cache
+    result = trend(matrix, ['卫星互联网'], freq='month', cache=cache)
+    assert result['卫星互联网'].tolist() == [0]
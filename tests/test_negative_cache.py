@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""negative_cache: 有效期、命中计数和多次运行确认"""
+
+import pytest
+
+import negative_cache
+from negative_cache import (EMPTY_PICTURE, NO_ISSUE, PERMANENT_MISSING,
+                            NegativeCache)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = NegativeCache(tmp_path / 'negative.db')
+    yield c
+    c.close()
+
+
+def test_lookup_and_hits(cache):
+    assert cache.lookup('20250101') is None
+    cache.add('20250101', NO_ISSUE, 'http 404')
+    assert cache.lookup('20250101') == NO_ISSUE
+    assert cache.lookup('20250101', hit=False) == NO_ISSUE
+    assert cache.stats() == {NO_ISSUE: (1, 1)}
+
+
+def test_expired_entries(cache):
+    cache.add('20250101', NO_ISSUE, ttl=-1)
+    assert cache.lookup('20250101') is None
+    assert cache.keys() == set()
+    assert cache.purge_expired() == 1
+
+
+def test_keys_by_reason(cache):
+    cache.add('20250101/a.html', PERMANENT_MISSING)
+    cache.add('20250101/b.html', EMPTY_PICTURE)
+    assert cache.keys(PERMANENT_MISSING) == {'20250101/a.html'}
+    assert cache.clear(EMPTY_PICTURE) == 1
+    assert cache.keys() == {'20250101/a.html'}
+
+
+def test_observation_needs_distinct_runs(cache):
+    for _ in range(5):
+        assert cache.observe('20250101', NO_ISSUE, 'run-1', 'html', min_runs=3) == 1
+    assert cache.lookup('20250101') is None
+
+    assert cache.observe('20250101', NO_ISSUE, 'run-2', 'html', min_runs=3) == 2
+    assert cache.lookup('20250101') is None
+    assert cache.observe('20250101', NO_ISSUE, 'run-3', 'html', min_runs=3) == 3
+    assert cache.lookup('20250101') == NO_ISSUE
+
+
+def test_old_observations_expire(cache, monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(negative_cache.time, 'time', lambda: now)
+    cache.observe('20250101', NO_ISSUE, 'run-1', min_runs=2, window=100)
+    now += 101
+    assert cache.observe('20250101', NO_ISSUE, 'run-2', min_runs=2, window=100) == 1
+    assert cache.lookup('20250101') is None
+
+
+def test_clear_drops_observations(cache):
+    cache.observe('20250101', NO_ISSUE, 'run-1', min_runs=2)
+    cache.clear(NO_ISSUE)
+    assert cache.observe('20250101', NO_ISSUE, 'run-2', min_runs=2) == 1
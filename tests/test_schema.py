@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""schema: 逐篇校验和额外字段的往返"""
+
+import json
+
+import pytest
+
+from article_index import ArticleIndex
+from schema import (ArticleContent, ArticleRecord, SchemaError, decode_issue,
+                    decode_meta, decode_record, encode_meta, encode_record)
+
+ARTICLE = {
+    "wordNumber": "765",
+    "picAuthor": "",
+    "mainTitle": "4月信息传输、软件和信息技术服务业生产指数同比增长10.4％",
+    "issueNumber": "08582",
+    "articleIssueDate": "2025-05-20",
+    "articleColumn": "",
+    "articleHref": "20250520_001_02_2642.html",
+    "articleAuthor": "记者　苏德悦",
+}
+
+
+def issue(*articles):
+    return json.dumps([{"pageNo": "001", "onePageArticleList": list(articles),
+                        "withdrawList": []}], ensure_ascii=False).encode('utf-8')
+
+
+def test_decode_issue_fast_path():
+    pages = decode_issue(issue(ARTICLE))
+    meta = pages[0].one_page_article_list[0]
+    assert meta.word_number == 765
+    assert meta.extra == {}
+
+
+def test_invalid_article_is_skipped():
+    bad = {"mainTitle": None, "articleHref": "x.html"}
+    pages = decode_issue(issue(bad, ARTICLE, "not an object"))
+    assert [m.article_href for m in pages[0].one_page_article_list] == [ARTICLE['articleHref']]
+
+
+@pytest.mark.parametrize('buf', [b'<!DOCTYPE html><html></html>', b'{"pageNo": "001"}', b'[{"pageNo": "001"'])
+def test_malformed_issue_raises(buf):
+    with pytest.raises(SchemaError):
+        decode_issue(buf)
+
+
+def test_extra_fields_round_trip():
+    article = dict(ARTICLE, picUrl="a.jpg", subTitle="副题")
+    meta = decode_issue(issue(article))[0].one_page_article_list[0]
+    assert meta.extra == {"picUrl": "a.jpg", "subTitle": "副题"}
+
+    queued = decode_meta(encode_meta(meta))
+    assert queued.extra == meta.extra
+
+    record = ArticleRecord(metadata=meta, content=ArticleContent(title="标题"))
+    encoded = encode_record(record)
+    assert json.loads(encoded)['metadata']['subTitle'] == "副题"
+    assert decode_record(encoded).metadata.extra == meta.extra
+
+
+def test_extra_fields_survive_article_index():
+    article = dict(ARTICLE, picUrl="a.jpg")
+    index = ArticleIndex()
+    index.add_issue('20250520', decode_issue(issue(ARTICLE, article)))
+    assert index.ref(0).to_meta().extra == {}
+    assert index.ref(1).to_meta().extra == {"picUrl": "a.jpg"}
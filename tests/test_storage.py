@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""storage: 原子批量写入和遗留临时文件清理"""
+
+import os
+import time
+
+from storage import AtomicWriter
+
+
+def test_write_many_and_sweep(tmp_path):
+    stale = tmp_path / '.a.json.123.456.tmp'
+    stale.write_bytes(b'{')
+    unrelated = tmp_path / 'notes.tmp'
+    unrelated.write_bytes(b'x')
+    old = time.time() - 60
+    os.utime(stale, (old, old))
+
+    writer = AtomicWriter()
+    try:
+        written = writer.write_many([(tmp_path / 'a.json', b'{}'),
+                                     (tmp_path / 'sub' / 'b.json', b'[1]')])
+        writer.write_json(tmp_path / 'c.json', {'标题': 1})
+    finally:
+        writer.close()
+
+    assert written == 5
+    assert (tmp_path / 'a.json').read_bytes() == b'{}'
+    assert (tmp_path / 'sub' / 'b.json').read_bytes() == b'[1]'
+    assert '"标题": 1' in (tmp_path / 'c.json').read_text(encoding='utf-8')
+    assert not stale.exists()
+    assert unrelated.exists()
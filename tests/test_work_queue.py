@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""work_queue: 租约领取、过期重新分配、最大尝试次数和失败任务入队"""
+
+import pytest
+
+import work_queue
+from schema import ArticleMeta
+from work_queue import WorkQueue
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(work_queue.time, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    q = WorkQueue(tmp_path / 'queue.db', visibility_timeout=100, max_attempts=2)
+    yield q
+    q.close()
+
+
+def meta(href, title='标题'):
+    return ArticleMeta(main_title=title, article_issue_date='2025-05-20',
+                       article_href=href)
+
+
+def test_lease_orders_by_value(queue):
+    queue.enqueue('20250520', '001', meta('a.html'), value=1.0)
+    queue.enqueue('20250520', '001', meta('b.html'), value=3.0)
+
+    job = queue.lease('w1')
+    assert job['job_key'] == '20250520/b.html'
+    assert job['attempts'] == 1
+    assert job['metadata'].article_href == 'b.html'
+    assert queue.lease('w1')['job_key'] == '20250520/a.html'
+    assert queue.lease('w1') is None
+
+
+def test_expired_lease_is_reassigned(queue, clock):
+    queue.enqueue('20250520', '001', meta('a.html'))
+    assert queue.lease('w1') is not None
+    assert queue.lease('w2') is None
+
+    clock.now += 101
+    job = queue.lease('w2')
+    assert job['lease_owner'] == 'w1'
+    assert job['attempts'] == 2
+    # 原worker的租约已丢失
+    assert not queue.heartbeat(job['job_key'], 'w1')
+    assert queue.heartbeat(job['job_key'], 'w2')
+
+
+def test_heartbeat_extends_lease(queue, clock):
+    queue.enqueue('20250520', '001', meta('a.html'))
+    job = queue.lease('w1')
+    clock.now += 90
+    assert queue.heartbeat(job['job_key'], 'w1')
+    clock.now += 90
+    assert queue.lease('w2') is None
+
+
+def test_expired_lease_at_max_attempts_fails(queue, clock):
+    queue.enqueue('20250520', '001', meta('a.html'))
+    queue.lease('w1')
+    clock.now += 101
+    queue.lease('w2')
+    clock.now += 101
+
+    assert queue.lease('w3') is None
+    assert queue.stats() == {'failed': 1}
+    assert not queue.has_unfinished()
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    queue.enqueue('20250520', '001', meta('a.html'))
+    job = queue.lease('w1')
+    queue.fail(job['job_key'], 'w1', '超时')
+    assert queue.stats() == {'pending': 1}
+
+    job = queue.lease('w1')
+    queue.fail(job['job_key'], 'w1', '超时')
+    assert queue.stats() == {'failed': 1}
+
+
+def test_permanent_failure(queue):
+    queue.enqueue('20250520', '001', meta('a.html'))
+    job = queue.lease('w1')
+    queue.fail(job['job_key'], 'w1', '404', permanent=True)
+    assert queue.stats() == {'failed': 1}
+
+
+def test_enqueue_keeps_failed_jobs_unless_retry(queue):
+    queue.enqueue('20250520', '001', meta('a.html'))
+    job = queue.lease('w1')
+    queue.fail(job['job_key'], 'w1', '404', permanent=True)
+
+    assert not queue.enqueue('20250520', '001', meta('a.html'))
+    assert queue.stats() == {'failed': 1}
+
+    assert queue.enqueue('20250520', '001', meta('a.html'), retry=True)
+    job = queue.lease('w1')
+    assert job['attempts'] == 1
+
+
+def test_enqueue_does_not_touch_leased_job(queue):
+    queue.enqueue('20250520', '001', meta('a.html'))
+    job = queue.lease('w1')
+    assert not queue.enqueue('20250520', '001', meta('a.html', '新标题'))
+    assert queue.heartbeat(job['job_key'], 'w1')
+    assert queue.stats() == {'leased': 1}
+
+
+def test_lease_key(queue):
+    queue.enqueue('20250520', '001', meta('a.html'))
+    key = '20250520/a.html'
+    assert queue.lease_key(key, 'w1')['job_key'] == key
+    # 本worker可以再次领取自己持有的任务，其他worker不行
+    assert queue.lease_key(key, 'w2') is None
+    assert queue.lease_key(key, 'w1') is not None
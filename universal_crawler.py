@@ -4,90 +4,48 @@
 通用的完整文章爬虫 - 用于爬取所有遗漏的文章
 """
 
-import json
 import os
+import argparse
 from pathlib import Path
 import logging
-from improved_crawler import ImprovedArticleCrawler
+from collections import defaultdict
+from article_index import ArticleIndex
+from completeness import score_index
+from coverage_index import get_coverage
+from log_setup import setup_logging
+from negative_cache import dead_article_keys
+from pipeline import EXISTING, SAVED, ArticlePipeline
+from work_queue import job_key
 
 # 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('universal_crawler.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging('universal_crawler.log')
 logger = logging.getLogger(__name__)
 
 def check_missing_articles():
-    """检查每个日期遗漏的文章"""
-    data_dir = Path("data")
-    articles_dir = Path("articles")
-    
+    """检查每个日期遗漏的文章，遗漏列表的元素为 article_index.ArticleRef
+
+    未抓取的文章，以及正文相对自身 wordNumber 明显过短的文章（completeness）都算遗漏；
+    正文长度来自覆盖索引，不再逐个读取文章文件
+    """
     missing_info = []
+    # 已知无法获取的文章（404、无正文的图片稿）不算遗漏
+    dead_keys = dead_article_keys()
     
-    for json_file in sorted(data_dir.glob("*.json")):
-        date_str = json_file.stem.replace('_data', '')
-        
-        # 读取JSON数据
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # 获取所有文章的详细信息
-        all_articles = []
-        for page_data in data:
-            page_no = page_data.get('pageNo', '001')
-            articles = page_data.get('onePageArticleList', [])
-            for article in articles:
-                article['_page_no'] = page_no  # 添加页号信息
-                all_articles.append(article)
-        
+    index, issues = ArticleIndex.from_data_dir(
+        Path("data"),
+        on_error=lambda path, e: logger.warning(f"读取数据文件失败 {path}: {e}"))
+    
+    # 一次计算整个索引的完整度
+    _, _, complete = score_index(index, get_coverage(refresh=True).article_lengths())
+    
+    for date_str, rows in issues.items():
         # 统计应有的文章数
-        total_expected = len(all_articles)
+        total_expected = len(rows)
         
-        # 检查已爬取的文章
-        date_articles_dir = articles_dir / date_str
-        missing_articles = []
-        
-        if not date_articles_dir.exists():
-            # 整个目录都不存在
-            missing_articles = all_articles
-        else:
-            # 检查每篇文章
-            for article in all_articles:
-                article_href = article.get('articleHref', '')
-                if article_href:
-                    file_name = article_href.replace('.html', '.json')
-                    file_path = date_articles_dir / file_name
-                    
-                    if not file_path.exists():
-                        missing_articles.append(article)
-                    else:
-                        # 检查文件内容是否有效
-                        try:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                article_data = json.load(f)
-                            content = article_data.get('content', {})
-                            title = content.get('title', '')
-                            article_content = content.get('content', '')
-                            
-                            # 检查是否为无效内容
-                            is_invalid = (
-                                article_content == '无内容' or
-                                '491 Forbidden' in title or
-                                '403 Forbidden' in title or
-                                '404 Not Found' in title or
-                                len(article_content.strip()) < 20
-                            )
-                            
-                            if is_invalid:
-                                missing_articles.append(article)
-                                
-                        except Exception as e:
-                            logger.warning(f"读取文件失败 {file_path}: {e}")
-                            missing_articles.append(article)
+        missing_articles = [
+            index.ref(i) for i in rows
+            if not complete[i] and job_key(date_str, index.hrefs[i]) not in dead_keys
+        ]
         
         total_missing = len(missing_articles)
         if total_missing > 0:
@@ -103,34 +61,33 @@ def check_missing_articles():
     return missing_info
 
 def crawl_missing_articles(missing_info):
-    """爬取遗漏的文章"""
+    """爬取遗漏的文章（分阶段流水线：浏览器抓取、进程池解析、后台写入）"""
+    # 只有真正抓取时才加载 Selenium / bs4，扫描和状态查询不受影响
+    from improved_crawler import ImprovedArticleCrawler
+
     crawler = None
     try:
         crawler = ImprovedArticleCrawler()
         
-        total_success = 0
-        total_attempts = 0
+        items = [(info['date'], article.page_no, article.to_meta())
+                 for info in missing_info for article in info['missing_articles']]
+        logger.info(f"开始爬取 {len(missing_info)} 个日期的 {len(items)} 篇遗漏文章")
+        
+        # 按日期统计成功数（已存在且有效的文章也算成功）
+        success_by_date = defaultdict(int)
+        
+        def on_result(item, status):
+            if status in (SAVED, EXISTING):
+                success_by_date[item['date']] += 1
+        
+        ArticlePipeline(crawler, on_result=on_result).run(items)
         
         for info in missing_info:
             date_str = info['date']
-            missing_articles = info['missing_articles']
-            
-            logger.info(f"开始爬取 {date_str} 的 {len(missing_articles)} 篇遗漏文章")
-            
-            success_count = 0
-            for i, article in enumerate(missing_articles, 1):
-                page_no = article.get('_page_no', '001')
-                main_title = article.get('mainTitle', '未知标题')
-                
-                logger.info(f"正在爬取 {date_str} 第 {i}/{len(missing_articles)} 篇: {main_title}")
-                
-                total_attempts += 1
-                if crawler.crawl_single_article(date_str, page_no, article):
-                    success_count += 1
-                    total_success += 1
-            
-            logger.info(f"{date_str} 爬取完成: {success_count}/{len(missing_articles)}")
+            logger.info(f"{date_str} 爬取完成: {success_by_date[date_str]}/{len(info['missing_articles'])}")
         
+        total_success = sum(success_by_date.values())
+        total_attempts = len(items)
         logger.info(f"总体爬取完成: {total_success}/{total_attempts}")
         return total_success, total_attempts
         
@@ -145,6 +102,11 @@ def crawl_missing_articles(missing_info):
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="爬取所有遗漏的文章")
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help="非交互模式，不询问确认")
+    args = parser.parse_args()
+
     print("检查遗漏的文章...")
     missing_info = check_missing_articles()
     
@@ -156,7 +118,7 @@ def main():
         for info in missing_info:
             print(f"  {info['date']}: 遗漏 {info['missing']} 篇 (应有 {info['expected']} 篇)")
         
-        response = input(f"\n是否开始爬取这 {total_missing} 篇遗漏文章？(y/n): ")
+        response = 'y' if args.yes else input(f"\n是否开始爬取这 {total_missing} 篇遗漏文章？(y/n): ")
         if response.lower() == 'y':
             success, total = crawl_missing_articles(missing_info)
             print(f"\n爬取完成: {success}/{total} 篇文章成功")
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于SQLite的持久化文章抓取队列
+多个worker进程通过租约（visibility timeout）领取任务，崩溃的worker的任务到期后自动回到队列；
+全局请求速率由所有worker共享的速率预算控制
+"""
+
+import time
+import random
+import sqlite3
+import logging
+from pathlib import Path
+
+from schema import decode_meta, encode_meta
+
+logger = logging.getLogger(__name__)
+
+STATE_DIR = Path("state")
+DEFAULT_QUEUE_DB = STATE_DIR / "work_queue.db"
+
+# 任务状态
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def connect(db_path, check_same_thread=True):
+    """打开SQLite连接（WAL模式，允许多进程并发读写）"""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=60, isolation_level=None,
+                           check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def job_key(date_str, article_href):
+    """任务唯一键"""
+    return f"{date_str}/{article_href}"
+
+
+class WorkQueue:
+    """文章抓取任务队列"""
+
+    def __init__(self, db_path=DEFAULT_QUEUE_DB, visibility_timeout=1800, max_attempts=5):
+        self.db_path = Path(db_path)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.conn = connect(self.db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_key TEXT PRIMARY KEY,
+                date TEXT NOT NULL,
+                page_no TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                value REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+        """)
+        self._migrate()
+
+    def _migrate(self):
+        # 早期版本的队列以 priority 列排序，改名为 value；多个worker可能同时打开，在事务中检查
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+            if 'priority' in columns and 'value' not in columns:
+                self.conn.execute("ALTER TABLE jobs RENAME COLUMN priority TO value")
+                self.conn.execute("DROP INDEX IF EXISTS idx_jobs_ready")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, date_str, page_no, metadata, value=0.0, retry=False):
+        """加入任务，返回是否加入或重置了任务
+
+        已存在且未被租用的任务会重置为待处理（保留历史尝试次数）；已失败的任务保持失败，
+        retry=True 时才重新入队并清零尝试次数。
+        metadata 为 schema.ArticleMeta；value 为文章价值（见 priority.article_value），
+        领取顺序按 value / (1 + attempts) 排列
+        """
+        article_href = metadata.article_href
+        if not article_href:
+            return False
+
+        key = job_key(date_str, article_href)
+        cursor = self.conn.execute("""
+            INSERT INTO jobs (job_key, date, page_no, metadata, status, value, updated_at)
+            VALUES (?, ?, ?, ?, 'pending', ?, ?)
+            ON CONFLICT(job_key) DO UPDATE SET
+                status = 'pending',
+                attempts = CASE WHEN jobs.status = 'failed' THEN 0 ELSE jobs.attempts END,
+                value = excluded.value,
+                metadata = excluded.metadata,
+                updated_at = excluded.updated_at
+            WHERE jobs.status != 'leased' AND (jobs.status != 'failed' OR ?)
+        """, (key, date_str, page_no, encode_meta(metadata).decode('utf-8'),
+              value, time.time(), retry))
+        return cursor.rowcount == 1
+
+    def lease(self, worker_id):
+        """领取优先级最高的可用任务（包括租约已过期的任务），没有则返回None"""
+        return self._lease(worker_id, """
+            SELECT * FROM jobs
+            WHERE status = 'pending'
+               OR (status = 'leased' AND lease_expires < :now)
+            ORDER BY value / (1.0 + attempts) DESC, rowid
+            LIMIT 1
+        """, {})
+
+    def lease_key(self, key, worker_id):
+        """领取指定任务（待处理、租约已过期或本worker已持有），不可领取时返回None"""
+        return self._lease(worker_id, """
+            SELECT * FROM jobs
+            WHERE job_key = :key
+              AND (status = 'pending'
+                   OR (status = 'leased' AND (lease_expires < :now OR lease_owner = :worker_id)))
+        """, {'key': key})
+
+    def _lease(self, worker_id, select_sql, params):
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 租约过期时worker已用掉一次尝试（多半是崩溃），达到最大尝试次数的任务不再分配
+            expired = self.conn.execute("""
+                UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL,
+                    last_error = '租约过期且已达到最大尝试次数', updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (now, now, self.max_attempts))
+            if expired.rowcount:
+                logger.warning(f"{expired.rowcount} 个任务租约过期且已达到最大尝试次数，标记为失败")
+
+            row = self.conn.execute(
+                select_sql, {'now': now, 'worker_id': worker_id, **params}).fetchone()
+
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+
+            if row['status'] == LEASED and row['lease_owner'] != worker_id:
+                logger.warning(
+                    f"任务租约已过期，重新分配: {row['job_key']} (原worker: {row['lease_owner']})")
+
+            self.conn.execute("""
+                UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE job_key = ?
+            """, (worker_id, now + self.visibility_timeout, now, row['job_key']))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        job = dict(row)
+        job['metadata'] = decode_meta(job['metadata'])
+        job['attempts'] += 1
+        return job
+
+    def heartbeat(self, key, worker_id):
+        """延长租约，返回是否仍持有该任务"""
+        cursor = self.conn.execute("""
+            UPDATE jobs SET lease_expires = ?
+            WHERE job_key = ? AND status = 'leased' AND lease_owner = ?
+        """, (time.time() + self.visibility_timeout, key, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, key, worker_id):
+        """标记任务完成"""
+        self.conn.execute("""
+            UPDATE jobs SET status = 'done', lease_owner = NULL, lease_expires = NULL,
+                last_error = NULL, updated_at = ?
+            WHERE job_key = ? AND lease_owner = ?
+        """, (time.time(), key, worker_id))
+
+    def fail(self, key, worker_id, error=None, permanent=False):
+        """任务失败：未超过最大尝试次数则放回队列，否则标记为失败
+
+        permanent=True 表示重试不可能成功（如文章404），直接标记为失败
+        """
+        max_attempts = 0 if permanent else self.max_attempts
+        self.conn.execute("""
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                lease_owner = NULL, lease_expires = NULL, last_error = ?, updated_at = ?
+            WHERE job_key = ? AND lease_owner = ?
+        """, (max_attempts, error, time.time(), key, worker_id))
+
+    def has_unfinished(self):
+        """是否还有待处理或处理中的任务"""
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'leased')").fetchone()
+        return row[0] > 0
+
+    def pending_jobs(self, limit=10):
+        """按领取顺序列出待处理的任务（limit=None 时全部列出）"""
+        rows = self.conn.execute("""
+            SELECT * FROM jobs WHERE status = 'pending'
+            ORDER BY value / (1.0 + attempts) DESC, rowid
+            LIMIT ?
+        """, (-1 if limit is None else limit,)).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['metadata'] = decode_meta(job['metadata'])
+            jobs.append(job)
+        return jobs
+
+    def job_states(self):
+        """{任务键: (状态, 尝试次数)}，用于不写入队列时预览入队结果"""
+        rows = self.conn.execute("SELECT job_key, status, attempts FROM jobs")
+        return {row['job_key']: (row['status'], row['attempts']) for row in rows}
+
+    def value_coverage(self):
+        """按价值加权的完成度：(已完成价值, 总价值, 已完成数, 总数)"""
+        row = self.conn.execute("""
+            SELECT COALESCE(SUM(CASE WHEN status = 'done' THEN value END), 0),
+                   COALESCE(SUM(value), 0),
+                   COUNT(CASE WHEN status = 'done' THEN 1 END),
+                   COUNT(*)
+            FROM jobs
+        """).fetchone()
+        return tuple(row)
+
+    def stats(self):
+        """各状态的任务数"""
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+class RateBudget:
+    """跨进程共享的请求速率预算：所有worker合计每 interval 秒最多发出一个请求"""
+
+    def __init__(self, db_path=DEFAULT_QUEUE_DB, name='rmydb', interval=60.0, jitter=0.2,
+                 check_same_thread=True):
+        self.name = name
+        self.interval = interval
+        self.jitter = jitter
+        self.conn = connect(db_path, check_same_thread=check_same_thread)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_budget (
+                name TEXT PRIMARY KEY,
+                next_slot REAL NOT NULL
+            )
+        """)
+
+    def reserve(self):
+        """预约下一个请求时间片，返回距该时间的秒数（不等待，用于事件循环中异步等待）"""
+        now = time.time()
+        gap = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT next_slot FROM rate_budget WHERE name = ?", (self.name,)).fetchone()
+            slot = max(now, row[0]) if row else now
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rate_budget (name, next_slot) VALUES (?, ?)",
+                (self.name, slot + gap))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return slot - now
+
+    def acquire(self):
+        """预约下一个请求时间片并等待到该时间，返回等待的秒数"""
+        wait = self.reserve()
+        if wait > 0:
+            logger.info(f"等待全局速率预算 {wait:.1f} 秒")
+            time.sleep(wait)
+        return wait
+
+    def close(self):
+        self.conn.close()